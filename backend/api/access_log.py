@@ -0,0 +1,43 @@
+"""
+Structured access log.
+
+Replaces the server's synchronous per-request access line with a sampled
+``http_request`` event on the queued event log (see
+:mod:`backend.telemetry.logs`).
+"""
+import time
+
+from ..telemetry.logs import event_log
+
+
+class AccessLogMiddleware:
+    """ASGI middleware logging method, path, status and latency of each HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            client = scope.get("client")
+            event_log.event(
+                "http_request",
+                latency_ms=(time.perf_counter() - start) * 1000,
+                method=scope["method"],
+                path=scope["path"],
+                status=status["code"],
+                client=client[0] if client else None
+            )
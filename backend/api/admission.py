@@ -0,0 +1,253 @@
+"""
+Admission control for expensive endpoints (BB84 key exchange).
+
+Three layers, checked in order:
+
+1. A token bucket per client refills at ``rate`` tokens/second up to
+   ``burst``. A request that finds its bucket empty is rejected with 429.
+2. At most ``max_concurrent`` simulations run at once on this worker.
+3. Up to ``max_queue`` further requests wait for a slot, each for at most
+   ``queue_timeout`` seconds. A request arriving at a full queue, or one that
+   times out waiting, is rejected with 503.
+
+Every rejection carries a ``Retry-After`` estimate. Limits are per worker
+process. Background one-time-pad refills are key exchanges too: they skip
+the per-client bucket but take a slot like any request
+(:meth:`AdmissionController.run_threadsafe`).
+
+Behind a reverse proxy every request arrives from the proxy's address, so
+the client is taken from ``X-Forwarded-For`` when the peer is a trusted
+proxy (``TRUSTED_PROXIES``); see :meth:`AdmissionController.client_key`.
+"""
+import asyncio
+import ipaddress
+import math
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, List, Optional, TypeVar, Union
+
+from ..telemetry import metrics
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+T = TypeVar('T')
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is shed; maps directly to an HTTP error."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: float):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class TokenBucket:
+    """Classic token bucket refilled lazily on access."""
+
+    __slots__ = ('tokens', 'updated')
+
+    def __init__(self, burst: float, now: float):
+        self.tokens = burst
+        self.updated = now
+
+
+class AdmissionController:
+    """Token buckets per client plus a bounded concurrency limit and wait queue."""
+
+    def __init__(
+        self,
+        rate: float = 1.0,
+        burst: float = 5.0,
+        max_concurrent: int = 2,
+        max_queue: int = 16,
+        queue_timeout: float = 10.0,
+        max_clients: int = 10000,
+        trusted_proxies: str = ''
+    ):
+        """
+        Initialize the controller.
+
+        Args:
+            rate: Tokens added to each client's bucket per second
+            burst: Bucket capacity (requests a client may make back to back)
+            max_concurrent: Simulations allowed to run at the same time
+            max_queue: Requests allowed to wait for a free slot
+            queue_timeout: Seconds a request may wait before being shed
+            max_clients: Buckets kept before the least recently seen is dropped
+            trusted_proxies: Comma-separated proxy addresses or CIDR networks
+                whose ``X-Forwarded-For`` is believed, or ``*`` to trust the
+                immediate peer whatever its address (one proxy hop)
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_clients = max_clients
+        self.buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.in_flight = 0
+        self.waiting = 0
+        # Smoothed service time, used to estimate Retry-After for 503s
+        self.service_time = 1.0
+        self._slots = asyncio.Semaphore(max_concurrent)
+        self.trust_any_peer = trusted_proxies.strip() == '*'
+        self.trusted_networks: List[Network] = []
+        if not self.trust_any_peer:
+            for entry in trusted_proxies.split(','):
+                if entry.strip():
+                    self.trusted_networks.append(ipaddress.ip_network(entry.strip(), strict=False))
+
+    @classmethod
+    def from_env(cls) -> 'AdmissionController':
+        return cls(
+            rate=float(os.getenv('KEY_EXCHANGE_RATE', 1.0)),
+            burst=float(os.getenv('KEY_EXCHANGE_BURST', 5)),
+            max_concurrent=int(os.getenv('KEY_EXCHANGE_CONCURRENCY', 2)),
+            max_queue=int(os.getenv('KEY_EXCHANGE_QUEUE', 16)),
+            queue_timeout=float(os.getenv('KEY_EXCHANGE_QUEUE_TIMEOUT', 10)),
+            trusted_proxies=os.getenv('TRUSTED_PROXIES', '')
+        )
+
+    def _trusted(self, address: str) -> bool:
+        try:
+            ip = ipaddress.ip_address(address)
+        except ValueError:
+            return False
+        return any(ip in network for network in self.trusted_networks)
+
+    def client_key(self, peer: Optional[str], forwarded_for: Optional[str]) -> str:
+        """
+        Identify the client a request's rate limit is charged to.
+
+        ``X-Forwarded-For`` is only believed when the peer is a trusted proxy.
+        It is read right to left, skipping trusted proxies, because the
+        entries on the left are whatever the client chose to send. With
+        ``*`` only the peer is trusted, so its last entry is the client.
+
+        Args:
+            peer: Address of the connection's peer
+            forwarded_for: The request's ``X-Forwarded-For`` header
+
+        Returns:
+            Client address, or ``"unknown"``
+        """
+        client = peer or 'unknown'
+        if not forwarded_for or not (self.trust_any_peer or self._trusted(client)):
+            return client
+        hops = [hop.strip() for hop in forwarded_for.split(',') if hop.strip()]
+        if self.trust_any_peer:
+            return hops[-1] if hops else client
+        for hop in reversed(hops):
+            client = hop
+            if not self._trusted(hop):
+                break
+        return client
+
+    def _take_token(self, client: str, now: float) -> None:
+        bucket = self.buckets.get(client)
+        if bucket is None:
+            bucket = self.buckets[client] = TokenBucket(self.burst, now)
+            if len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(client)
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * self.rate)
+            bucket.updated = now
+
+        if bucket.tokens < 1.0:
+            metrics.ADMISSION_REJECTED.labels('rate_limited').inc()
+            raise AdmissionRejected(
+                429, "Too many key exchanges; slow down", (1.0 - bucket.tokens) / self.rate
+            )
+        bucket.tokens -= 1.0
+
+    def _busy_retry_after(self) -> float:
+        return self.service_time * (self.waiting + 1) / self.max_concurrent
+
+    async def acquire(self, client: str) -> float:
+        """
+        Take a simulation slot, waiting in the queue if necessary.
+
+        Every successful call must be paired with :meth:`release`.
+
+        Returns:
+            Monotonic time the slot was taken, to pass to :meth:`release`
+
+        Raises:
+            AdmissionRejected: When the client is over its rate or the worker
+                is saturated
+        """
+        self._take_token(client, time.monotonic())
+        return await self.acquire_slot()
+
+    async def acquire_slot(self) -> float:
+        """
+        Take a simulation slot without charging any client's rate limit.
+
+        Raises:
+            AdmissionRejected: When the worker is saturated
+        """
+        if self.in_flight >= self.max_concurrent and self.waiting >= self.max_queue:
+            metrics.ADMISSION_REJECTED.labels('queue_full').inc()
+            raise AdmissionRejected(503, "Key exchange capacity exhausted", self._busy_retry_after())
+
+        self.waiting += 1
+        metrics.ADMISSION_QUEUED.inc()
+        try:
+            # Unlike wait_for, a timeout racing a completed acquire cannot leak the slot
+            async with asyncio.timeout(self.queue_timeout):
+                await self._slots.acquire()
+        except TimeoutError:
+            metrics.ADMISSION_REJECTED.labels('queue_timeout').inc()
+            raise AdmissionRejected(503, "Timed out waiting for key exchange capacity",
+                                    self._busy_retry_after())
+        finally:
+            self.waiting -= 1
+            metrics.ADMISSION_QUEUED.dec()
+
+        self.in_flight += 1
+        metrics.ADMISSION_IN_FLIGHT.inc()
+        return time.monotonic()
+
+    def release(self, started: float) -> None:
+        """Return a slot taken by :meth:`acquire` at ``started``."""
+        self.service_time = 0.8 * self.service_time + 0.2 * (time.monotonic() - started)
+        self.in_flight -= 1
+        metrics.ADMISSION_IN_FLIGHT.dec()
+        self._slots.release()
+
+    def run_threadsafe(self, loop: asyncio.AbstractEventLoop, fn: Callable[[], T]) -> T:
+        """
+        Run blocking ``fn`` on the calling (non-event-loop) thread while holding a slot.
+
+        The slot is taken and released on ``loop``, the loop the controller
+        serves requests on.
+
+        Raises:
+            AdmissionRejected: When the worker is saturated
+        """
+        # No timeout here: acquire_slot gives up by itself after queue_timeout,
+        # and cancelling it from this thread could race a granted slot
+        started = asyncio.run_coroutine_threadsafe(self.acquire_slot(), loop).result()
+        try:
+            return fn()
+        finally:
+            loop.call_soon_threadsafe(self.release, started)
+
+    @asynccontextmanager
+    async def admit(self, client: str) -> AsyncIterator[None]:
+        """
+        Hold a simulation slot for the duration of the block.
+
+        Raises:
+            AdmissionRejected: When the client is over its rate or the worker
+                is saturated
+        """
+        started = await self.acquire(client)
+        try:
+            yield
+        finally:
+            self.release(started)
@@ -1,34 +1,118 @@
 """
 FastAPI main application for Quantum Chat.
 """
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Header, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-from typing import Dict, List
-import json
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+from typing import Annotated, AsyncIterator, Dict, List, Literal, Optional, Union
+import asyncio
+import logging
 import os
+import threading
+import time
 from datetime import datetime
 from pathlib import Path
 
+from ..encryption.otp import PadExhausted
 from ..models.schemas import (
     BB84Config,
     BB84Result,
     KeyExchangeRequest,
     KeyExchangeResponse,
+    KeyExchangeStreamQuery,
     SendMessageRequest,
     SendMessageResponse,
     DecryptMessageRequest,
     DecryptMessageResponse,
+    CreateRoomRequest,
+    RoomMemberRequest,
+    RoomMessageRequest,
+    RoomDecryptRequest,
     SessionInfo,
     ChatMessage
 )
-from .session_manager import session_manager
+from .access_log import AccessLogMiddleware
+from .admission import AdmissionController, AdmissionRejected
+from .rooms import Room, RoomFull, RoomManager
+from .session_manager import (
+    DEFAULT_PAGE_SIZE,
+    EXPORT_BATCH_SIZE,
+    MAX_EXPORT_BATCH_SIZE,
+    MAX_PAGE_SIZE,
+    build_protocol,
+    check_result,
+    record_transcript,
+    replay_transcript,
+    run_key_exchange,
+    session_manager,
+    transcript_store
+)
+from .sse import EventStream, sse_event
+from .static_assets import AssetCache
+from .warmup import warm_up
+from .wire import SendMessage, DecryptMessage, JsonCodec, MsgpackCodec, negotiate
+from ..telemetry import REGISTRY
+from ..telemetry import metrics
+from ..telemetry.logs import event_log
+from ..telemetry.profiling import authorized, profiled, profiling_enabled
+
+# Upper bound on a client-requested WebSocket coalescing window
+MAX_COALESCE_MS = float(os.getenv("WS_MAX_COALESCE_MS", 50))
+
+# Heartbeats: a ping every interval; a connection silent for the timeout is closed
+WS_PING_INTERVAL = float(os.getenv("WS_PING_INTERVAL", 20))
+WS_PING_TIMEOUT = float(os.getenv("WS_PING_TIMEOUT", 60))
+# Close code for connections reaped by the heartbeat (application range 4000-4999)
+HEARTBEAT_CLOSE_CODE = 4008
+
+# Seconds between sweeps of expired sessions out of the message log
+LOG_SWEEP_INTERVAL = float(os.getenv("SESSION_LOG_SWEEP_INTERVAL", 300))
+
+
+async def sweep_session_log() -> None:
+    """Remove expired, unloaded sessions from the message log at startup and periodically."""
+    while True:
+        try:
+            await run_in_threadpool(session_manager.sweep_log)
+        except Exception as e:
+            event_log.event("log_sweep", logging.ERROR, exc_info=e)
+        await asyncio.sleep(LOG_SWEEP_INTERVAL)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs in each worker before it accepts connections
+    warm_up()
+    event_log.start()
+    heartbeat = asyncio.create_task(manager.heartbeat()) if WS_PING_INTERVAL > 0 else None
+    loop = asyncio.get_running_loop()
+    # One-time-pad refills share the key-exchange concurrency limit
+    session_manager.refill_gate = lambda refill: admission.run_threadsafe(loop, refill)
+    sweeper = (
+        asyncio.create_task(sweep_session_log())
+        if session_manager.message_log is not None and LOG_SWEEP_INTERVAL > 0 else None
+    )
+    yield
+    for task in (heartbeat, sweeper):
+        if task is not None:
+            task.cancel()
+    session_manager.refill_gate = None
+    session_manager.close()
+    event_log.stop()
+
+
+# Under gunicorn preload_app the master imports this module once; warming up
+# here puts numpy and cryptography in memory shared copy-on-write by workers.
+if os.getenv("PRELOAD_APP") == "1":
+    warm_up()
 
 app = FastAPI(
     title="Quantum Chat API",
     description="Quantum Key Distribution-Based Secure Communication System using BB84",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS configuration - allow all origins since we're serving frontend from same origin
@@ -41,33 +125,226 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(AccessLogMiddleware)
 
 
 # WebSocket connection manager
 class ConnectionManager:
-    def __init__(self):
+    """
+    Tracks WebSocket connections per session and delivers events to them.
+
+    A connection may opt into coalescing with ``?coalesce_ms=N``: events for
+    it are then buffered for up to N milliseconds and flushed as one
+    ``{"type": "batch", "events": [...]}`` frame (a lone event is sent as is).
+    Every send to such a connection goes through the buffer, so event order
+    is preserved.
+
+    Half-open connections (a client that vanished without a close frame) are
+    found by heartbeats: every ``ping_interval`` seconds each connection is
+    sent a ``{"type": "ping"}`` event, and one that has sent nothing at all
+    for ``ping_timeout`` seconds is closed and unregistered. Broadcasts skip
+    such connections even before they are reaped.
+    """
+
+    def __init__(self, ping_interval: float = WS_PING_INTERVAL, ping_timeout: float = WS_PING_TIMEOUT):
         self.active_connections: Dict[str, List[WebSocket]] = {}
+        self.codecs: Dict[WebSocket, Union[JsonCodec, MsgpackCodec]] = {}
+        self.pending_sends = 0
+        # Coalescing window (seconds) and buffered events per opted-in connection
+        self.coalesce: Dict[WebSocket, float] = {}
+        self.outboxes: Dict[WebSocket, List[dict]] = {}
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        # Monotonic time each connection last sent a frame, and its session
+        self.last_seen: Dict[WebSocket, float] = {}
+        self.sessions: Dict[WebSocket, str] = {}
+
+    @property
+    def connection_count(self) -> int:
+        """Open connections in this worker."""
+        return len(self.codecs)
 
-    async def connect(self, websocket: WebSocket, session_id: str):
-        await websocket.accept()
+    async def connect(self, websocket: WebSocket, session_id: str, coalesce_ms: float = 0):
+        offered = websocket.scope.get("subprotocols", [])
+        codec = negotiate(offered)
+        # Echo a subprotocol only if the client offered it; clients offering
+        # none we support get plain JSON with no subprotocol header
+        await websocket.accept(subprotocol=codec.subprotocol if codec.subprotocol in offered else None)
+        self.codecs[websocket] = codec
+        self.last_seen[websocket] = time.monotonic()
+        self.sessions[websocket] = session_id
+        if coalesce_ms > 0:
+            self.coalesce[websocket] = min(coalesce_ms, MAX_COALESCE_MS) / 1000
+        metrics.WS_CONNECTIONS.inc()
         if session_id not in self.active_connections:
             self.active_connections[session_id] = []
         self.active_connections[session_id].append(websocket)
 
     def disconnect(self, websocket: WebSocket, session_id: str):
+        if self.codecs.pop(websocket, None) is not None:
+            metrics.WS_CONNECTIONS.dec()
+        self.coalesce.pop(websocket, None)
+        self.outboxes.pop(websocket, None)
+        self.last_seen.pop(websocket, None)
+        self.sessions.pop(websocket, None)
         if session_id in self.active_connections:
             if websocket in self.active_connections[session_id]:
                 self.active_connections[session_id].remove(websocket)
                 if not self.active_connections[session_id]:
                     del self.active_connections[session_id]
 
+    def seen(self, websocket: WebSocket) -> None:
+        """Record a frame from the client; any frame, not only a pong, proves it alive."""
+        self.last_seen[websocket] = time.monotonic()
+
+    def _stale(self, websocket: WebSocket, now: float) -> bool:
+        return now - self.last_seen.get(websocket, now) > self.ping_timeout
+
+    async def reap(self) -> int:
+        """
+        Close and unregister connections silent for longer than ``ping_timeout``.
+
+        Returns:
+            Number of connections reaped
+        """
+        now = time.monotonic()
+        dead = [ws for ws in list(self.last_seen) if self._stale(ws, now)]
+        for websocket in dead:
+            session_id = self.sessions.get(websocket)
+            self.disconnect(websocket, session_id)
+            metrics.WS_REAPED.inc()
+            event_log.event(
+                "ws_reaped",
+                logging.WARNING,
+                session_id=session_id,
+                idle_seconds=round(now - self.last_seen.get(websocket, now), 1)
+            )
+            try:
+                # A half-open peer never answers the close handshake; don't wait on it
+                await asyncio.wait_for(
+                    websocket.close(code=HEARTBEAT_CLOSE_CODE, reason="Heartbeat timeout"),
+                    self.ping_interval or 1
+                )
+            except Exception:
+                pass
+        return len(dead)
+
+    async def ping_all(self) -> None:
+        """Send a ping event to every connection, bounding each send by the ping interval."""
+        message = {"type": "ping", "data": {"ts": time.time()}}
+
+        async def ping(websocket: WebSocket):
+            try:
+                await asyncio.wait_for(self.send(websocket, message), self.ping_interval or 1)
+            except Exception:
+                pass  # Reaped once its timeout passes
+
+        await asyncio.gather(*(ping(ws) for ws in list(self.codecs)))
+
+    async def heartbeat(self) -> None:
+        """Ping and reap connections every ``ping_interval`` seconds, until cancelled."""
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            await self.reap()
+            await self.ping_all()
+
+    async def _send_frame(self, websocket: WebSocket, frame, binary: bool, events: int = 1):
+        metrics.WS_QUEUE_DEPTH.observe(self.pending_sends)
+        self.pending_sends += 1
+        metrics.WS_PENDING_SENDS.inc()
+        try:
+            if binary:
+                await websocket.send_bytes(frame)
+                metrics.WS_PAYLOAD_BYTES.inc(len(frame))
+            else:
+                await websocket.send_text(frame)
+                metrics.WS_PAYLOAD_BYTES.inc(len(frame.encode()))
+            metrics.WS_FRAMES.inc()
+            metrics.WS_EVENTS.inc(events)
+        finally:
+            self.pending_sends -= 1
+            metrics.WS_PENDING_SENDS.dec()
+
+    def _buffer(self, websocket: WebSocket, message: dict) -> None:
+        """Queue an event for a coalescing connection, starting its window if idle."""
+        outbox = self.outboxes.get(websocket)
+        if outbox is None:
+            self.outboxes[websocket] = [message]
+            asyncio.create_task(self._flush_after(websocket, self.coalesce[websocket]))
+        else:
+            outbox.append(message)
+
+    async def _flush_after(self, websocket: WebSocket, delay: float):
+        await asyncio.sleep(delay)
+        events = self.outboxes.pop(websocket, None)
+        codec = self.codecs.get(websocket)
+        if not events or codec is None:
+            return
+        message = events[0] if len(events) == 1 else {"type": "batch", "events": events}
+        try:
+            await self._send_frame(websocket, codec.encode(message), codec.binary, len(events))
+        except Exception:
+            pass  # Connection is closing; its receive loop cleans up
+
+    async def send(self, websocket: WebSocket, message: dict):
+        if websocket in self.coalesce:
+            self._buffer(websocket, message)
+            return
+        codec = self.codecs[websocket]
+        await self._send_frame(websocket, codec.encode(message), codec.binary)
+
     async def broadcast(self, message: dict, session_id: str):
-        if session_id in self.active_connections:
-            for connection in self.active_connections[session_id]:
-                await connection.send_json(message)
+        await self.broadcast_to(message, (session_id,))
+
+    async def broadcast_to(self, message: dict, session_ids):
+        """Send one event to every connection of several sessions (e.g. a room's members)."""
+        start = time.perf_counter()
+        now = time.monotonic()
+        # Encode once per wire format and reuse the frame for every recipient
+        frames = {}
+        connections = [ws for session_id in session_ids for ws in self.active_connections.get(session_id, ())]
+        for connection in connections:
+            if self._stale(connection, now):
+                continue  # Presumed dead; the reaper closes it
+            if connection in self.coalesce:
+                self._buffer(connection, message)
+                continue
+            codec = self.codecs[connection]
+            frame = frames.get(codec.subprotocol)
+            if frame is None:
+                frame = frames[codec.subprotocol] = codec.encode(message)
+            try:
+                await self._send_frame(connection, frame, codec.binary)
+            except Exception:
+                pass  # Connection is closing; its receive loop cleans up
+        metrics.BROADCAST_SECONDS.observe(time.perf_counter() - start)
 
 
 manager = ConnectionManager()
+admission = AdmissionController.from_env()
+room_manager = RoomManager(session_manager)
+
+
+def client_key(request: Request) -> str:
+    """Client a request is rate limited as, honouring trusted proxies' X-Forwarded-For."""
+    return admission.client_key(
+        request.client.host if request.client else None,
+        request.headers.get("x-forwarded-for")
+    )
+
+
+def profile_requested(flag: bool, token: Optional[str]) -> bool:
+    """
+    Decide whether to profile a request.
+
+    The flag is ignored while profiling is disabled (no PROFILE_TOKEN); when
+    enabled, a flagged request must carry the admin token.
+    """
+    if not flag or not profiling_enabled():
+        return False
+    if not authorized(token):
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+    return True
 
 
 @app.get("/api/info")
@@ -80,38 +357,245 @@ async def api_info():
         "endpoints": {
             "docs": "/docs",
             "key_exchange": "/api/key-exchange",
+            "key_exchange_stream": "/api/key-exchange/stream",
             "send_message": "/api/send-message",
             "decrypt_message": "/api/decrypt-message",
             "sessions": "/api/sessions",
+            "session_export": "/api/sessions/{session_id}/export",
+            "rooms": "/api/rooms",
             "websocket": "/ws/{session_id}"
         }
     }
 
 
 @app.post("/api/key-exchange", response_model=KeyExchangeResponse)
-async def key_exchange(request: KeyExchangeRequest):
+async def key_exchange(
+    request: KeyExchangeRequest,
+    http_request: Request,
+    response: Response,
+    profile: bool = False,
+    x_profile_token: Optional[str] = Header(default=None)
+):
     """
     Initiate BB84 quantum key exchange.
 
     This endpoint simulates the BB84 protocol to generate a shared quantum key
     between Alice and Bob. Optionally enables Eve (eavesdropper) to demonstrate
     QBER-based intrusion detection.
+
+    Admins can pass ``?profile=true`` with an ``X-Profile-Token`` header to
+    save a sampled profile of the exchange; its file name is returned in the
+    ``X-Profile-Id`` response header.
+
+    Exchanges are admission-controlled: a client over its rate gets 429 and a
+    saturated worker answers 503, both with ``Retry-After``.
     """
+    profile = profile_requested(profile, x_profile_token)
+    client = client_key(http_request)
+    start = time.perf_counter()
     try:
-        config = request.config.dict()
-        session_id, quantum_key, bb84_result = session_manager.create_session(config)
+        async with admission.admit(client):
+            # The simulation runs off the event loop so chat traffic keeps flowing
+            bb84_result, profiler = await run_in_threadpool(
+                _run_exchange, request.config.dict(), profile
+            )
+        session_id, quantum_key, bb84_result = session_manager.register_session(
+            bb84_result, request.user_id, request.config.dict()
+        )
+        event_log.event(
+            "key_exchange",
+            session_id=session_id,
+            latency_ms=(time.perf_counter() - start) * 1000,
+            protocol=request.config.protocol,
+            key_length=request.config.key_length,
+            qber=bb84_result["qber"]
+        )
+        if profiler is not None:
+            response.headers["X-Profile-Id"] = os.path.basename(profiler.path)
 
         return KeyExchangeResponse(
             session_id=session_id,
             quantum_key=quantum_key,
             bb84_result=BB84Result(**bb84_result)
         )
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except ValueError as e:
+        event_log.event(
+            "key_exchange",
+            logging.WARNING,
+            latency_ms=(time.perf_counter() - start) * 1000,
+            protocol=request.config.protocol,
+            error=str(e)
+        )
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
+        event_log.event("key_exchange", logging.ERROR, exc_info=e)
         raise HTTPException(status_code=500, detail=f"Key exchange failed: {str(e)}")
 
 
+def _run_exchange(config: dict, profile: bool):
+    """Worker-thread body of a key exchange; profiles the thread doing the work."""
+    with profiled('key-exchange', profile) as profiler:
+        bb84_result = run_key_exchange(config)
+    return bb84_result, profiler
+
+
+@app.get("/api/key-exchange/stream")
+async def key_exchange_stream(http_request: Request, query: Annotated[KeyExchangeStreamQuery, Query()]):
+    """
+    Run a BB84 key exchange, streaming its progress as Server-Sent Events.
+
+    Emits ``qubits_sent``, ``eve`` (when enabled), ``sifting_done`` and
+    ``qber_estimate`` events as the protocol advances, then either
+    ``key_ready`` (same body as ``POST /api/key-exchange``) or ``error``.
+    Disconnecting abandons the simulation at its next stage boundary.
+    Admission control applies as for ``POST /api/key-exchange``.
+    """
+    config = query.model_dump(exclude={"user_id"})
+    try:
+        protocol = build_protocol(config)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    client = client_key(http_request)
+    try:
+        started = await admission.acquire(client)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+    stages = protocol.run_stages()
+    state = {"finished": False, "running": False, "closed": False}
+    lock = threading.Lock()
+    loop = asyncio.get_running_loop()
+
+    def finish():
+        # No stage is running: drop the rest of the run and free the slot
+        stages.close()
+        admission.release(started)
+
+    def next_stage():
+        with lock:
+            if state["closed"]:
+                return None
+            state["running"] = True
+        try:
+            return next(stages, None)
+        finally:
+            with lock:
+                state["running"] = False
+                closed = state["closed"]
+            if closed:
+                # The client left mid-stage; the slot stayed held until now
+                loop.call_soon_threadsafe(finish)
+
+    async def events() -> AsyncIterator[str]:
+        while True:
+            # Each stage runs off the event loop; a disconnect ends the
+            # response and the rest of the run is dropped
+            event = await run_in_threadpool(next_stage)
+            if event is None:
+                return
+            stage = event.pop("stage")
+            if stage != "complete":
+                yield sse_event(stage, event)
+                continue
+
+            state["finished"] = True
+            record_transcript(protocol, config, event["result"])
+            try:
+                bb84_result = check_result(event["result"])
+            except ValueError as e:
+                yield sse_event("error", {"detail": str(e), "bb84_result": event["result"]})
+                return
+            session_id, quantum_key, bb84_result = session_manager.register_session(
+                bb84_result, query.user_id, config
+            )
+            yield sse_event("key_ready", KeyExchangeResponse(
+                session_id=session_id,
+                quantum_key=quantum_key,
+                bb84_result=BB84Result(**bb84_result)
+            ).model_dump())
+
+    def close():
+        if not state["finished"]:
+            metrics.KEY_EXCHANGES.labels("cancelled").inc()
+        with lock:
+            state["closed"] = True
+            running = state["running"]
+        # A stage still running in its worker thread keeps the slot until it returns
+        if not running:
+            finish()
+
+    return EventStream(events(), on_close=close)
+
+
+def require_transcripts(token: Optional[str]):
+    """Reject transcript access without the admin token or with recording disabled."""
+    if not authorized(token):
+        raise HTTPException(status_code=403, detail="Admin token required")
+    if transcript_store is None:
+        raise HTTPException(status_code=404, detail="Transcript recording is disabled")
+
+
+@app.get("/api/transcripts", response_model=List[dict])
+async def list_transcripts(
+    limit: int = Query(100, ge=1, le=1000),
+    x_admin_token: Optional[str] = Header(default=None)
+):
+    """
+    List recorded protocol transcripts, newest first (admin only).
+    """
+    require_transcripts(x_admin_token)
+    return await run_in_threadpool(transcript_store.list, limit)
+
+
+@app.get("/api/transcripts/{transcript_id}", response_model=dict)
+async def get_transcript(transcript_id: str, x_admin_token: Optional[str] = Header(default=None)):
+    """
+    Get a transcript's seed, configuration and outcome (admin only).
+    """
+    require_transcripts(x_admin_token)
+    transcript = await run_in_threadpool(transcript_store.load, transcript_id)
+    if transcript is None:
+        raise HTTPException(status_code=404, detail="Transcript not found")
+    return transcript.meta()
+
+
+@app.post("/api/transcripts/{transcript_id}/replay", response_model=dict)
+async def replay(
+    transcript_id: str,
+    http_request: Request,
+    x_admin_token: Optional[str] = Header(default=None)
+):
+    """
+    Re-run a recorded exchange from its seed and check it reproduces bit for bit (admin only).
+    """
+    require_transcripts(x_admin_token)
+    transcript = await run_in_threadpool(transcript_store.load, transcript_id)
+    if transcript is None:
+        raise HTTPException(status_code=404, detail="Transcript not found")
+
+    client = client_key(http_request)
+    try:
+        async with admission.admit(client):
+            return await run_in_threadpool(replay_transcript, transcript)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.detail,
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+
 @app.post("/api/send-message", response_model=SendMessageResponse)
 async def send_message(request: SendMessageRequest):
     """
@@ -121,20 +605,36 @@ async def send_message(request: SendMessageRequest):
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
+    start = time.perf_counter()
     try:
         encrypted_msg = session.encrypt_message(request.sender, request.message)
 
         # Broadcast to WebSocket clients
         await manager.broadcast({
             "type": "new_message",
-            "data": encrypted_msg.dict()
+            "data": encrypted_msg.to_dict()
         }, request.session_id)
 
+        event_log.event(
+            "message",
+            session_id=request.session_id,
+            latency_ms=(time.perf_counter() - start) * 1000,
+            transport="rest",
+            success=True
+        )
         return SendMessageResponse(
             success=True,
-            encrypted_message=encrypted_msg
+            encrypted_message=encrypted_msg.to_model()
         )
     except Exception as e:
+        event_log.event(
+            "message",
+            logging.WARNING,
+            session_id=request.session_id,
+            transport="rest",
+            success=False,
+            error=str(e)
+        )
         return SendMessageResponse(
             success=False,
             error=str(e)
@@ -150,25 +650,66 @@ async def decrypt_message(request: DecryptMessageRequest):
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
 
+    start = time.perf_counter()
     try:
         plaintext = session.decrypt_message(request.ciphertext)
+        event_log.event(
+            "decrypt",
+            session_id=request.session_id,
+            latency_ms=(time.perf_counter() - start) * 1000,
+            transport="rest",
+            success=True
+        )
         return DecryptMessageResponse(
             success=True,
             plaintext=plaintext
         )
     except Exception as e:
+        event_log.event(
+            "decrypt",
+            logging.WARNING,
+            session_id=request.session_id,
+            transport="rest",
+            success=False,
+            error=str(e) or type(e).__name__
+        )
         return DecryptMessageResponse(
             success=False,
             error=str(e)
         )
 
 
-@app.get("/api/sessions", response_model=List[dict])
-async def list_sessions():
+@app.get("/api/sessions", response_model=dict)
+async def list_sessions(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    sort: Literal['created', 'activity'] = 'created',
+    order: Literal['asc', 'desc'] = 'desc',
+    user_id: Optional[str] = None,
+    created_after: Optional[datetime] = None,
+    created_before: Optional[datetime] = None,
+    active_within: Optional[float] = Query(None, gt=0)
+):
     """
-    List all active quantum-secured sessions.
+    List active quantum-secured sessions, one page at a time.
+
+    Pass the returned ``next_cursor`` back as ``cursor`` to fetch the next
+    page; it is null on the last page.
     """
-    return session_manager.list_sessions()
+    try:
+        sessions, next_cursor = session_manager.list_sessions(
+            limit=limit,
+            cursor=cursor,
+            sort=sort,
+            descending=order == 'desc',
+            user_id=user_id,
+            created_after=created_after,
+            created_before=created_before,
+            active_within=active_within
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"sessions": sessions, "next_cursor": next_cursor}
 
 
 @app.get("/api/sessions/{session_id}", response_model=dict)
@@ -182,10 +723,60 @@ async def get_session(session_id: str):
 
     return {
         **session.get_info(),
-        "messages": [msg.dict() for msg in session.messages]
+        "messages": [msg.to_dict() for msg in session.messages]
     }
 
 
+@app.get("/api/sessions/{session_id}/export")
+async def export_session(
+    session_id: str,
+    start: int = Query(0, ge=0),
+    end: Optional[int] = Query(None, ge=0),
+    limit: Optional[int] = Query(None, ge=1),
+    cursor: Optional[str] = None,
+    decrypt: bool = False,
+    batch_size: int = Query(EXPORT_BATCH_SIZE, ge=1, le=MAX_EXPORT_BATCH_SIZE)
+):
+    """
+    Stream a session's message history as NDJSON, one message per line.
+
+    Messages ``start`` to ``end`` (exclusive, default: the current end of
+    the history), at most ``limit`` of them, are exported; ``cursor`` from
+    the ``X-Next-Cursor`` header of a previous export resumes after it.
+    With ``decrypt=true`` each line also carries ``plaintext``. Batches of
+    ``batch_size`` messages are serialized and decrypted in a worker thread,
+    so memory stays bounded by one batch however long the history is.
+    """
+    session = session_manager.get_session(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Session not found")
+    try:
+        first, stop, next_cursor = session.export_range(start, end, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    session.touch()
+
+    async def lines() -> AsyncIterator[str]:
+        started = time.perf_counter()
+        for batch_start in range(first, stop, batch_size):
+            yield await run_in_threadpool(
+                session.export_batch, batch_start, min(batch_start + batch_size, stop), decrypt
+            )
+        event_log.event(
+            "export",
+            session_id=session_id,
+            latency_ms=(time.perf_counter() - started) * 1000,
+            messages=stop - first,
+            decrypt=decrypt
+        )
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"X-Next-Cursor": next_cursor}
+    )
+
+
 @app.delete("/api/sessions/{session_id}")
 async def delete_session(session_id: str):
     """
@@ -196,10 +787,154 @@ async def delete_session(session_id: str):
     raise HTTPException(status_code=404, detail="Session not found")
 
 
+def _room_member(room_id: str, session_id: str) -> Room:
+    """Look up a room, requiring ``session_id`` to be a live member."""
+    room = room_manager.get_room(room_id)
+    if room is None:
+        raise HTTPException(status_code=404, detail="Room not found")
+    if not room.is_member(session_id):
+        raise HTTPException(status_code=403, detail="Session is not a member of this room")
+    if session_manager.get_session(session_id) is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return room
+
+
+def _rekey_room(change, *args) -> Dict[str, str]:
+    """Run a room membership change, mapping a failed rekey to 409."""
+    try:
+        return change(*args)
+    except (PadExhausted, RoomFull) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+async def _purge_rooms() -> None:
+    """Drop room members whose session expired and deliver the remaining members new keys."""
+    for room, wrapped in room_manager.purge_expired():
+        await _announce_key(room, wrapped)
+
+
+async def _announce_key(room: Room, wrapped: Dict[str, str]) -> None:
+    """Deliver each member its wrapped key for the room's current epoch."""
+    members = list(room.members)
+    for session_id, wrapped_key in wrapped.items():
+        await manager.broadcast({
+            "type": "room_key",
+            "data": {
+                "room_id": room.room_id,
+                "epoch": room.epoch,
+                "wrapped_key": wrapped_key,
+                "members": members
+            }
+        }, session_id)
+
+
+@app.post("/api/rooms", response_model=dict)
+async def create_room(request: CreateRoomRequest):
+    """
+    Create a group room; the creating session is its first member.
+
+    Returns the room and the room key wrapped under the creator's pairwise
+    key: a token of the session cipher holding the raw room key bytes.
+    """
+    await _purge_rooms()
+    if session_manager.get_session(request.session_id) is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    room, wrapped = _rekey_room(room_manager.create_room, request.session_id, request.name)
+    return {**room.get_info(), "wrapped_key": wrapped[request.session_id]}
+
+
+@app.get("/api/rooms/{room_id}", response_model=dict)
+async def get_room(room_id: str, session_id: str):
+    """
+    Get a room, with the messages the member ``session_id`` can decrypt.
+    """
+    room = _room_member(room_id, session_id)
+    return {
+        **room.get_info(),
+        "wrapped_key": room.wrapped.get(session_id),
+        "messages": room.history(session_id)
+    }
+
+
+@app.post("/api/rooms/{room_id}/members", response_model=dict)
+async def join_room(room_id: str, request: RoomMemberRequest):
+    """
+    Add a session to a room.
+
+    The room is rekeyed: existing members receive the new epoch's wrapped
+    key as a ``room_key`` WebSocket event, without re-running BB84.
+    """
+    await _purge_rooms()
+    room = room_manager.get_room(room_id)
+    if room is None:
+        raise HTTPException(status_code=404, detail="Room not found")
+    if session_manager.get_session(request.session_id) is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    wrapped = _rekey_room(room_manager.join, room, request.session_id)
+    await _announce_key(room, wrapped)
+    return {**room.get_info(), "wrapped_key": wrapped[request.session_id]}
+
+
+@app.delete("/api/rooms/{room_id}/members/{session_id}", response_model=dict)
+async def leave_room(room_id: str, session_id: str):
+    """
+    Remove a session from a room and rekey it for the remaining members.
+    """
+    room = room_manager.get_room(room_id)
+    if room is None or not room.is_member(session_id):
+        raise HTTPException(status_code=404, detail="Room member not found")
+    wrapped = _rekey_room(room_manager.leave, room, session_id)
+    await _announce_key(room, wrapped)
+    return {"success": True, "epoch": room.epoch, "members": list(room.members)}
+
+
+@app.post("/api/rooms/{room_id}/messages", response_model=dict)
+async def send_room_message(room_id: str, request: RoomMessageRequest):
+    """
+    Encrypt a message once under the room key and broadcast it to every member.
+    """
+    await _purge_rooms()
+    room = _room_member(room_id, request.session_id)
+    start = time.perf_counter()
+    record = room.encrypt(request.sender, request.message)
+    data = {**record.to_dict(), "room_id": room_id}
+    await manager.broadcast_to({"type": "room_message", "data": data}, list(room.members))
+    metrics.ROOM_MESSAGES.inc()
+    event_log.event(
+        "message",
+        session_id=request.session_id,
+        latency_ms=(time.perf_counter() - start) * 1000,
+        transport="room",
+        room_id=room_id,
+        members=len(room.members),
+        success=True
+    )
+    return {"success": True, "encrypted_message": data}
+
+
+@app.post("/api/rooms/{room_id}/decrypt", response_model=DecryptMessageResponse)
+async def decrypt_room_message(room_id: str, request: RoomDecryptRequest):
+    """
+    Decrypt a room message for a member (messages from before it joined are refused).
+    """
+    room = _room_member(room_id, request.session_id)
+    try:
+        plaintext = room.decrypt(request.session_id, request.ciphertext, request.epoch)
+    except Exception as e:
+        return DecryptMessageResponse(success=False, error=str(e) or type(e).__name__)
+    return DecryptMessageResponse(success=True, plaintext=plaintext)
+
+
 @app.websocket("/ws/{session_id}")
 async def websocket_endpoint(websocket: WebSocket, session_id: str):
     """
     WebSocket endpoint for real-time encrypted chat.
+
+    Admins can connect with ``?profile=true&profile_token=...`` to save a
+    sampled profile of every command handled on the connection. Clients that
+    understand ``batch`` frames can pass ``?coalesce_ms=5`` to have events
+    merged over a short window. Clients must answer ``ping`` events (with
+    ``{"type": "pong"}``, or any other frame) within ``WS_PING_TIMEOUT``.
     """
     # Verify session exists
     session = session_manager.get_session(session_id)
@@ -207,104 +942,198 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
         await websocket.close(code=4004, reason="Session not found")
         return
 
-    await manager.connect(websocket, session_id)
+    profile = False
+    if websocket.query_params.get("profile") in ("1", "true") and profiling_enabled():
+        token = websocket.query_params.get("profile_token") or websocket.headers.get("x-profile-token")
+        if not authorized(token):
+            await websocket.close(code=4003, reason="Invalid profiling token")
+            return
+        profile = True
+
+    try:
+        coalesce_ms = float(websocket.query_params.get("coalesce_ms", 0))
+    except ValueError:
+        coalesce_ms = 0
+    await manager.connect(websocket, session_id, coalesce_ms)
+    codec = manager.codecs[websocket]
+    connected = time.perf_counter()
+    event_log.event("ws_connect", session_id=session_id, codec=codec.subprotocol, coalesce_ms=coalesce_ms)
 
     try:
         # Send session info
-        await websocket.send_json({
+        await manager.send(websocket, {
             "type": "session_info",
             "data": session.get_info()
         })
 
         # Send message history
-        await websocket.send_json({
+        await manager.send(websocket, {
             "type": "message_history",
-            "data": [msg.dict() for msg in session.messages]
+            "data": [msg.to_dict() for msg in session.messages]
         })
 
         # Handle incoming messages
         while True:
-            data = await websocket.receive_text()
-            message_data = json.loads(data)
-
-            if message_data.get("type") == "send_message":
-                sender = message_data.get("sender", "anonymous")
-                message = message_data.get("message", "")
-
-                # Encrypt and broadcast
-                encrypted_msg = session.encrypt_message(sender, message)
-                await manager.broadcast({
-                    "type": "new_message",
-                    "data": encrypted_msg.dict()
-                }, session_id)
-
-            elif message_data.get("type") == "decrypt_message":
-                ciphertext = message_data.get("ciphertext", "")
-                try:
-                    plaintext = session.decrypt_message(ciphertext)
-                    await websocket.send_json({
-                        "type": "decrypted_message",
-                        "data": {
-                            "ciphertext": ciphertext,
-                            "plaintext": plaintext
-                        }
-                    })
-                except Exception as e:
-                    await websocket.send_json({
-                        "type": "error",
-                        "data": {"message": f"Decryption failed: {str(e)}"}
-                    })
-
-    except WebSocketDisconnect:
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(frame.get("code", 1000))
+            manager.seen(websocket)
+            session_manager.touch(session_id)
+            try:
+                command = codec.decode(frame.get("bytes") or frame.get("text") or "")
+            except ValueError as e:
+                # A malformed command is answered, not fatal to the connection
+                await manager.send(websocket, {
+                    "type": "error",
+                    "data": {"message": f"Invalid command: {e}"}
+                })
+                continue
+
+            if profile and command is not None:
+                with profiled(f"ws-{type(command).__name__}"):
+                    await handle_command(websocket, session, session_id, command)
+            else:
+                await handle_command(websocket, session, session_id, command)
+
+    except WebSocketDisconnect as e:
         manager.disconnect(websocket, session_id)
+        event_log.event(
+            "ws_disconnect",
+            session_id=session_id,
+            latency_ms=(time.perf_counter() - connected) * 1000,
+            code=e.code
+        )
     except Exception as e:
-        print(f"WebSocket error: {e}")
         manager.disconnect(websocket, session_id)
+        event_log.event(
+            "ws_error",
+            logging.ERROR,
+            session_id=session_id,
+            latency_ms=(time.perf_counter() - connected) * 1000,
+            exc_info=e
+        )
+
+
+async def handle_command(websocket: WebSocket, session, session_id: str, command):
+    """Execute one decoded WebSocket command."""
+    start = time.perf_counter()
+    if isinstance(command, SendMessage):
+        # Encrypt and broadcast
+        try:
+            encrypted_msg = session.encrypt_message(command.sender, command.message)
+        except ValueError as e:
+            # A one-time-pad session out of key material until its refill lands
+            event_log.event(
+                "message", logging.WARNING, session_id=session_id, transport="ws", success=False, error=str(e)
+            )
+            await manager.send(websocket, {
+                "type": "error",
+                "data": {"message": f"Encryption failed: {str(e)}"}
+            })
+            return
+        await manager.broadcast({
+            "type": "new_message",
+            "data": encrypted_msg.to_dict()
+        }, session_id)
+        event_log.event(
+            "message",
+            session_id=session_id,
+            latency_ms=(time.perf_counter() - start) * 1000,
+            transport="ws",
+            success=True
+        )
+
+    elif isinstance(command, DecryptMessage):
+        ciphertext = command.ciphertext
+        try:
+            plaintext = session.decrypt_message(ciphertext)
+            await manager.send(websocket, {
+                "type": "decrypted_message",
+                "data": {
+                    "ciphertext": ciphertext,
+                    "plaintext": plaintext
+                }
+            })
+            event_log.event(
+                "decrypt",
+                session_id=session_id,
+                latency_ms=(time.perf_counter() - start) * 1000,
+                transport="ws",
+                success=True
+            )
+        except Exception as e:
+            event_log.event(
+                "decrypt",
+                logging.WARNING,
+                session_id=session_id,
+                transport="ws",
+                success=False,
+                error=str(e) or type(e).__name__
+            )
+            await manager.send(websocket, {
+                "type": "error",
+                "data": {"message": f"Decryption failed: {str(e)}"}
+            })
 
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
+    session_manager.purge_expired()
+    await _purge_rooms()
     return {
         "status": "healthy",
         "timestamp": datetime.utcnow().isoformat(),
-        "active_sessions": len(session_manager.sessions)
+        "active_sessions": len(session_manager.sessions),
+        "worker_pid": os.getpid(),
+        "websocket_connections": manager.connection_count,
+        "websocket_sessions": len(manager.active_connections),
+        "session_memory_bytes": session_manager.memory_bytes(),
+        "session_evictions": dict(session_manager.evictions),
+        "active_rooms": len(room_manager.rooms),
+        "room_memory_bytes": room_manager.memory_bytes(),
+        "room_evictions": dict(room_manager.evictions)
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus metrics, aggregated across all workers sharing METRICS_DIR."""
+    return PlainTextResponse(
+        REGISTRY.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
 # Serve static frontend files
 # Get the path to the frontend dist directory
 FRONTEND_DIST = Path(__file__).parent.parent.parent / "frontend" / "dist"
 
-# Mount static files if dist directory exists
+# Paths owned by the API; never answered with the SPA shell
+RESERVED_PREFIXES = ("api/", "ws/", "assets/")
+RESERVED_PATHS = frozenset({"health", "metrics", "docs", "openapi.json", "redoc"})
+
+# Cache the built frontend in memory if the dist directory exists
 if FRONTEND_DIST.exists():
-    app.mount("/assets", StaticFiles(directory=str(FRONTEND_DIST / "assets")), name="assets")
+    asset_cache = AssetCache(FRONTEND_DIST)
 
     @app.get("/{full_path:path}", include_in_schema=False)
-    async def serve_frontend(full_path: str = ""):
+    async def serve_frontend(
+        full_path: str = "",
+        accept_encoding: Optional[str] = Header(default=None),
+        if_none_match: Optional[str] = Header(default=None)
+    ):
         """Serve frontend files for all non-API routes."""
-        # Skip API routes - these should be handled by their specific endpoints
-        if full_path.startswith("api/") or full_path.startswith("ws/") or full_path == "health" or full_path == "docs" or full_path == "openapi.json" or full_path == "redoc":
-            raise HTTPException(status_code=404, detail="Not found")
-
-        # For root path or empty path, serve index.html
-        if full_path == "" or full_path == "/":
-            index_path = FRONTEND_DIST / "index.html"
-            if index_path.exists():
-                return FileResponse(index_path)
-            return {"error": "Frontend not built"}
-
-        # Try to serve the requested file
-        file_path = FRONTEND_DIST / full_path
-        if file_path.is_file():
-            return FileResponse(file_path)
-
-        # Default to index.html for SPA routing (for client-side routes)
-        index_path = FRONTEND_DIST / "index.html"
-        if index_path.exists():
-            return FileResponse(index_path)
-
-        return {"error": "Frontend not built"}
+        asset = asset_cache.get(full_path)
+        if asset is None:
+            # Unknown API paths and missing hashed assets are real 404s
+            if full_path in RESERVED_PATHS or full_path.startswith(RESERVED_PREFIXES):
+                raise HTTPException(status_code=404, detail="Not found")
+            # Root and client-side routes get the SPA shell
+            asset = asset_cache.index
+            if asset is None:
+                return {"error": "Frontend not built"}
+        return asset_cache.respond(asset, accept_encoding, if_none_match)
 
 
 if __name__ == "__main__":
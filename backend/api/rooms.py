@@ -0,0 +1,330 @@
+"""
+Group rooms sharing one room key.
+
+Every member reaches the server through its own session, i.e. its own
+pairwise BB84 key. A room holds a random room key; each member receives it
+wrapped (encrypted) under that member's pairwise key, as a token of the
+member's session cipher. Messages are then encrypted once under the room
+key, and the same ciphertext frame is broadcast to every member.
+
+Each membership change starts a new key epoch: a fresh room key is wrapped
+for the remaining members. Joiners cannot read earlier messages and
+leavers cannot read later ones. Rekeying costs one symmetric encryption per
+member; nobody re-runs BB84. Every message records its epoch, and members
+can decrypt messages from the epoch they joined in onwards.
+
+A rekey is all or nothing: if any member's key cannot be wrapped (e.g. its
+one-time pad is exhausted) the room keeps its previous epoch and members.
+
+Rooms are kept in memory per worker and are not written to the message log.
+They live as long as their members' sessions: members whose session has
+expired are dropped by :meth:`RoomManager.purge_expired`, and a room with no
+live member is deleted. History, retained epochs, members and rooms are all
+capped.
+"""
+import os
+import secrets
+import sys
+import time
+import uuid
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Deque, Dict, Iterable, List, Optional, Tuple
+
+from ..encryption.otp import PadExhausted
+from ..models.records import RoomMessageRecord
+from ..telemetry import metrics
+from .session_manager import (
+    CRYPTO_STATE_BYTES,
+    MESSAGE_OVERHEAD_BYTES,
+    Session,
+    SessionManager
+)
+
+# Bytes of randomness in each room key
+ROOM_KEY_BYTES = 32
+
+# Messages kept per room; older ones are dropped from the history
+ROOM_MAX_MESSAGES = int(os.getenv("ROOM_MAX_MESSAGES", 1000))
+# Key epochs kept per room; messages of older epochs can no longer be decrypted
+ROOM_MAX_EPOCHS = int(os.getenv("ROOM_MAX_EPOCHS", 64))
+ROOM_MAX_MEMBERS = int(os.getenv("ROOM_MAX_MEMBERS", 256))
+# Rooms kept per worker before the least recently active is deleted
+ROOM_MAX_COUNT = int(os.getenv("ROOM_MAX_COUNT", 1000))
+# Minimum seconds between sweeps for members whose session expired
+ROOM_SWEEP_INTERVAL = float(os.getenv("ROOM_SWEEP_INTERVAL", 30))
+
+# Rough per-object overheads, in the spirit of the session accounting
+ROOM_OVERHEAD_BYTES = 1000
+MEMBER_OVERHEAD_BYTES = 200
+
+
+class RoomFull(Exception):
+    """Raised when a session tries to join a room at ``ROOM_MAX_MEMBERS``."""
+
+
+class Room:
+    """A group of sessions sharing the current room key."""
+
+    def __init__(self, room_id: str, name: Optional[str] = None):
+        self.room_id = room_id
+        self.name = name
+        self.created_at = datetime.utcnow().isoformat()
+        # Member session id -> epoch it joined in
+        self.members: Dict[str, int] = {}
+        # Current key epoch (-1 until the first rekey)
+        self.epoch = -1
+        # Room cipher of every retained epoch
+        self.keys: Dict[int, object] = {}
+        # Current room key wrapped under each member's pairwise key
+        self.wrapped: Dict[str, str] = {}
+        self.messages: Deque[RoomMessageRecord] = deque()
+        self.message_bytes = 0
+
+    def is_member(self, session_id: str) -> bool:
+        return session_id in self.members
+
+    def rekey(self, sessions: Dict[str, Session], joined: Dict[str, int]) -> Dict[str, str]:
+        """
+        Start a new epoch with ``sessions`` as its members.
+
+        The new key is wrapped for every member before anything is changed,
+        so a failed wrap leaves the room as it was.
+
+        Args:
+            sessions: Live session of every member of the new epoch
+            joined: Epoch each member joined in; new members are absent
+
+        Returns:
+            Wrapped room key per member session id
+
+        Raises:
+            PadExhausted: If a one-time-pad member has too little pad left
+        """
+        # Imported on first use so the app loads without the crypto stack
+        from ..encryption import QuantumCrypto
+        room_key = secrets.token_bytes(ROOM_KEY_BYTES)
+        wrapped = {
+            session_id: session.crypto.encrypt_file(room_key).decode('ascii')
+            for session_id, session in sessions.items()
+        }
+
+        self.epoch += 1
+        self.keys[self.epoch] = QuantumCrypto(room_key.hex())
+        self.members = {session_id: joined.get(session_id, self.epoch) for session_id in sessions}
+        self.wrapped = wrapped
+        self._prune()
+        return wrapped
+
+    def _prune(self) -> None:
+        """Drop keys and messages no member can still decrypt, or beyond the caps."""
+        floor = max(min(self.members.values(), default=self.epoch), self.epoch - ROOM_MAX_EPOCHS + 1)
+        messages = self.messages
+        while messages and (len(messages) > ROOM_MAX_MESSAGES or messages[0].epoch < floor):
+            record = messages.popleft()
+            self.message_bytes -= MESSAGE_OVERHEAD_BYTES + sys.getsizeof(record.ciphertext)
+        # Keys are only needed for the current epoch and retained history
+        if messages:
+            floor = max(floor, messages[0].epoch)
+        for epoch in [epoch for epoch in self.keys if epoch < floor]:
+            del self.keys[epoch]
+
+    def encrypt(self, sender: str, message: str) -> RoomMessageRecord:
+        """Encrypt a message once under the current room key and store it."""
+        record = RoomMessageRecord(sender, self.keys[self.epoch].encrypt_token(message), time.time(), self.epoch)
+        self.messages.append(record)
+        self.message_bytes += MESSAGE_OVERHEAD_BYTES + sys.getsizeof(record.ciphertext)
+        self._prune()
+        return record
+
+    def decrypt(self, session_id: str, ciphertext: str, epoch: int) -> str:
+        """
+        Decrypt a room message for a member.
+
+        Raises:
+            ValueError: If the epoch does not exist or was discarded, predates
+                the member joining, or the ciphertext does not decrypt
+        """
+        if not 0 <= epoch <= self.epoch:
+            raise ValueError(f"Unknown key epoch {epoch}")
+        if epoch < self.members[session_id]:
+            raise ValueError("Messages sent before joining the room cannot be decrypted")
+        key = self.keys.get(epoch)
+        if key is None:
+            raise ValueError(f"Key epoch {epoch} has been discarded")
+        return key.decrypt(ciphertext)
+
+    def history(self, session_id: str) -> List[dict]:
+        """Retained messages a member can decrypt, oldest first."""
+        joined = self.members[session_id]
+        return [record.to_dict() for record in self.messages if record.epoch >= joined]
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by the room."""
+        return (
+            ROOM_OVERHEAD_BYTES
+            + self.message_bytes
+            + len(self.keys) * CRYPTO_STATE_BYTES
+            + len(self.members) * MEMBER_OVERHEAD_BYTES
+            + sum(sys.getsizeof(token) for token in self.wrapped.values())
+        )
+
+    def get_info(self) -> dict:
+        """Get room information."""
+        return {
+            'room_id': self.room_id,
+            'name': self.name,
+            'created_at': self.created_at,
+            'epoch': self.epoch,
+            'members': list(self.members),
+            'message_count': len(self.messages)
+        }
+
+
+class RoomManager:
+    """Creates rooms and rekeys them as members join, leave or expire."""
+
+    def __init__(
+        self,
+        sessions: SessionManager,
+        max_rooms: int = ROOM_MAX_COUNT,
+        sweep_interval: float = ROOM_SWEEP_INTERVAL
+    ):
+        self.sessions = sessions
+        self.max_rooms = max_rooms
+        self.sweep_interval = sweep_interval
+        # Least recently active first
+        self.rooms: "OrderedDict[str, Room]" = OrderedDict()
+        self.evictions: Dict[str, int] = {'expired': 0, 'capacity': 0}
+        self._last_sweep = time.monotonic()
+
+    def get_room(self, room_id: str) -> Optional[Room]:
+        room = self.rooms.get(room_id)
+        if room is not None:
+            self.rooms.move_to_end(room_id)
+        return room
+
+    def _rekey(
+        self,
+        room: Room,
+        reason: str,
+        joining: Optional[str] = None,
+        leaving: Iterable[str] = ()
+    ) -> Dict[str, str]:
+        """
+        Wrap a fresh room key for every member whose session is still alive.
+
+        Membership only changes once every wrap has succeeded.
+
+        Raises:
+            PadExhausted: If a one-time-pad member has too little pad left
+        """
+        leaving = set(leaving)
+        members = [session_id for session_id in room.members if session_id not in leaving]
+        if joining is not None:
+            members.append(joining)
+        live = {}
+        for session_id in members:
+            # A rekey is not member activity and must not extend their sessions;
+            # expired or deleted sessions no longer hold a pairwise key
+            session = self.sessions.peek_session(session_id)
+            if session is not None:
+                live[session_id] = session
+        if not live:
+            self.rooms.pop(room.room_id, None)
+            room.members.clear()
+            room.wrapped.clear()
+            return {}
+        wrapped = room.rekey(live, room.members)
+        metrics.ROOM_REKEYS.labels(reason).inc()
+        return wrapped
+
+    def create_room(self, session_id: str, name: Optional[str] = None) -> Tuple[Room, Dict[str, str]]:
+        """
+        Create a room with one member.
+
+        Beyond ``max_rooms`` the least recently active room is deleted.
+
+        Returns:
+            Tuple of (room, wrapped room key per member)
+
+        Raises:
+            PadExhausted: If the creator's one-time pad is exhausted
+        """
+        room = Room(str(uuid.uuid4()), name)
+        wrapped = self._rekey(room, 'create', joining=session_id)
+        while self.max_rooms > 0 and len(self.rooms) >= self.max_rooms:
+            self.rooms.popitem(last=False)
+            self.evictions['capacity'] += 1
+        self.rooms[room.room_id] = room
+        return room, wrapped
+
+    def join(self, room: Room, session_id: str) -> Dict[str, str]:
+        """
+        Add a member and rekey so it cannot read earlier messages.
+
+        Returns:
+            Wrapped room key per member, including the new one
+
+        Raises:
+            RoomFull: If the room is at ``ROOM_MAX_MEMBERS``
+            PadExhausted: If a member's one-time pad is exhausted
+        """
+        if room.is_member(session_id):
+            return room.wrapped
+        if len(room.members) >= ROOM_MAX_MEMBERS:
+            raise RoomFull(f"Room is full ({ROOM_MAX_MEMBERS} members)")
+        return self._rekey(room, 'join', joining=session_id)
+
+    def leave(self, room: Room, session_id: str) -> Dict[str, str]:
+        """
+        Remove a member and rekey so it cannot read later messages.
+
+        The room is deleted when no member with a live session remains.
+
+        Returns:
+            Wrapped room key per remaining member
+
+        Raises:
+            PadExhausted: If a remaining member's one-time pad is exhausted
+        """
+        return self._rekey(room, 'leave', leaving=(session_id,))
+
+    def purge_expired(self, now: Optional[float] = None) -> List[Tuple[Room, Dict[str, str]]]:
+        """
+        Drop members whose session has expired, at most once per ``sweep_interval``.
+
+        Members whose session was only evicted for capacity, and can still be
+        recovered from the message log, stay.
+
+        Rooms left without a live member are deleted; the others are rekeyed
+        so expired members cannot read later messages. A room whose rekey
+        fails keeps its members and is retried on the next sweep.
+
+        Returns:
+            ``(room, wrapped keys)`` of every room that was rekeyed
+        """
+        if now is None:
+            now = time.monotonic()
+        if now - self._last_sweep < self.sweep_interval:
+            return []
+        self._last_sweep = now
+
+        rekeyed = []
+        for room in list(self.rooms.values()):
+            expired = [session_id for session_id in room.members if self.sessions.is_expired(session_id)]
+            if not expired:
+                continue
+            if len(expired) == len(room.members):
+                del self.rooms[room.room_id]
+                self.evictions['expired'] += 1
+                continue
+            try:
+                rekeyed.append((room, self._rekey(room, 'expire', leaving=expired)))
+            except PadExhausted:
+                continue
+        return rekeyed
+
+    def memory_bytes(self) -> int:
+        """Approximate total memory held by all rooms."""
+        return sum(room.memory_bytes() for room in self.rooms.values())
@@ -0,0 +1,111 @@
+"""
+Secondary indexes for the session registry.
+
+:class:`SortedIndex` keeps ``(key, session_id)`` pairs in a sorted list so a
+page can be read by seeking to a cursor with bisect and walking ``limit``
+entries, instead of materialising and sorting every session. Cursors are
+opaque URL-safe strings wrapping the last ``(key, session_id)`` returned.
+"""
+import base64
+import json
+import math
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Iterator, List, Optional, Tuple
+
+Entry = Tuple[Any, str]
+
+# Type of the key each cursor kind carries; anything else would make the
+# bisect in SortedIndex.walk compare unlike types and raise TypeError
+CURSOR_KEY_TYPES = {
+    'created': (str,),          # naive-UTC ISO creation time
+    'activity': (int, float),   # monotonic last activity
+    'export': (int,)            # message sequence number
+}
+
+
+class SortedIndex:
+    """Sorted ``(key, session_id)`` pairs with O(log n) seeks."""
+
+    def __init__(self):
+        self._entries: List[Entry] = []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, key: Any, session_id: str) -> None:
+        insort(self._entries, (key, session_id))
+
+    def remove(self, key: Any, session_id: str) -> None:
+        entries = self._entries
+        i = bisect_left(entries, (key, session_id))
+        if i < len(entries) and entries[i] == (key, session_id):
+            del entries[i]
+
+    def walk(
+        self,
+        after: Optional[Entry] = None,
+        descending: bool = True,
+        low: Any = None,
+        high: Any = None
+    ) -> Iterator[Entry]:
+        """
+        Iterate entries past a cursor position.
+
+        Args:
+            after: Last entry of the previous page, exclusive (None = start)
+            descending: Walk from the largest key down
+            low: Stop at keys below this bound (inclusive bound)
+            high: Stop at keys above this bound (inclusive bound)
+
+        Yields:
+            ``(key, session_id)`` pairs in order
+        """
+        entries = self._entries
+        if descending:
+            i = len(entries) if after is None else bisect_left(entries, tuple(after))
+            if high is not None:
+                i = min(i, bisect_right(entries, (high, '￿')))
+            for j in range(i - 1, -1, -1):
+                entry = entries[j]
+                if low is not None and entry[0] < low:
+                    return
+                yield entry
+        else:
+            i = 0 if after is None else bisect_right(entries, tuple(after))
+            if low is not None:
+                i = max(i, bisect_left(entries, (low, '')))
+            for j in range(i, len(entries)):
+                entry = entries[j]
+                if high is not None and entry[0] > high:
+                    return
+                yield entry
+
+
+def encode_cursor(sort: str, entry: Entry) -> str:
+    raw = json.dumps([sort, entry[0], entry[1]], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode()
+
+
+def decode_cursor(cursor: str, sort: str) -> Entry:
+    """
+    Decode a cursor produced by :func:`encode_cursor`.
+
+    Raises:
+        ValueError: If the cursor is malformed, was issued for another sort
+            or carries a key of the wrong type
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        cursor_sort, key, session_id = json.loads(raw)
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if cursor_sort != sort or not isinstance(session_id, str):
+        raise ValueError("Cursor does not match the requested sort order")
+    key_types = CURSOR_KEY_TYPES.get(sort)
+    if key_types is not None and (
+        isinstance(key, bool)
+        or not isinstance(key, key_types)
+        or (isinstance(key, float) and not math.isfinite(key))
+    ):
+        raise ValueError("Invalid cursor")
+    return key, session_id
@@ -1,108 +1,843 @@
 """
 Session manager for handling quantum key exchange sessions.
 """
+import heapq
+import json
+import os
+import sys
 import uuid
 import hashlib
-from datetime import datetime
-from typing import Dict, Optional, List
-from ..bb84 import BB84Protocol
-from ..encryption import QuantumCrypto
-from ..models.schemas import EncryptedMessage
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import partial
+from typing import Callable, Dict, Optional, List, Tuple
+from .session_index import SortedIndex, decode_cursor, encode_cursor
+from ..models.records import MessageRecord
+from ..storage import MessageLog, SessionLog, Transcript, TranscriptStore
+from ..telemetry import metrics
+
+# Expiry defaults (seconds); overridable through the environment
+DEFAULT_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", 30 * 60))
+DEFAULT_MAX_AGE = float(os.getenv("SESSION_MAX_AGE", 24 * 60 * 60))
+DEFAULT_MAX_SESSIONS = int(os.getenv("SESSION_MAX_COUNT", 1000))
+
+# Unused one-time-pad bytes below which a session starts a background refill
+OTP_LOW_WATER = int(os.getenv("OTP_LOW_WATER_BYTES", 4096))
+# Pad bytes issued per fsync of a logged session's pad high-water mark
+OTP_OFFSET_LEASE = int(os.getenv("OTP_OFFSET_LEASE_BYTES", 4096))
+
+# Page size limits for list_sessions
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+SORT_ORDERS = ('created', 'activity')
+
+# Messages serialized (and optionally decrypted) per worker-thread batch of an export
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 500))
+MAX_EXPORT_BATCH_SIZE = 5000
+
+# Rough per-object overheads measured with tracemalloc, used for memory accounting
+MESSAGE_OVERHEAD_BYTES = 96
+SESSION_OVERHEAD_BYTES = 1500
+CRYPTO_STATE_BYTES = 400
 
 
 class Session:
     """Represents a quantum-secured chat session."""
 
-    def __init__(self, session_id: str, quantum_key: str, bb84_result: dict):
+    def __init__(
+        self,
+        session_id: str,
+        quantum_key: str,
+        bb84_result: dict,
+        log: Optional[SessionLog] = None,
+        created_at: Optional[str] = None,
+        user_id: Optional[str] = None,
+        encryption: str = 'fernet',
+        refill: Optional[Callable[[], bytes]] = None,
+        mac_key_bytes: Optional[int] = None
+    ):
         self.session_id = session_id
+        self.user_id = user_id
         self.quantum_key = quantum_key
+        # Non-reversible hash, not raw key; computed once since the key never changes
+        self.key_fingerprint = hashlib.sha256(quantum_key.encode()).hexdigest()[:16]
         self.bb84_result = bb84_result
-        self.crypto = QuantumCrypto(quantum_key)
-        self.messages: List[EncryptedMessage] = []
-        self.created_at = datetime.utcnow().isoformat()
+        self.encryption = encryption
+        # Imported on first use so the app loads without the crypto stack
+        if encryption == 'otp':
+            from ..encryption import OneTimePad
+            self.crypto = OneTimePad(
+                bytes.fromhex(quantum_key),
+                low_water=OTP_LOW_WATER,
+                refill=refill,
+                on_refill=self._persist_pad,
+                on_advance=self._persist_offset,
+                lease=OTP_OFFSET_LEASE,
+                **({} if mac_key_bytes is None else {'mac_key_bytes': mac_key_bytes})
+            )
+        else:
+            from ..encryption import QuantumCrypto
+            self.crypto = QuantumCrypto(quantum_key)
+        self.messages: List[MessageRecord] = []
+        self.created_at = created_at or datetime.utcnow().isoformat()
+        self.log = log
 
-    def encrypt_message(self, sender: str, message: str) -> EncryptedMessage:
-        """Encrypt and store a message."""
-        ciphertext = self.crypto.encrypt(message)
-        encrypted_msg = EncryptedMessage(
-            sender=sender,
-            ciphertext=ciphertext,
-            timestamp=datetime.utcnow().isoformat()
+        # Monotonic clocks drive expiry; wall-clock created_at is for display only
+        self.created_monotonic = time.monotonic()
+        self.last_activity = self.created_monotonic
+        # last_activity as currently recorded in the registry's activity index
+        self.indexed_activity: Optional[float] = None
+
+        # Approximate resident size: session + crypto state, grows with messages
+        self.memory_bytes = (
+            SESSION_OVERHEAD_BYTES
+            + CRYPTO_STATE_BYTES
+            + sys.getsizeof(quantum_key)
+            + sys.getsizeof(session_id)
         )
-        self.messages.append(encrypted_msg)
-        return encrypted_msg
+        if encryption == 'otp':
+            self.memory_bytes += self.crypto.size
+
+    def _persist_pad(self, chunk: bytes) -> None:
+        # Runs on the refill thread; the chunk is on disk before any of it is used
+        if self.log is not None:
+            self.log.append_pad(chunk)
+
+    def _persist_offset(self, offset: int) -> None:
+        # Under the pad lock, before the bytes below offset reach a ciphertext
+        if self.log is not None:
+            self.log.write_pad_offset(offset)
+
+    def touch(self) -> None:
+        """Record activity on the session, pushing back its idle expiry."""
+        self.last_activity = time.monotonic()
+
+    def unload(self) -> None:
+        """Close the session's log, recording its last activity for recovery."""
+        if self.log is not None:
+            self.log.mark_active(time.time() - (time.monotonic() - self.last_activity))
+            self.log.close()
+            self.log = None
+
+    def encrypt_message(self, sender: str, message: str) -> MessageRecord:
+        """Encrypt and store a message."""
+        start = time.perf_counter()
+        record = MessageRecord(sender, self.crypto.encrypt_token(message), time.time())
+        if self.log is not None:
+            self.log.append(record.sender, record.ciphertext, record.timestamp)
+        self._store(record)
+        self.touch()
+        metrics.ENCRYPT_SECONDS.observe(time.perf_counter() - start)
+        metrics.MESSAGES.inc()
+        return record
+
+    def _store(self, record: MessageRecord) -> None:
+        """Keep a message in memory and account for its size."""
+        self.messages.append(record)
+        # Senders are interned and shared, so only the ciphertext grows per message
+        self.memory_bytes += MESSAGE_OVERHEAD_BYTES + sys.getsizeof(record.ciphertext)
+
+    def replay_log(self) -> None:
+        """Rebuild the in-memory history from the session's message log."""
+        pad_used = 0
+        for entry in self.log.read():
+            self._store(MessageRecord(entry.sender, entry.ciphertext, entry.timestamp))
+            if self.encryption == 'otp':
+                pad_used = max(pad_used, self.crypto.token_span(entry.ciphertext)[1])
+        if self.encryption == 'otp':
+            # Refills and the consumed offset, so no pad byte is issued twice;
+            # the fsynced high-water mark covers records lost to the group commit
+            self.crypto.extend(self.log.read_pad())
+            self.crypto.offset = self.crypto.durable = max(
+                pad_used, self.log.read_pad_offset(), self.crypto.mac_key_bytes
+            )
 
     def decrypt_message(self, ciphertext: str) -> str:
         """Decrypt a message."""
-        return self.crypto.decrypt(ciphertext)
+        self.touch()
+        start = time.perf_counter()
+        try:
+            plaintext = self.crypto.decrypt(ciphertext)
+        except Exception:
+            metrics.DECRYPTS.labels('failure').inc()
+            raise
+        metrics.DECRYPT_SECONDS.observe(time.perf_counter() - start)
+        metrics.DECRYPTS.labels('success').inc()
+        return plaintext
+
+    def export_range(
+        self,
+        start: int = 0,
+        end: Optional[int] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None
+    ) -> Tuple[int, int, str]:
+        """
+        Resolve the message range of an export.
+
+        The range is fixed when the export starts, so messages sent while it
+        streams are left for the next export (resume from its cursor).
+
+        Args:
+            start: First sequence number (message index) to export
+            end: Sequence number to stop before (default: current end of history)
+            limit: Maximum number of messages
+            cursor: Cursor from a previous export; replaces ``start``
+
+        Returns:
+            Tuple of (first seq, seq to stop before, cursor resuming after the range)
+
+        Raises:
+            ValueError: If the cursor is malformed or belongs to another session
+        """
+        if cursor is not None:
+            start, session_id = decode_cursor(cursor, 'export')
+            if session_id != self.session_id or not isinstance(start, int) or start < 0:
+                raise ValueError("Cursor does not belong to this session")
+        stop = len(self.messages) if end is None else min(end, len(self.messages))
+        if limit is not None:
+            stop = min(stop, start + limit)
+        stop = max(stop, start)
+        return start, stop, encode_cursor('export', (stop, self.session_id))
+
+    def export_batch(self, start: int, stop: int, decrypt: bool = False) -> str:
+        """
+        Serialize messages ``[start, stop)`` as NDJSON lines.
+
+        Each line is the message's ``EncryptedMessage`` JSON plus its ``seq``;
+        with ``decrypt`` it also has ``plaintext``, or ``error`` if the token
+        does not decrypt. Meant for a worker thread, one batch at a time.
+        """
+        lines = []
+        failures = 0
+        for seq in range(start, stop):
+            entry = self.messages[seq].to_dict()
+            entry['seq'] = seq
+            if decrypt:
+                try:
+                    entry['plaintext'] = self.crypto.decrypt(entry['ciphertext'])
+                except Exception as e:
+                    entry['error'] = str(e) or type(e).__name__
+                    failures += 1
+            lines.append(json.dumps(entry))
+            lines.append('\n')
+        if decrypt:
+            metrics.DECRYPTS.labels('success').inc(stop - start - failures)
+            if failures:
+                metrics.DECRYPTS.labels('failure').inc(failures)
+        return ''.join(lines)
+
+    def expires_at(self, idle_ttl: float, max_age: float) -> float:
+        """
+        Compute the monotonic time at which this session expires.
+
+        Args:
+            idle_ttl: Seconds of inactivity before expiry
+            max_age: Seconds since creation before expiry, regardless of activity
+
+        Returns:
+            Earliest of the idle and absolute deadlines
+        """
+        return min(self.last_activity + idle_ttl, self.created_monotonic + max_age)
 
     def get_info(self) -> dict:
         """Get session information."""
-        # Use non-reversible hash fingerprint instead of exposing key bits
-        key_fingerprint = hashlib.sha256(self.quantum_key.encode()).hexdigest()[:16]
         return {
             'session_id': self.session_id,
-            'key_fingerprint': key_fingerprint,  # Non-reversible hash, not raw key
+            'user_id': self.user_id,
+            'key_fingerprint': self.key_fingerprint,  # Non-reversible hash, not raw key
             'key_length': self.bb84_result.get('key_length', 0),
             'qber': self.bb84_result.get('qber'),
             'created_at': self.created_at,
-            'message_count': len(self.messages)
+            'message_count': len(self.messages),
+            'encryption': self.encryption,
+            'pad_remaining': self.crypto.remaining if self.encryption == 'otp' else None
         }
 
 
+def build_protocol(config: dict, seed: Optional[int] = None):
+    """
+    Build a QKDProtocol from a key exchange configuration.
+
+    Args:
+        config: BB84 configuration parameters
+        seed: Random generator seed, to reproduce a recorded run
+
+    Returns:
+        Configured QKDProtocol
+
+    Raises:
+        ValueError: If the configuration cannot run (see :class:`QKDProtocol`)
+    """
+    # numpy is only loaded once the first exchange runs
+    from ..bb84 import QKDProtocol
+    eve_strategy = config.get('eve_strategy', 'intercept_resend')
+    eve_intercept_prob = config.get('eve_intercept_prob')
+    if eve_intercept_prob is None:
+        # PNS reads multi-photon pulses for free; intercepting single photons is opt-in
+        eve_intercept_prob = 0.0 if eve_strategy == 'pns' else 1.0
+    return QKDProtocol(
+        key_length=config.get('key_length', 256),
+        enable_eve=config.get('enable_eve', False),
+        eve_intercept_prob=eve_intercept_prob,
+        qber_threshold=config.get('qber_threshold', 0.11),
+        trace=config.get('trace', False),
+        detail=config.get('detail', 'summary'),
+        trace_points=config.get('trace_points', 512),
+        seed=seed,
+        qber_estimation=config.get('qber_estimation', 'full'),
+        qber_confidence=config.get('qber_confidence', 0.99),
+        qber_margin=config.get('qber_margin', 0.06),
+        eve_strategy=eve_strategy,
+        eve_disturbance=config.get('eve_disturbance', 0.15),
+        mean_photons=config.get('mean_photons', 0.1),
+        protocol=config.get('protocol', 'bb84')
+    )
+
+
+def check_result(bb84_result: dict) -> dict:
+    """
+    Count a failed BB84 run and turn it into an error.
+
+    Args:
+        bb84_result: Result of a BB84 run
+
+    Returns:
+        The result, if the run succeeded
+
+    Raises:
+        ValueError: If the protocol failed (QBER too high or too few bits)
+    """
+    if not bb84_result['success']:
+        metrics.KEY_EXCHANGES.labels(_outcome(bb84_result)).inc()
+        message = f"BB84 protocol failed: {bb84_result.get('failure_reason', 'Unknown error')}"
+        if bb84_result.get('transcript_id'):
+            message += f" (transcript {bb84_result['transcript_id']})"
+        raise ValueError(message)
+    return bb84_result
+
+
+def _outcome(bb84_result: dict) -> str:
+    if bb84_result['success']:
+        return 'success'
+    return 'qber_failure' if bb84_result['error_detected'] else 'insufficient_bits'
+
+
+def record_transcript(protocol, config: dict, bb84_result: dict) -> None:
+    """
+    Queue a transcript of a finished run if recording is enabled for its outcome.
+
+    On success the result gains a ``transcript_id``.
+
+    Args:
+        protocol: The BB84Protocol that produced the result
+        config: Configuration the protocol was built from
+        bb84_result: Result of the run
+    """
+    if transcript_store is None or not transcript_store.wants(bb84_result['success']):
+        return
+    arrays = {name: values for name, values in protocol.arrays.items() if values is not None}
+    transcript_id = transcript_store.submit(
+        Transcript(protocol.seed, config, _outcome(bb84_result), arrays)
+    )
+    if transcript_id is not None:
+        bb84_result['transcript_id'] = transcript_id
+
+
+def replay_transcript(transcript: Transcript) -> dict:
+    """
+    Re-run a recorded exchange from its seed and compare it with the recording.
+
+    Args:
+        transcript: Transcript loaded from the store
+
+    Returns:
+        Dict with ``matches`` (every recorded array reproduced bit for bit),
+        ``mismatched_arrays`` and the replayed ``bb84_result``
+    """
+    import numpy as np
+    protocol = build_protocol(transcript.config, seed=transcript.seed)
+    bb84_result = protocol.run()
+    mismatched = [
+        name for name, recorded in transcript.arrays.items()
+        if protocol.arrays.get(name) is None
+        or not np.array_equal(protocol.arrays[name].astype(np.uint8), recorded.astype(np.uint8))
+    ]
+    return {
+        'transcript_id': transcript.transcript_id,
+        'matches': not mismatched,
+        'mismatched_arrays': mismatched,
+        'bb84_result': bb84_result
+    }
+
+
+def refill_pad(config: dict) -> bytes:
+    """
+    Run a fresh key exchange to extend a one-time pad.
+
+    Args:
+        config: BB84 configuration of the session's original exchange
+
+    Returns:
+        New key material
+
+    Raises:
+        ValueError: If the exchange failed
+    """
+    return bytes.fromhex(run_key_exchange(config)['final_key'])
+
+
+def run_key_exchange(config: dict) -> dict:
+    """
+    Run the BB84 simulation for a key exchange.
+
+    Touches no session state, so it is safe to call from a worker thread;
+    register the result with :meth:`SessionManager.register_session`.
+
+    Args:
+        config: BB84 configuration parameters
+
+    Returns:
+        BB84 result dictionary of a successful run
+
+    Raises:
+        ValueError: If the protocol failed (QBER too high or too few bits)
+    """
+    protocol = build_protocol(config)
+    bb84_result = protocol.run()
+    record_transcript(protocol, config, bb84_result)
+    return check_result(bb84_result)
+
+
 class SessionManager:
-    """Manages multiple quantum-secured chat sessions."""
+    """
+    Manages multiple quantum-secured chat sessions.
+
+    Sessions expire after ``idle_ttl`` seconds without activity or ``max_age``
+    seconds after creation, whichever comes first. Expiry is driven by a
+    lazy-deletion min-heap holding one entry per session: an entry whose
+    deadline has moved on (because the session was touched) is re-pushed with
+    the current deadline when it reaches the top, rather than updated in place.
+    Beyond ``max_sessions`` the least recently used session is evicted.
+
+    With a ``message_log`` every session is also persisted to disk. Expired
+    and deleted sessions are removed from disk; sessions evicted for capacity
+    stay there and, like sessions from a previous process, are recovered
+    lazily the next time they are requested, unless their idle or absolute
+    deadline passed in the meantime. :meth:`sweep_log` removes such expired
+    sessions that nobody requests.
+
+    Secondary indexes by user, creation time and last activity back
+    :meth:`list_sessions`, so a page costs O(page) rather than O(sessions).
+    """
+
+    def __init__(
+        self,
+        idle_ttl: float = DEFAULT_IDLE_TTL,
+        max_age: float = DEFAULT_MAX_AGE,
+        max_sessions: int = DEFAULT_MAX_SESSIONS,
+        message_log: Optional[MessageLog] = None
+    ):
+        self.idle_ttl = idle_ttl
+        self.max_age = max_age
+        self.max_sessions = max_sessions
+        self.message_log = message_log
+        # Ordered by recency of use; the first entry is the LRU candidate
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._expiry_heap: List[Tuple[float, str]] = []
+        self.evictions: Dict[str, int] = {'idle': 0, 'max_age': 0, 'capacity': 0}
+        # Secondary indexes, maintained by _index/_unindex/_touch
+        self._by_user: Dict[str, Dict[str, None]] = {}
+        self._by_created = SortedIndex()
+        self._by_activity = SortedIndex()
+        # Runs one-time-pad refills, e.g. under the key-exchange concurrency limit
+        self.refill_gate: Optional[Callable[[Callable[[], bytes]], bytes]] = None
 
-    def __init__(self):
-        self.sessions: Dict[str, Session] = {}
+    def _refill(self, config: dict) -> bytes:
+        """Refill a one-time pad, through :attr:`refill_gate` when one is set."""
+        refill = partial(refill_pad, config)
+        gate = self.refill_gate
+        return refill() if gate is None else gate(refill)
 
-    def create_session(self, config: dict) -> tuple[str, str, dict]:
+    def create_session(self, config: dict, user_id: Optional[str] = None) -> tuple[str, str, dict]:
         """
         Create a new session with BB84 key exchange.
 
         Args:
             config: BB84 configuration parameters
+            user_id: Identifier of the user who requested the exchange
 
         Returns:
             Tuple of (session_id, quantum_key, bb84_result)
         """
-        # Run BB84 protocol
-        protocol = BB84Protocol(
-            key_length=config.get('key_length', 256),
-            enable_eve=config.get('enable_eve', False),
-            eve_intercept_prob=config.get('eve_intercept_prob', 1.0),
-            qber_threshold=config.get('qber_threshold', 0.11)
-        )
+        return self.register_session(run_key_exchange(config), user_id, config)
 
-        bb84_result = protocol.run()
+    def register_session(
+        self,
+        bb84_result: dict,
+        user_id: Optional[str] = None,
+        config: Optional[dict] = None
+    ) -> tuple[str, str, dict]:
+        """
+        Create and register a session for a successful BB84 run.
 
-        if not bb84_result['success']:
-            raise ValueError(f"BB84 protocol failed: {bb84_result.get('failure_reason', 'Unknown error')}")
+        Args:
+            bb84_result: Result returned by :func:`run_key_exchange`
+            user_id: Identifier of the user who requested the exchange
+            config: BB84 configuration of the run; its ``encryption`` picks the
+                session cipher, and one-time-pad sessions refill with it
 
-        # Create session
+        Returns:
+            Tuple of (session_id, quantum_key, bb84_result)
+        """
         session_id = str(uuid.uuid4())
         quantum_key = bb84_result['final_key']
+        encryption = (config or {}).get('encryption', 'fernet')
 
-        session = Session(session_id, quantum_key, bb84_result)
-        self.sessions[session_id] = session
+        session = Session(
+            session_id,
+            quantum_key,
+            bb84_result,
+            user_id=user_id,
+            encryption=encryption,
+            refill=partial(self._refill, config) if encryption == 'otp' else None
+        )
+        if self.message_log is not None:
+            meta = {
+                'quantum_key': quantum_key,
+                'bb84_result': bb84_result,
+                'created_at': session.created_at,
+                'user_id': user_id,
+                'encryption': encryption,
+                'config': config
+            }
+            if encryption == 'otp':
+                # Recovery must keep back the same MAC key bytes
+                meta['otp_mac_key_bytes'] = session.crypto.mac_key_bytes
+            session.log = self.message_log.create(session_id, meta)
+        self.add_session(session)
+        metrics.KEY_EXCHANGES.labels('success').inc()
+        metrics.SESSIONS_CREATED.inc()
 
         return session_id, quantum_key, bb84_result
 
+    def add_session(self, session: Session) -> None:
+        """Register a session, evicting expired or least recently used ones to make room."""
+        self.purge_expired()
+        while self.max_sessions > 0 and len(self.sessions) >= self.max_sessions:
+            _, evicted = self.sessions.popitem(last=False)
+            self._unindex(evicted)
+            evicted.unload()
+            self._count_eviction('capacity')
+
+        self.sessions[session.session_id] = session
+        self._index(session)
+        heapq.heappush(
+            self._expiry_heap,
+            (session.expires_at(self.idle_ttl, self.max_age), session.session_id)
+        )
+
+    def _index(self, session: Session) -> None:
+        if session.user_id is not None:
+            self._by_user.setdefault(session.user_id, {})[session.session_id] = None
+        self._by_created.add(session.created_at, session.session_id)
+        session.indexed_activity = session.last_activity
+        self._by_activity.add(session.indexed_activity, session.session_id)
+
+    def _unindex(self, session: Session) -> None:
+        if session.user_id is not None:
+            user_sessions = self._by_user.get(session.user_id)
+            if user_sessions is not None:
+                user_sessions.pop(session.session_id, None)
+                if not user_sessions:
+                    del self._by_user[session.user_id]
+        self._by_created.remove(session.created_at, session.session_id)
+        self._by_activity.remove(session.indexed_activity, session.session_id)
+
+    def _touch(self, session: Session) -> None:
+        """Mark a registered session as recently used and update its indexes."""
+        session.touch()
+        self.sessions.move_to_end(session.session_id)
+        # The newest activity always sorts last, so this is a cheap append
+        self._by_activity.remove(session.indexed_activity, session.session_id)
+        session.indexed_activity = session.last_activity
+        self._by_activity.add(session.indexed_activity, session.session_id)
+
     def get_session(self, session_id: str) -> Optional[Session]:
-        """Get a session by ID."""
-        return self.sessions.get(session_id)
+        """Get a session by ID, marking it as recently used."""
+        session = self.peek_session(session_id)
+        if session:
+            self._touch(session)
+        return session
+
+    def peek_session(self, session_id: str) -> Optional[Session]:
+        """
+        Get a session by ID without marking it as used.
+
+        A session evicted for capacity is reloaded from the message log, but
+        keeps its recorded last activity, so peeking never extends its life.
+        """
+        self.purge_expired()
+        session = self.sessions.get(session_id)
+        if session is None and self.message_log is not None:
+            session = self._recover(session_id)
+        return session
+
+    def is_expired(self, session_id: str) -> bool:
+        """
+        Whether a session is gone: expired, deleted or never created.
+
+        Sessions evicted for capacity but still recoverable from the message
+        log are not expired. Nothing is loaded or touched.
+        """
+        self.purge_expired()
+        if session_id in self.sessions:
+            return False
+        if self.message_log is None:
+            return True
+        persisted = self.message_log.peek(session_id)
+        if persisted is None:
+            return True
+        meta, last_active = persisted
+        return self._expiry_reason(meta, last_active, time.time()) is not None
+
+    def _recover(self, session_id: str) -> Optional[Session]:
+        """Rebuild a session from the message log on first access."""
+        opened = self.message_log.open(session_id)
+        if opened is None:
+            return None
+        meta, log = opened
+
+        now = time.time()
+        reason = self._expiry_reason(meta, log.last_active, now)
+        if reason is not None:
+            self.message_log.delete(session_id, log)
+            self._count_eviction(reason)
+            return None
+
+        session = Session(
+            session_id,
+            meta['quantum_key'],
+            meta['bb84_result'],
+            log=log,
+            created_at=meta['created_at'],
+            user_id=meta.get('user_id'),
+            encryption=meta.get('encryption', 'fernet'),
+            refill=partial(self._refill, meta['config']) if meta.get('encryption') == 'otp' else None,
+            mac_key_bytes=meta.get('otp_mac_key_bytes')
+        )
+        session.created_monotonic = time.monotonic() - (now - _created_timestamp(meta))
+        session.last_activity = time.monotonic() - (now - log.last_active)
+        session.replay_log()
+        self.add_session(session)
+        return session
+
+    def _expiry_reason(self, meta: dict, last_active: float, now: float) -> Optional[str]:
+        """Why a persisted session has expired (``max_age`` or ``idle``), or None."""
+        if now - _created_timestamp(meta) >= self.max_age:
+            return 'max_age'
+        if now - last_active >= self.idle_ttl:
+            return 'idle'
+        return None
+
+    def sweep_log(self) -> int:
+        """
+        Delete expired sessions from the message log that are not loaded.
+
+        Sessions evicted for capacity or left by a previous process are
+        otherwise only removed when requested. Sessions loaded by any worker
+        hold their log's lock and are skipped. Safe to run in a worker thread.
+
+        Returns:
+            Number of sessions removed
+        """
+        if self.message_log is None:
+            return 0
+        removed = 0
+        for session_id in self.message_log.session_ids():
+            if session_id in self.sessions:
+                continue
+            reason = self.message_log.reap(
+                session_id, lambda meta, last_active: self._expiry_reason(meta, last_active, time.time())
+            )
+            if reason is not None:
+                self._count_eviction(reason)
+                removed += 1
+        return removed
+
+    def close(self) -> None:
+        """Unload every session, recording its last activity in the message log."""
+        for session in self.sessions.values():
+            session.unload()
+
+    def touch(self, session_id: str) -> None:
+        """Mark a session as recently used without an expiry sweep."""
+        session = self.sessions.get(session_id)
+        if session:
+            self._touch(session)
 
     def delete_session(self, session_id: str) -> bool:
         """Delete a session."""
         if session_id in self.sessions:
-            del self.sessions[session_id]
+            # The heap entry becomes stale and is discarded when it surfaces
+            session = self.sessions.pop(session_id)
+            self._unindex(session)
+            self._discard_log(session)
             return True
+        if self.message_log is not None:
+            opened = self.message_log.open(session_id)
+            if opened is not None:
+                self.message_log.delete(session_id, opened[1])
+                return True
         return False
 
-    def list_sessions(self) -> List[dict]:
-        """List all active sessions."""
-        return [session.get_info() for session in self.sessions.values()]
+    def _discard_log(self, session: Session) -> None:
+        if session.log is not None:
+            self.message_log.delete(session.session_id, session.log)
+            session.log = None
+
+    def purge_expired(self, now: Optional[float] = None) -> int:
+        """
+        Remove every session whose idle or absolute deadline has passed.
+
+        Args:
+            now: Monotonic timestamp to expire against (defaults to now)
+
+        Returns:
+            Number of sessions removed
+        """
+        if now is None:
+            now = time.monotonic()
+
+        removed = 0
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now:
+            _, session_id = heapq.heappop(heap)
+            session = self.sessions.get(session_id)
+            if session is None:
+                continue  # Already deleted or evicted
+
+            deadline = session.expires_at(self.idle_ttl, self.max_age)
+            if deadline > now:
+                # Touched since this entry was pushed; reschedule
+                heapq.heappush(heap, (deadline, session_id))
+                continue
+
+            del self.sessions[session_id]
+            self._unindex(session)
+            self._discard_log(session)
+            if now >= session.created_monotonic + self.max_age:
+                self._count_eviction('max_age')
+            else:
+                self._count_eviction('idle')
+            removed += 1
+
+        # Keep stale entries from accumulating under heavy create/delete churn
+        if len(heap) > 2 * len(self.sessions) + 64:
+            self._expiry_heap = [
+                (s.expires_at(self.idle_ttl, self.max_age), sid)
+                for sid, s in self.sessions.items()
+            ]
+            heapq.heapify(self._expiry_heap)
+
+        return removed
+
+    def _count_eviction(self, reason: str) -> None:
+        self.evictions[reason] += 1
+        metrics.SESSIONS_EVICTED.labels(reason).inc()
+
+    def memory_bytes(self) -> int:
+        """Approximate total memory held by all sessions."""
+        return sum(session.memory_bytes for session in self.sessions.values())
+
+    def list_sessions(
+        self,
+        limit: int = DEFAULT_PAGE_SIZE,
+        cursor: Optional[str] = None,
+        sort: str = 'created',
+        descending: bool = True,
+        user_id: Optional[str] = None,
+        created_after: Optional[datetime] = None,
+        created_before: Optional[datetime] = None,
+        active_within: Optional[float] = None
+    ) -> Tuple[List[dict], Optional[str]]:
+        """
+        List one page of active sessions.
+
+        Args:
+            limit: Maximum sessions to return (capped at MAX_PAGE_SIZE)
+            cursor: ``next_cursor`` from the previous page
+            sort: ``created`` (creation time) or ``activity`` (last use)
+            descending: Newest first when true
+            user_id: Only sessions created by this user
+            created_after: Only sessions created at or after this time
+            created_before: Only sessions created at or before this time
+            active_within: Only sessions used in the last N seconds
+
+        Returns:
+            Tuple of (session infos, cursor for the next page or None)
+
+        Raises:
+            ValueError: For an unknown sort order or an invalid cursor
+        """
+        if sort not in SORT_ORDERS:
+            raise ValueError(f"Unknown sort order: {sort}")
+        self.purge_expired()
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        after = decode_cursor(cursor, sort) if cursor else None
+
+        created_low = _created_key(created_after)
+        created_high = _created_key(created_before)
+        active_low = time.monotonic() - active_within if active_within is not None else None
+
+        if user_id is not None:
+            # A user's sessions are few; index them on the fly by the sort key
+            index = SortedIndex()
+            for session_id in self._by_user.get(user_id, ()):
+                session = self.sessions[session_id]
+                key = session.created_at if sort == 'created' else session.indexed_activity
+                index.add(key, session_id)
+        else:
+            index = self._by_created if sort == 'created' else self._by_activity
+
+        if sort == 'created':
+            low, high = created_low, created_high
+        else:
+            low, high = active_low, None
+
+        page: List[dict] = []
+        last = None
+        for entry in index.walk(after, descending, low, high):
+            session = self.sessions[entry[1]]
+            # Filters on the other key are checked per entry
+            if created_low is not None and session.created_at < created_low:
+                continue
+            if created_high is not None and session.created_at > created_high:
+                continue
+            if active_low is not None and session.indexed_activity < active_low:
+                continue
+            if len(page) == limit:
+                return page, encode_cursor(sort, last)
+            page.append(session.get_info())
+            last = entry
+        return page, None
+
+
+def _created_timestamp(meta: dict) -> float:
+    """Epoch seconds of a persisted session's naive-UTC ``created_at``."""
+    return datetime.fromisoformat(meta['created_at']).replace(tzinfo=timezone.utc).timestamp()
+
+
+def _created_key(value: Optional[datetime]) -> Optional[str]:
+    """Convert a datetime to the naive-UTC ISO format used for ``created_at``."""
+    if value is None:
+        return None
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.isoformat()
 
 
-# Global session manager instance
-session_manager = SessionManager()
+# Global session manager and transcript store instances
+session_manager = SessionManager(message_log=MessageLog.from_env())
+transcript_store = TranscriptStore.from_env()
@@ -0,0 +1,36 @@
+"""
+Server-Sent Events helpers.
+"""
+import json
+from typing import Callable
+
+from fastapi.responses import StreamingResponse
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one SSE event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class EventStream(StreamingResponse):
+    """
+    ``text/event-stream`` response that calls ``on_close`` however it ends.
+
+    A body generator's ``finally`` does not run if the client disconnects
+    before the first chunk is pulled, so resources held for the stream are
+    released here instead.
+    """
+
+    def __init__(self, content, on_close: Callable[[], None]):
+        super().__init__(
+            content,
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+        self.on_close = on_close
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.on_close()
@@ -0,0 +1,128 @@
+"""
+In-memory, precompressed cache of the built frontend (``frontend/dist``).
+
+Every file is read once at startup and stored with its gzip (and, when the
+optional ``brotli`` package is installed, brotli) variant, a strong ETag, its
+content type and ready-made response headers. Serving a file is a dict lookup
+plus content negotiation; the filesystem is never touched per request.
+
+Vite emits content-hashed file names under ``assets/``; those are served with
+``immutable`` caching. Everything else (``index.html``) must be revalidated,
+which the ETag turns into a cheap 304.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+from fastapi import Response
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+# Compressing tiny or already-compressed files costs more than it saves
+MIN_COMPRESS_SIZE = 512
+COMPRESSIBLE_TYPES = (
+    "text/", "application/javascript", "application/json", "application/xml", "image/svg+xml"
+)
+
+
+class Asset:
+    """One cached file with its encoded variants and response headers."""
+
+    __slots__ = ('body', 'variants', 'etag', 'headers')
+
+    def __init__(self, body: bytes, content_type: str, cache_control: str):
+        self.body = body
+        self.etag = '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+        self.variants: Dict[str, bytes] = {}
+
+        compressible = content_type.startswith(COMPRESSIBLE_TYPES)
+        if compressible and len(body) >= MIN_COMPRESS_SIZE:
+            if brotli is not None:
+                encoded = brotli.compress(body, quality=11)
+                if len(encoded) < len(body):
+                    self.variants['br'] = encoded
+            encoded = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(encoded) < len(body):
+                self.variants['gzip'] = encoded
+
+        self.headers = {
+            'content-type': content_type,
+            'cache-control': cache_control,
+            'etag': self.etag,
+        }
+        if self.variants:
+            self.headers['vary'] = 'Accept-Encoding'
+
+
+def _accepted_encodings(header: Optional[str]) -> set:
+    """Encodings the client accepts (q > 0) from an Accept-Encoding header."""
+    accepted = set()
+    if not header:
+        return accepted
+    for part in header.split(','):
+        token, _, params = part.strip().partition(';')
+        params = params.replace(' ', '')
+        if params.startswith('q='):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(token.strip().lower())
+    return accepted
+
+
+class AssetCache:
+    """Path -> Asset map built from a directory."""
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.assets: Dict[str, Asset] = {}
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = Path(dirpath) / filename
+                relative = path.relative_to(root).as_posix()
+                content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                if content_type.startswith('text/') or content_type == 'application/javascript':
+                    content_type += '; charset=utf-8'
+                cache_control = IMMUTABLE if relative.startswith('assets/') else REVALIDATE
+                self.assets[relative] = Asset(path.read_bytes(), content_type, cache_control)
+        self.index = self.assets.get('index.html')
+
+    def get(self, path: str) -> Optional[Asset]:
+        return self.assets.get(path)
+
+    @staticmethod
+    def respond(asset: Asset, accept_encoding: Optional[str], if_none_match: Optional[str]) -> Response:
+        """
+        Build the response for ``asset``.
+
+        Args:
+            asset: Cached asset to serve
+            accept_encoding: Request ``Accept-Encoding`` header
+            if_none_match: Request ``If-None-Match`` header
+
+        Returns:
+            304 when the client's copy is current, otherwise the best encoding
+        """
+        if if_none_match and (if_none_match.strip() == '*' or asset.etag in if_none_match):
+            return Response(status_code=304, headers=asset.headers)
+
+        body = asset.body
+        headers = asset.headers
+        if asset.variants and accept_encoding:
+            accepted = _accepted_encodings(accept_encoding)
+            for encoding in ('br', 'gzip'):
+                if encoding in accepted and encoding in asset.variants:
+                    body = asset.variants[encoding]
+                    headers = {**headers, 'content-encoding': encoding}
+                    break
+        return Response(content=body, headers=headers)
@@ -0,0 +1,138 @@
+"""
+WebSocket wire formats for the chat endpoint.
+
+Two subprotocols are supported, negotiated through ``Sec-WebSocket-Protocol``:
+
+- ``quantum-chat.json`` (default, and used when the client offers none):
+  text frames carrying ``{"type": ..., ...}`` JSON objects.
+- ``quantum-chat.msgpack``: binary MessagePack frames. Server events keep the
+  JSON shape (``{"type": ..., "data": ...}``) but every ``ciphertext`` field is
+  the raw Fernet token bytes rather than its base64 text. Client commands are
+  positional arrays, decoded straight into typed commands:
+
+      ["send_message", sender, message]
+      ["decrypt_message", ciphertext_bytes]
+
+The server sends a ``ping`` event every ``WS_PING_INTERVAL`` seconds. Clients
+answer with ``{"type": "pong"}`` (``["pong"]`` in MessagePack); any frame
+counts, and a pong decodes to no command.
+
+Events are encoded once per format and the same frame is sent to every
+recipient using that format. ``decode`` raises ``ValueError`` for a frame that
+is not a well-formed command, e.g. a non-string sender.
+"""
+import base64
+import json
+from typing import Any, NamedTuple, Optional, Union
+
+import msgpack
+
+JSON_SUBPROTOCOL = 'quantum-chat.json'
+MSGPACK_SUBPROTOCOL = 'quantum-chat.msgpack'
+
+Frame = Union[str, bytes]
+
+
+class SendMessage(NamedTuple):
+    """Client command: encrypt and broadcast a message."""
+    sender: str
+    message: str
+
+
+class DecryptMessage(NamedTuple):
+    """Client command: decrypt a ciphertext (Fernet token text)."""
+    ciphertext: str
+
+
+Command = Union[SendMessage, DecryptMessage]
+
+
+def _text(value: Any, field: str) -> str:
+    if not isinstance(value, str):
+        raise ValueError(f"{field} must be a string")
+    return value
+
+
+class JsonCodec:
+    """Text JSON frames; the original protocol spoken by the web frontend."""
+
+    subprotocol = JSON_SUBPROTOCOL
+    binary = False
+
+    def encode(self, event: dict) -> Frame:
+        return json.dumps(event, separators=(',', ':'), ensure_ascii=False)
+
+    def decode(self, frame: Frame) -> Optional[Command]:
+        data = json.loads(frame)
+        if not isinstance(data, dict):
+            raise ValueError("Commands must be JSON objects")
+        kind = data.get('type')
+        if kind == 'send_message':
+            return SendMessage(
+                _text(data.get('sender', 'anonymous'), 'sender'),
+                _text(data.get('message', ''), 'message')
+            )
+        if kind == 'decrypt_message':
+            return DecryptMessage(_text(data.get('ciphertext', ''), 'ciphertext'))
+        return None
+
+
+def _raw_ciphertexts(value: Any) -> Any:
+    """Replace base64 ``ciphertext`` fields with the raw token bytes."""
+    if isinstance(value, list):
+        return [_raw_ciphertexts(item) for item in value]
+    if isinstance(value, dict):
+        converted = {key: _raw_ciphertexts(item) for key, item in value.items()}
+        ciphertext = converted.get('ciphertext')
+        if isinstance(ciphertext, str):
+            converted['ciphertext'] = base64.urlsafe_b64decode(ciphertext)
+        return converted
+    return value
+
+
+class MsgpackCodec:
+    """Binary MessagePack frames with raw ciphertext bytes."""
+
+    subprotocol = MSGPACK_SUBPROTOCOL
+    binary = True
+
+    def encode(self, event: dict) -> Frame:
+        return msgpack.packb(_raw_ciphertexts(event), use_bin_type=True)
+
+    def decode(self, frame: Frame) -> Optional[Command]:
+        if isinstance(frame, str):
+            frame = frame.encode('utf-8')
+        fields = msgpack.unpackb(frame, raw=False, use_list=False)
+        if not isinstance(fields, tuple) or not fields:
+            raise ValueError("Commands must be MessagePack arrays")
+        kind = fields[0]
+        if kind == 'send_message' and len(fields) == 3:
+            return SendMessage(_text(fields[1], 'sender'), _text(fields[2], 'message'))
+        if kind == 'decrypt_message' and len(fields) == 2:
+            ciphertext = fields[1]
+            if isinstance(ciphertext, bytes):
+                ciphertext = base64.urlsafe_b64encode(ciphertext).decode('ascii')
+            return DecryptMessage(_text(ciphertext, 'ciphertext'))
+        return None
+
+
+JSON_CODEC = JsonCodec()
+MSGPACK_CODEC = MsgpackCodec()
+CODECS = {codec.subprotocol: codec for codec in (JSON_CODEC, MSGPACK_CODEC)}
+
+
+def negotiate(offered: list) -> Union[JsonCodec, MsgpackCodec]:
+    """
+    Pick a codec from the subprotocols offered by the client.
+
+    Args:
+        offered: Subprotocols from the WebSocket handshake, in client preference order
+
+    Returns:
+        The first supported codec, falling back to JSON
+    """
+    for name in offered:
+        codec = CODECS.get(name)
+        if codec is not None:
+            return codec
+    return JSON_CODEC
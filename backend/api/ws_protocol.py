@@ -0,0 +1,87 @@
+"""
+WebSocket protocol with size-thresholded permessage-deflate.
+
+uvicorn's websockets implementation negotiates permessage-deflate (RFC 7692)
+and then compresses every message, so a 100-byte chat event pays for a zlib
+pass that saves nothing. RFC 7692 lets a sender leave any message
+uncompressed (RSV1 unset), so this extension compresses only messages of at
+least ``WS_COMPRESS_THRESHOLD`` bytes (large ``message_history`` frames and
+batches). Smaller messages go out as-is. Compression stays negotiated with
+the client as before; browsers need no changes.
+
+Use it with ``uvicorn --ws backend.api.ws_protocol:WebSocketProtocol`` or,
+under gunicorn, ``worker_class = "backend.api.ws_protocol.UvicornWorker"``.
+"""
+import dataclasses
+import os
+
+from uvicorn.protocols.websockets.websockets_impl import WebSocketProtocol as _WebSocketProtocol
+from uvicorn.workers import UvicornWorker as _UvicornWorker
+from websockets import frames
+from websockets.extensions.permessage_deflate import (
+    PerMessageDeflate,
+    ServerPerMessageDeflateFactory
+)
+
+from ..telemetry import metrics
+
+COMPRESS_THRESHOLD = int(os.getenv('WS_COMPRESS_THRESHOLD', 1024))
+COMPRESS_LEVEL = int(os.getenv('WS_COMPRESS_LEVEL', 6))
+
+
+class ThresholdPerMessageDeflate(PerMessageDeflate):
+    """permessage-deflate that sends messages below ``threshold`` uncompressed."""
+
+    def __init__(self, *args, threshold: int = COMPRESS_THRESHOLD, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.threshold = threshold
+
+    def encode(self, frame: frames.Frame) -> frames.Frame:
+        if frame.opcode in frames.CTRL_OPCODES:
+            return frame
+        # Only whole single-frame messages may skip compression; the compressor
+        # context only ever sees compressed messages, so skipping keeps it in
+        # step with the client's decompressor.
+        if frame.fin and frame.opcode is not frames.OP_CONT and len(frame.data) < self.threshold:
+            metrics.WS_DEFLATE_MESSAGES.labels('skipped').inc()
+            return frame
+
+        encoded = super().encode(frame)
+        metrics.WS_DEFLATE_MESSAGES.labels('compressed').inc()
+        metrics.WS_DEFLATE_BYTES.labels('in').inc(len(frame.data))
+        metrics.WS_DEFLATE_BYTES.labels('out').inc(len(encoded.data))
+        return encoded
+
+
+class ThresholdDeflateFactory(ServerPerMessageDeflateFactory):
+    """Negotiates permessage-deflate exactly as websockets does, with a threshold."""
+
+    def __init__(self, threshold: int = COMPRESS_THRESHOLD, level: int = COMPRESS_LEVEL):
+        super().__init__(compress_settings={'level': level})
+        self.threshold = threshold
+
+    def process_request_params(self, params, accepted_extensions):
+        response_params, extension = super().process_request_params(params, accepted_extensions)
+        return response_params, ThresholdPerMessageDeflate(
+            extension.remote_no_context_takeover,
+            extension.local_no_context_takeover,
+            extension.remote_max_window_bits,
+            extension.local_max_window_bits,
+            extension.compress_settings,
+            threshold=self.threshold
+        )
+
+
+class WebSocketProtocol(_WebSocketProtocol):
+    """uvicorn's websockets protocol using :class:`ThresholdDeflateFactory`."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.config.ws_per_message_deflate:
+            self.available_extensions = [ThresholdDeflateFactory()]
+
+
+class UvicornWorker(_UvicornWorker):
+    """gunicorn worker class serving WebSockets through :class:`WebSocketProtocol`."""
+
+    CONFIG_KWARGS = {**_UvicornWorker.CONFIG_KWARGS, 'ws': WebSocketProtocol}
@@ -1,9 +1,18 @@
 """
 BB84 Quantum Key Distribution Protocol Implementation.
 Simplified implementation based on https://github.com/qwertystars/BB84
-"""
-from .protocol import BB84Protocol
 
+The same engine also runs B92, the six-state protocol and E91.
+"""
 __all__ = [
     'BB84Protocol',
+    'QKDProtocol',
 ]
+
+
+def __getattr__(name):
+    # Imported lazily so loading the package does not pull in numpy
+    if name in __all__:
+        from . import protocol
+        return getattr(protocol, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -1,165 +1,406 @@
 """
-BB84 protocol - Simplified implementation based on GitHub BB84 repo
+QKD protocol engine - Simplified implementation based on GitHub BB84 repo
 From: https://github.com/qwertystars/BB84
+
+The stages (prepare, attack, noise, measure, sift, estimate) are shared
+numpy passes; BB84, B92, the six-state protocol and E91 are configurations
+of them (see :mod:`.schemes`).
 """
+import base64
+import math
+import secrets
 import numpy as np
-from typing import Dict, Any
+from typing import Any, Dict, Iterator, Optional
 from .utils import (
-    generate_random_bits,
-    generate_random_bases,
     apply_channel_error,
-    sift_key,
     calculate_qber,
-    bits_to_hex_key
+    compare_arrays,
+    bits_to_hex_key,
+    make_rng,
+    pack_bits,
+    qber_sample_size,
+    qubits_for_sifted,
+    serfling_margin
 )
+from .eve import EVE_STRATEGIES
+from .schemes import SCHEMES
+from ..telemetry import StageTimer
+from ..telemetry.metrics import BB84_STAGE_SECONDS
+
+CHANNEL_ERROR_RATE = 0.01  # 1% channel noise
+# Per-qubit arrays included in the ``visualization`` of detail='trace'
+VISUALIZED_ARRAYS = ('alice_bits', 'alice_bases', 'bob_bases', 'bob_bits', 'eve_intercepts')
+# Largest QBER sample, relative to the key, a sampled exchange may disclose;
+# near the shortest key that can reach the margin the sample grows without bound
+MAX_SAMPLE_RATIO = 4
 
 
-class BB84Protocol:
-    """Simplified BB84 protocol for quantum key distribution."""
+class QKDProtocol:
+    """Simplified quantum key distribution over a configurable protocol."""
 
     def __init__(
         self,
         key_length: int = 256,
         enable_eve: bool = False,
         eve_intercept_prob: float = 0.5,
-        qber_threshold: float = 0.11
+        qber_threshold: float = 0.11,
+        trace: bool = False,
+        detail: str = 'summary',
+        trace_points: int = 512,
+        seed: Optional[int] = None,
+        qber_estimation: str = 'full',
+        qber_confidence: float = 0.99,
+        qber_margin: float = 0.06,
+        eve_strategy: str = 'intercept_resend',
+        eve_disturbance: float = 0.15,
+        mean_photons: float = 0.1,
+        protocol: str = 'bb84'
     ):
         """
-        Initialize the BB84 protocol.
+        Initialize the protocol.
 
         Args:
             key_length: Desired length of final key in bits
             enable_eve: Whether to enable eavesdropping simulation
-            eve_intercept_prob: Fraction of qubits Eve intercepts (0.0-1.0)
+            eve_intercept_prob: Fraction of qubits Eve intercepts (0.0-1.0); for
+                ``pns``, the fraction of single-photon pulses
             qber_threshold: Maximum acceptable QBER (typically ~11% for BB84)
+            trace: Record wall and CPU time per stage in the result's ``trace``
+            detail: ``none`` omits per-party state, ``summary`` reports aggregate
+                counts and ``trace`` adds sampled per-qubit arrays
+                (``visualization``)
+            trace_points: Maximum qubits sampled for ``detail='trace'``
+            seed: Seed for this run's random generator (random if omitted);
+                the same seed and parameters reproduce the run exactly
+            qber_estimation: ``full`` compares every sifted bit; ``sampled``
+                discloses only a random sample and aborts on a Serfling upper
+                bound of the QBER in the remaining (key) bits
+            qber_confidence: Confidence of that upper bound
+            qber_margin: Largest margin between the sampled QBER and its bound;
+                together with the confidence this fixes the sample size, and
+                enough qubits are sent to cover the sample and the key. The
+                margin must leave room under ``qber_threshold`` for honest
+                noise (about 2% for B92)
+            eve_strategy: Attack from :data:`~.eve.EVE_STRATEGIES`
+            eve_disturbance: Error rate the ``cloning`` attack causes on attacked qubits
+            mean_photons: Mean photon number per pulse of the source, for ``pns``
+            protocol: Scheme from :data:`~.schemes.SCHEMES` (``bb84``, ``b92``,
+                ``six_state`` or ``e91``)
+
+        Raises:
+            ValueError: If the protocol or Eve strategy is unknown, the
+                strategy is not modelled for the protocol, or a sampled QBER
+                bound cannot fit under the threshold
         """
+        scheme = SCHEMES.get(protocol)
+        if scheme is None:
+            raise ValueError(f"Unknown QKD protocol: {protocol}")
+        if eve_strategy not in EVE_STRATEGIES:
+            raise ValueError(f"Unknown Eve strategy: {eve_strategy}")
+        if enable_eve and eve_strategy not in scheme.eve_strategies:
+            raise ValueError(f"Eve strategy {eve_strategy!r} is not modelled for {protocol}")
+        self.scheme = scheme
         self.key_length = key_length
         self.enable_eve = enable_eve
         self.eve_intercept_prob = eve_intercept_prob
+        self.eve_strategy = eve_strategy
+        self.eve_disturbance = eve_disturbance
+        self.mean_photons = mean_photons
         self.qber_threshold = qber_threshold
+        self.trace = trace
+        self.detail = detail
+        self.trace_points = trace_points
+        self.seed = seed if seed is not None else secrets.randbits(128)
+        self.rng = make_rng(self.seed)
+        # Per-qubit arrays of the last run, kept for transcripts
+        self.arrays: Dict[str, Optional[np.ndarray]] = {}
 
+        self.qber_estimation = qber_estimation
+        self.qber_confidence = qber_confidence
         # Calculate how many qubits we need to generate the desired key length
-        # We need about 4x because:
-        # - 50% are discarded during basis sifting (bases don't match)
+        # We need twice what sifting is expected to keep (4x for BB84) because:
+        # - Sifting discards qubits (50% in BB84, where bases don't match)
         # - We need overhead for error correction and privacy amplification
-        self.qubit_count = max(key_length * 4, 1000)
+        self.qubit_count = max(math.ceil(2 * key_length / scheme.sift_ratio), 1000)
+        self.sample_size = None
+        if qber_estimation == 'sampled':
+            # A margin at or above the threshold would abort every exchange,
+            # honest or not; a key too short for the margin is refused too
+            if qber_margin >= qber_threshold:
+                raise ValueError(
+                    f"qber_margin ({qber_margin:.3f}) must be below qber_threshold "
+                    f"({qber_threshold:.3f}) for a sampled QBER bound to pass"
+                )
+            self.sample_size = qber_sample_size(key_length, 1 - qber_confidence, qber_margin)
+            if self.sample_size > MAX_SAMPLE_RATIO * key_length:
+                raise ValueError(
+                    f"A {key_length}-bit key needs a {self.sample_size}-bit sample to bound QBER "
+                    f"within ±{qber_margin:.3f} at {qber_confidence:.2%} confidence; widen the "
+                    f"margin, use a longer key or qber_estimation 'full'"
+                )
+            # Sifting must leave the sample plus the key, and nothing more
+            self.qubit_count = qubits_for_sifted(key_length + self.sample_size, sift_ratio=scheme.sift_ratio)
 
     def run(self) -> Dict[str, Any]:
         """
-        Execute the complete BB84 protocol.
+        Execute the complete protocol.
 
         Returns:
             Dictionary with protocol results and statistics
         """
-        # Step 1: Alice generates random bits and encodes them in random bases
-        alice_bits = generate_random_bits(self.qubit_count)
-        alice_bases = generate_random_bases(self.qubit_count)
+        for event in self.run_stages():
+            pass
+        return event['result']
 
-        # Step 2: Bob generates random measurement bases
-        bob_bases = generate_random_bases(self.qubit_count)
+    def run_stages(self) -> Iterator[Dict[str, Any]]:
+        """
+        Execute the protocol step by step, yielding a progress event after each stage.
 
-        # Step 3: Simulate quantum channel transmission
-        transmitted_bits = alice_bits.copy()
+        Events are dicts with a ``stage`` key: ``qubits_sent``, ``eve`` (when
+        enabled), ``sifting_done``, ``qber_estimate`` (with ``chsh`` for E91)
+        and finally ``complete``, whose ``result`` is what :meth:`run` returns.
+        Closing the generator early abandons the run.
 
-        # Step 3a: Eve's intercept-resend attack (if enabled)
-        if self.enable_eve:
-            eve_bases = generate_random_bases(self.qubit_count)
-            eve_intercepts = np.random.random(self.qubit_count) < self.eve_intercept_prob
+        Yields:
+            Progress event dictionaries
+        """
+        timer = StageTimer(BB84_STAGE_SECONDS, trace=self.trace)
+
+        # Step 1: Alice picks her raw key bits and prepares them as (value, basis) states
+        rng = self.rng
+        scheme = self.scheme
+        alice_bits, alice_bases, values = scheme.prepare(self.qubit_count, rng)
 
-            for i in range(self.qubit_count):
-                if eve_intercepts[i]:
-                    # Eve measures in her random basis
-                    if alice_bases[i] != eve_bases[i]:
-                        # Wrong basis measurement causes 50% probability of error
-                        if np.random.random() < 0.5:
-                            transmitted_bits[i] = 1 - alice_bits[i]
+        # Step 2: Bob chooses random measurement bases
+        bob_bases = scheme.choose(scheme.bob_bases, self.qubit_count, rng)
+        timer.lap('generation')
+        yield {'stage': 'qubits_sent', 'qubits': self.qubit_count, 'protocol': scheme.name}
+
+        # Step 3a: Eve's attack (if enabled), one array pass over every qubit
+        sent_values, sent_bases = values, alice_bases
+        eve_bases = eve_intercepts = eve_bits = None
+        if self.enable_eve:
+            attack = EVE_STRATEGIES[self.eve_strategy](
+                values,
+                alice_bases,
+                rng,
+                scheme,
+                intercept_prob=self.eve_intercept_prob,
+                disturbance=self.eve_disturbance,
+                mean_photons=self.mean_photons
+            )
+            sent_values, sent_bases = attack.values, attack.bases
+            eve_bases, eve_intercepts, eve_bits = attack.eve_bases, attack.intercepts, attack.eve_bits
+            timer.lap('eve')
+            yield {
+                'stage': 'eve',
+                'strategy': self.eve_strategy,
+                'processed': self.qubit_count,
+                'qubits': self.qubit_count,
+                'intercepted': int(np.sum(eve_intercepts))
+            }
 
         # Step 3b: Channel noise (small error rate to be realistic)
-        channel_error_rate = 0.01  # 1% channel noise
-        transmitted_bits = apply_channel_error(transmitted_bits, channel_error_rate)
+        received_values = apply_channel_error(sent_values, CHANNEL_ERROR_RATE, rng)
+        noise = received_values != sent_values
+        timer.lap('noise')
 
         # Step 4: Bob measures the qubits
-        bob_bits = transmitted_bits.copy()
+        bob_bits = scheme.measure(received_values, sent_bases, bob_bases, rng)
+        timer.lap('measurement')
+        arrays = self.arrays = {
+            'alice_bits': alice_bits,
+            'alice_bases': alice_bases,
+            'bob_bases': bob_bases,
+            'bob_bits': bob_bits,
+            'eve_bases': eve_bases,
+            'eve_intercepts': eve_intercepts,
+            'eve_bits': eve_bits,
+            'noise': noise
+        }
 
-        # Step 5: Basis sifting - Alice and Bob publicly compare bases
-        sifted_key_str, matching_bases = sift_key(
-            alice_bits, bob_bits, alice_bases, bob_bases
-        )
+        # Step 5: Sifting - Alice and Bob publicly compare bases (or, in B92,
+        # Bob announces his conclusive outcomes)
+        kept, bob_key = scheme.sift(alice_bases, bob_bases, bob_bits)
+        sifted_alice = alice_bits[kept]
+        sifted_bob = bob_key[kept]
+        sifted_count = len(sifted_alice)
+        eve_state = self._eve_state(arrays, kept)
+        timer.lap('sifting')
+        yield {'stage': 'sifting_done', 'sifted_bits': sifted_count}
 
-        # Step 6: Calculate QBER from matching bases
-        qber = calculate_qber(alice_bits, bob_bits, matching_bases)
+        # Step 6: Estimate QBER
+        qber_stats = {}
+        if self.qber_estimation == 'sampled':
+            # Only a random sample is disclosed; the other sifted bits stay secret.
+            # Sifting rarely falls short of the planned sample (qubit_count
+            # allows three sigmas), in which case it shrinks slightly
+            sample_size = min(self.sample_size, max(sifted_count - self.key_length, 1), sifted_count)
+            sample = np.zeros(len(sifted_alice), dtype=bool)
+            sample[rng.permutation(len(sifted_alice))[:sample_size]] = True
+            arrays['qber_sample'] = sample
+            qber = compare_arrays(sifted_alice[sample], sifted_bob[sample])
+            qber_bound = qber + serfling_margin(sample_size, self.key_length, 1 - self.qber_confidence)
+            key_source = sifted_alice[~sample]
+            qber_stats = {'qber_upper_bound': qber_bound, 'qber_sample_size': sample_size}
+            failure_reason = (
+                f'QBER upper bound ({qber_bound:.2%}, sampled {qber:.2%}) exceeds threshold '
+                f'({self.qber_threshold:.2%}) - possible eavesdropping detected'
+            )
+        else:
+            qber = compare_arrays(sifted_alice, sifted_bob)
+            qber_bound = qber
+            key_source = sifted_alice
+            failure_reason = (
+                f'QBER ({qber:.2%}) exceeds threshold ({self.qber_threshold:.2%}) '
+                f'- possible eavesdropping detected'
+            )
+        # Protocol-specific tests, e.g. the CHSH inequality for E91
+        checks, check_failure = scheme.check(arrays)
+        qber_stats.update(checks)
+        timer.lap('qber')
+        yield {'stage': 'qber_estimate', 'qber': qber, 'qber_threshold': self.qber_threshold, **qber_stats}
 
-        # Step 7: Check if QBER is acceptable
-        if qber > self.qber_threshold:
-            return {
+        # Step 7: Check if QBER (and any protocol test) is acceptable
+        if qber_bound > self.qber_threshold or check_failure is not None:
+            if qber_bound <= self.qber_threshold:
+                failure_reason = check_failure
+            yield self._finish(timer, arrays, {
                 'success': False,
+                'protocol': scheme.name,
                 'key_established': False,
                 'final_key': '',
                 'key_length': 0,
                 'qber': qber,
                 'qber_threshold': self.qber_threshold,
+                **qber_stats,
                 'error_detected': True,
                 'eavesdropping_enabled': self.enable_eve,
-                'failure_reason': f'QBER ({qber:.2%}) exceeds threshold ({self.qber_threshold:.2%}) - possible eavesdropping detected',
+                'eve_state': eve_state,
+                'failure_reason': failure_reason,
                 'alice_state': {
                     'total_qubits': self.qubit_count,
-                    'sifted_bits': int(np.sum(matching_bases))
+                    'sifted_bits': sifted_count
                 },
                 'bob_state': {
                     'total_qubits': self.qubit_count,
-                    'sifted_bits': int(np.sum(matching_bases))
+                    'sifted_bits': sifted_count
                 }
-            }
-
-        # Step 8: Convert sifted bits to final key
-        sifted_bits_array = [int(b) for b in sifted_key_str]
+            })
+            return
 
-        if len(sifted_bits_array) < self.key_length:
-            return {
+        # Step 8: Convert the undisclosed sifted bits to the final key
+        if len(key_source) < self.key_length:
+            yield self._finish(timer, arrays, {
                 'success': False,
+                'protocol': scheme.name,
                 'key_established': False,
                 'final_key': '',
                 'key_length': 0,
                 'qber': qber,
                 'qber_threshold': self.qber_threshold,
+                **qber_stats,
                 'error_detected': False,
                 'eavesdropping_enabled': self.enable_eve,
-                'failure_reason': f'Insufficient sifted bits: have {len(sifted_bits_array)}, need {self.key_length}',
+                'eve_state': eve_state,
+                'failure_reason': f'Insufficient sifted bits: have {len(key_source)}, need {self.key_length}',
                 'alice_state': {
                     'total_qubits': self.qubit_count,
-                    'sifted_bits': len(sifted_bits_array)
+                    'sifted_bits': sifted_count
                 },
                 'bob_state': {
                     'total_qubits': self.qubit_count,
-                    'sifted_bits': len(sifted_bits_array)
+                    'sifted_bits': sifted_count
                 }
-            }
+            })
+            return
 
         # Convert bits to hex key
-        final_key = bits_to_hex_key(sifted_bits_array, self.key_length)
+        final_key = bits_to_hex_key(key_source, self.key_length)
+        timer.lap('key_conversion')
 
         # Success!
-        return {
+        yield self._finish(timer, arrays, {
             'success': True,
+            'protocol': scheme.name,
             'key_established': True,
             'final_key': final_key,
             'key_length': self.key_length,
             'qber': qber,
             'qber_threshold': self.qber_threshold,
+            **qber_stats,
             'error_detected': False,
             'eavesdropping_enabled': self.enable_eve,
+            'eve_state': eve_state,
             'alice_state': {
                 'total_qubits': self.qubit_count,
-                'sifted_bits': len(sifted_bits_array),
+                'sifted_bits': sifted_count,
                 'final_key_length': self.key_length
             },
             'bob_state': {
                 'total_qubits': self.qubit_count,
-                'sifted_bits': len(sifted_bits_array),
+                'sifted_bits': sifted_count,
                 'final_key_length': self.key_length
             }
+        })
+
+    def _finish(
+        self,
+        timer: StageTimer,
+        arrays: Dict[str, Any],
+        result: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Wrap a result in the ``complete`` event, applying the detail level and stage trace."""
+        if self.detail == 'none':
+            result['alice_state'] = {}
+            result['bob_state'] = {}
+            result['eve_state'] = None
+        elif self.detail == 'trace':
+            result['visualization'] = self._visualization(arrays)
+        if self.trace:
+            result['trace'] = timer.summary()
+        return {'stage': 'complete', 'result': result}
+
+    def _eve_state(self, arrays: Dict[str, Any], kept: np.ndarray) -> Optional[Dict[str, Any]]:
+        """Summarise the attack: qubits touched and sifted bits Eve holds correctly."""
+        if arrays['eve_intercepts'] is None:
+            return None
+        known = self.scheme.eve_knowledge(
+            arrays['eve_intercepts'], arrays['eve_bits'], arrays['eve_bases'], arrays['alice_bits']
+        ) & kept
+        return {
+            'strategy': self.eve_strategy,
+            'intercepted': int(np.sum(arrays['eve_intercepts'])),
+            'sifted_bits_known': int(np.sum(known))
         }
 
+    def _visualization(self, arrays: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Sample every ``stride``-th qubit and bit-pack the per-qubit arrays.
+
+        Returns:
+            Dict with ``qubits``, ``stride``, ``points`` and one packed base64
+            string per array (see :func:`pack_bits`); sample ``i`` is qubit
+            ``i * stride``. Basis arrays of protocols with more than two bases
+            (``basis_encoding: 'bytes'``) are one byte per sample instead
+        """
+        stride = -(-self.qubit_count // self.trace_points)
+        view = {
+            'qubits': self.qubit_count,
+            'stride': stride,
+            'points': len(range(0, self.qubit_count, stride)),
+            'basis_encoding': 'bits' if len(self.scheme.overlap) <= 2 else 'bytes'
+        }
+        for name in VISUALIZED_ARRAYS:
+            values = arrays[name]
+            if values is None:
+                continue
+            if name.endswith('_bases') and view['basis_encoding'] == 'bytes':
+                view[name] = base64.b64encode(values[::stride].astype(np.uint8).tobytes()).decode('ascii')
+            else:
+                view[name] = pack_bits(values[::stride])
+        return view
+
     def calculate_qber(self, alice_bits, bob_bits):
         """
         Calculate Quantum Bit Error Rate.
@@ -172,3 +413,7 @@ class BB84Protocol:
             QBER as a fraction
         """
         return calculate_qber(alice_bits, bob_bits, alice_bits == alice_bits)
+
+
+# BB84 is the engine's default protocol; the original name stays for existing callers
+BB84Protocol = QKDProtocol
@@ -0,0 +1,195 @@
+"""
+QKD protocols as configurations of the shared engine.
+
+Every protocol is described over integer basis indices. A qubit in flight is
+a ``(value, basis)`` pair, and measuring it in basis ``b`` reproduces
+``value`` with probability ``overlap[basis, b]`` (and flips it otherwise).
+Prepare, measure and sift are therefore single numpy passes for every
+protocol. A :class:`QKDScheme` only supplies the overlap matrix, which bases
+each party draws from, and any protocol-specific sifting or checks:
+
+- ``bb84``: two bases, keep qubits measured in the preparation basis
+- ``six_state``: three mutually unbiased bases, so Eve disturbs more often
+- ``b92``: two non-orthogonal states, keep Bob's conclusive outcomes
+- ``e91``: entangled pairs, with measurement angles chosen so that matching
+  angles give the key and the others test the CHSH inequality
+"""
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# Below this CHSH value the correlations admit a local (eavesdropped) explanation
+CHSH_CLASSICAL_BOUND = 2.0
+
+
+def polarization_overlap(angles) -> np.ndarray:
+    """Agreement probabilities cos^2(a - b) between linear polarization angles (degrees)."""
+    radians = np.radians(np.asarray(angles, dtype=float))
+    return np.cos(radians[:, None] - radians[None, :]) ** 2
+
+
+class QKDScheme:
+    """
+    Prepare-and-measure QKD protocol over a set of bases.
+
+    Subclasses override :meth:`prepare`, :meth:`sift` and :meth:`check` where
+    the protocol departs from BB84-style basis sifting.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        overlap: np.ndarray,
+        alice_bases: Tuple[int, ...],
+        bob_bases: Tuple[int, ...],
+        eve_bases: Tuple[int, ...],
+        sift_ratio: float,
+        eve_strategies: Tuple[str, ...]
+    ):
+        """
+        Initialize the scheme.
+
+        Args:
+            name: Name selectable through ``BB84Config.protocol``
+            overlap: ``overlap[i, j]`` is the probability that a state prepared
+                in basis ``i`` measures to its own value in basis ``j``
+            alice_bases: Bases Alice prepares in, drawn uniformly
+            bob_bases: Bases Bob measures in, drawn uniformly
+            eve_bases: Bases an intercept-resend Eve measures in
+            sift_ratio: Expected fraction of qubits kept by sifting
+            eve_strategies: Attacks from ``EVE_STRATEGIES`` modelled for this protocol
+        """
+        self.name = name
+        self.overlap = overlap
+        self.alice_bases = np.asarray(alice_bases)
+        self.bob_bases = np.asarray(bob_bases)
+        self.eve_bases = np.asarray(eve_bases)
+        self.sift_ratio = sift_ratio
+        self.eve_strategies = eve_strategies
+
+    @staticmethod
+    def choose(bases: np.ndarray, n: int, rng) -> np.ndarray:
+        """Draw ``n`` bases uniformly from ``bases``."""
+        return bases[rng.randint(0, len(bases), n)]
+
+    def prepare(self, n: int, rng) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Alice's raw key bits and the states she sends.
+
+        Returns:
+            Tuple of (key bits, preparation bases, state values)
+        """
+        bits = rng.randint(0, 2, n)
+        return bits, self.choose(self.alice_bases, n, rng), bits
+
+    def measure(self, values: np.ndarray, bases: np.ndarray, measure_bases: np.ndarray, rng) -> np.ndarray:
+        """Measure ``(value, basis)`` states in ``measure_bases``."""
+        agree = rng.random_sample(len(values)) < self.overlap[bases, measure_bases]
+        return np.where(agree, values, 1 - values)
+
+    def sift(
+        self,
+        alice_bases: np.ndarray,
+        bob_bases: np.ndarray,
+        bob_results: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Keep the qubits both parties can use for the key.
+
+        Returns:
+            Tuple of (kept-qubit mask, Bob's key bit for every qubit)
+        """
+        return alice_bases == bob_bases, bob_results
+
+    def eve_knowledge(self, intercepts: np.ndarray, eve_bits: np.ndarray,
+                      eve_bases: Optional[np.ndarray], key_bits: np.ndarray) -> np.ndarray:
+        """Mask of qubits whose key bit Eve holds correctly."""
+        return intercepts & (eve_bits == key_bits)
+
+    def check(self, arrays: Dict[str, np.ndarray]) -> Tuple[Dict[str, float], Optional[str]]:
+        """
+        Protocol-specific test beyond the QBER.
+
+        Returns:
+            Tuple of (statistics to report, failure reason or None)
+        """
+        return {}, None
+
+
+class B92Scheme(QKDScheme):
+    """
+    B92: bit 0 is sent as |0> (rectilinear) and bit 1 as |+> (diagonal).
+
+    Bob measures in a random basis; an outcome of 1 is conclusive, because
+    it is orthogonal to the state of the other basis, and tells him Alice
+    used the basis he did not measure in.
+    """
+
+    def prepare(self, n: int, rng) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        bits = rng.randint(0, 2, n)
+        return bits, bits.copy(), np.zeros(n, dtype=bits.dtype)
+
+    def sift(self, alice_bases, bob_bases, bob_results):
+        return bob_results == 1, 1 - bob_bases
+
+    def eve_knowledge(self, intercepts, eve_bits, eve_bases, key_bits):
+        # Eve learns the bit only from a conclusive outcome of her own
+        return intercepts & (eve_bits == 1) & (1 - eve_bases == key_bits)
+
+
+class E91Scheme(QKDScheme):
+    """
+    E91 with a source of |Phi+> pairs, simulated by its CHSH correlations.
+
+    Alice measures at 0, 22.5 or 45 degrees and Bob at 22.5, 45 or 67.5. Once
+    Alice has measured, Bob's photon is polarized along her outcome, so a
+    pair is a ``(value, basis)`` state like any other. Pairs measured at the
+    same angle give the key. Alice's 0 and 45 and Bob's 22.5 and 67.5 give
+    the CHSH value S, which is 2*sqrt(2) for an undisturbed source and at
+    most 2 once Eve has measured every photon.
+    """
+
+    ANGLES = (0.0, 22.5, 45.0, 67.5)
+    # (alice basis, bob basis, sign) terms of S = E(a, b) - E(a, b') + E(a', b) + E(a', b')
+    CHSH_TERMS = ((0, 1, 1), (0, 3, -1), (2, 1, 1), (2, 3, 1))
+
+    def check(self, arrays):
+        alice_bases, bob_bases = arrays['alice_bases'], arrays['bob_bases']
+        same = arrays['alice_bits'] == arrays['bob_bits']
+        chsh = 0.0
+        for a, b, sign in self.CHSH_TERMS:
+            pairs = (alice_bases == a) & (bob_bases == b)
+            count = int(np.sum(pairs))
+            if count:
+                # Correlation E = P(same) - P(different)
+                chsh += sign * (2 * np.sum(same & pairs) / count - 1)
+        chsh = float(chsh)
+        if chsh <= CHSH_CLASSICAL_BOUND:
+            return {'chsh': chsh}, (
+                f'CHSH value {chsh:.3f} does not exceed the classical bound '
+                f'{CHSH_CLASSICAL_BOUND:.0f} - entanglement not verified, possible eavesdropping'
+            )
+        return {'chsh': chsh}, None
+
+
+_TWO_BASES = polarization_overlap((0.0, 45.0))
+_SIX_STATE = np.array([[1.0, 0.5, 0.5], [0.5, 1.0, 0.5], [0.5, 0.5, 1.0]])
+
+SCHEMES: Dict[str, QKDScheme] = {
+    scheme.name: scheme for scheme in (
+        QKDScheme(
+            'bb84', _TWO_BASES, (0, 1), (0, 1), (0, 1), 1 / 2,
+            ('intercept_resend', 'breidbart', 'pns', 'cloning')
+        ),
+        QKDScheme(
+            'six_state', _SIX_STATE, (0, 1, 2), (0, 1, 2), (0, 1, 2), 1 / 3,
+            ('intercept_resend', 'pns')
+        ),
+        B92Scheme('b92', _TWO_BASES, (0, 1), (0, 1), (0, 1), 1 / 4, ('intercept_resend',)),
+        E91Scheme(
+            'e91', polarization_overlap(E91Scheme.ANGLES), (0, 1, 2), (1, 2, 3), (1, 2), 2 / 9,
+            ('intercept_resend',)
+        ),
+    )
+}
+
@@ -2,22 +2,40 @@
 BB84 Quantum Key Distribution Utility Functions
 From: https://github.com/qwertystars/BB84
 """
+import base64
+import math
+import os
 import numpy as np
 from typing import Tuple, List, Literal
 
 Bit = Literal[0, 1]
 
+# Workers forked from a preloaded master would otherwise inherit the same
+# global RNG state and generate identical "random" bits and bases.
+os.register_at_fork(after_in_child=np.random.seed)
 
-def generate_random_bits(length: int) -> np.ndarray:
+
+def make_rng(seed: int) -> np.random.RandomState:
+    """
+    Create the generator for one protocol run.
+
+    ``seed`` (up to 128 bits) fully determines the run, which is what makes
+    transcripts replayable. The functions below accept it as ``rng`` and
+    default to numpy's global generator.
+    """
+    return np.random.RandomState(np.random.MT19937(np.random.SeedSequence(seed)))
+
+
+def generate_random_bits(length: int, rng=np.random) -> np.ndarray:
     """Generate random classical bits (0 or 1).
 
     In BB84, Alice uses these random bits to encode her quantum states.
     Each bit represents the state she wants to send to Bob.
     """
-    return np.random.randint(0, 2, length)
+    return rng.randint(0, 2, length)
 
 
-def generate_random_bases(length: int) -> np.ndarray:
+def generate_random_bases(length: int, rng=np.random) -> np.ndarray:
     """Generate random measurement bases (0 for Z-basis, 1 for X-basis).
 
     In BB84:
@@ -27,7 +45,7 @@ def generate_random_bases(length: int) -> np.ndarray:
     Both Alice and Bob randomly choose bases. Security comes from the fact
     that measuring in the wrong basis gives random results.
     """
-    return np.random.randint(0, 2, length)
+    return rng.randint(0, 2, length)
 
 
 def compare_arrays(arr1: np.ndarray, arr2: np.ndarray) -> float:
@@ -43,14 +61,14 @@ def compare_arrays(arr1: np.ndarray, arr2: np.ndarray) -> float:
     return errors / len(arr1)
 
 
-def apply_channel_error(qubits: np.ndarray, error_rate: float) -> np.ndarray:
+def apply_channel_error(qubits: np.ndarray, error_rate: float, rng=np.random) -> np.ndarray:
     """Apply random bit flip errors to simulate noisy quantum channel.
 
     Simulates effects like photon loss, detector inefficiency,
     environmental decoherence, and transmission errors.
     """
     noisy_qubits = qubits.copy()
-    error_positions = np.random.random(len(qubits)) < error_rate
+    error_positions = rng.random_sample(len(qubits)) < error_rate
     noisy_qubits[error_positions] = 1 - noisy_qubits[error_positions]
     return noisy_qubits
 
@@ -93,7 +111,7 @@ def bits_to_hex_key(key_bits: List[Bit], key_length: int) -> str:
     Convert a list of bits to a hexadecimal key string.
 
     Args:
-        key_bits: List of bits (0 or 1)
+        key_bits: List or array of bits (0 or 1)
         key_length: Required key length in bits
 
     Returns:
@@ -110,12 +128,90 @@ def bits_to_hex_key(key_bits: List[Bit], key_length: int) -> str:
         )
 
     # Take only the required number of bits
-    final_bits = key_bits[:key_length]
+    final_bits = np.asarray(key_bits[:key_length], dtype=np.uint8)
 
-    # Convert bits to hex string
-    hex_key = ''.join(
-        format(int(''.join(map(str, final_bits[i:i+8])), 2), '02x')
-        for i in range(0, len(final_bits), 8)
-    )
+    # Whole bytes are packed MSB first; a trailing partial byte is written as
+    # the integer value of its bits
+    whole = key_length - key_length % 8
+    hex_key = np.packbits(final_bits[:whole]).tobytes().hex()
+    if whole < key_length:
+        hex_key += format(int(''.join(map(str, final_bits[whole:])), 2), '02x')
 
     return hex_key
+
+
+def pack_bits(bits: np.ndarray) -> str:
+    """
+    Pack a 0/1 array eight bits per byte (MSB first) and base64-encode it.
+
+    Args:
+        bits: Array of 0/1 values (or booleans)
+
+    Returns:
+        Base64 string; decode and unpack the first ``len(bits)`` bits to restore
+    """
+    return base64.b64encode(np.packbits(np.asarray(bits, dtype=np.uint8)).tobytes()).decode('ascii')
+
+
+def serfling_margin(sample_size: int, key_bits: int, epsilon: float) -> float:
+    """
+    Margin to add to a sampled error rate to bound the rate in the unsampled bits.
+
+    ``sample_size`` bits are drawn without replacement from
+    ``sample_size + key_bits`` sifted bits. By Serfling's inequality, with
+    probability at least ``1 - epsilon`` the error rate of the ``key_bits``
+    left out of the sample is at most the sample's error rate plus this margin.
+
+    Args:
+        sample_size: Bits disclosed for error estimation (k)
+        key_bits: Bits kept for the key (n)
+        epsilon: Failure probability of the bound
+
+    Returns:
+        sqrt((n + k)(n + 1) ln(1/epsilon) / (2 k n^2))
+    """
+    total = sample_size + key_bits
+    return math.sqrt(
+        total * (key_bits + 1) * math.log(1 / epsilon) / (2 * sample_size * key_bits ** 2)
+    )
+
+
+def qber_sample_size(key_bits: int, epsilon: float, margin: float) -> int:
+    """
+    Smallest sample for which :func:`serfling_margin` is at most ``margin``.
+
+    Args:
+        key_bits: Bits kept for the key (n)
+        epsilon: Failure probability of the bound
+        margin: Largest acceptable margin
+
+    Returns:
+        Sample size k
+
+    Raises:
+        ValueError: If no sample is large enough; the margin can never drop
+            below sqrt((n + 1) ln(1/epsilon) / (2 n^2)), so short keys need
+            a wider margin or lower confidence
+    """
+    log_term = (key_bits + 1) * math.log(1 / epsilon)
+    denominator = 2 * key_bits ** 2 * margin ** 2 - log_term
+    if denominator <= 0:
+        raise ValueError(
+            f"A {key_bits}-bit key cannot bound QBER within ±{margin:.3f} at "
+            f"{1 - epsilon:.2%} confidence; lower the confidence, widen the margin "
+            f"or use a longer key"
+        )
+    return math.ceil(key_bits * log_term / denominator)
+
+
+def qubits_for_sifted(sifted_bits: int, sigmas: float = 3.0, sift_ratio: float = 0.5) -> int:
+    """
+    Qubits to send so that sifting keeps ``sifted_bits`` with high probability.
+
+    Each qubit survives sifting with probability p (1/2 for BB84), so N
+    qubits keep N p ± sqrt(N p (1 - p)). This solves
+    N p - sigmas * sqrt(N p (1 - p)) = sifted_bits.
+    """
+    spread = sigmas * math.sqrt(sift_ratio * (1 - sift_ratio))
+    root = (spread + math.sqrt(spread ** 2 + 4 * sift_ratio * sifted_bits)) / (2 * sift_ratio)
+    return math.ceil(root ** 2)
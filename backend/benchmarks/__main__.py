@@ -0,0 +1,59 @@
+"""
+Run the benchmark suite.
+
+Usage (from the repository root):
+    python -m backend.benchmarks                       # run everything
+    python -m backend.benchmarks -k bb84.protocol_run  # filter by case id
+    python -m backend.benchmarks --save-baseline       # record a new baseline
+    python -m backend.benchmarks --threshold 0.2       # fail on >20% slowdowns
+
+Results go to ``.benchmarks/latest.json``; when ``.benchmarks/baseline.json``
+exists the run is compared with it and exits non-zero on any regression.
+"""
+import argparse
+import os
+import sys
+
+from . import bench_bb84, bench_crypto, bench_message_storage  # noqa: F401 (registers benchmarks)
+from .runner import compare, load, run, save
+
+DEFAULT_DIR = '.benchmarks'
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Quantum Chat micro-benchmarks")
+    parser.add_argument('-k', '--filter', help="Only run cases whose id contains this string")
+    parser.add_argument('--repeat', type=int, default=5, help="Samples per case")
+    parser.add_argument('--min-time', type=float, default=0.05, help="Minimum seconds per sample")
+    parser.add_argument('--output', default=os.path.join(DEFAULT_DIR, 'latest.json'))
+    parser.add_argument('--baseline', default=os.path.join(DEFAULT_DIR, 'baseline.json'))
+    parser.add_argument('--threshold', type=float, default=0.15,
+                        help="Allowed slowdown versus baseline as a fraction")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="Write these results as the new baseline")
+    args = parser.parse_args(argv)
+
+    results = run(args.filter, args.repeat, args.min_time)
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    save(results, args.output)
+    if args.save_baseline:
+        save(results, args.baseline)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 0
+
+    rows = compare(results, load(args.baseline), args.threshold)
+    regressions = [row for row in rows if row['regression']]
+    print(f"\nCompared {len(rows)} cases with {args.baseline} (threshold {args.threshold:.0%})")
+    for row in rows:
+        marker = 'REGRESSION' if row['regression'] else ''
+        print(f"  {row['case']:60s} x{row['ratio']:.2f} {marker}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""
+Benchmarks for the BB84 engine.
+"""
+import numpy as np
+
+from ..bb84 import BB84Protocol, QKDProtocol
+from ..bb84.eve import EVE_STRATEGIES
+from ..bb84.schemes import SCHEMES
+from ..bb84.utils import apply_channel_error, bits_to_hex_key, sift_key
+from .runner import benchmark
+
+KEY_LENGTHS = (64, 256, 1024, 2048)
+ARRAY_SIZES = (1000, 10000, 100000)
+
+
+@benchmark('bb84.protocol_run', params={'key_length': KEY_LENGTHS, 'enable_eve': (False, True)})
+def protocol_run(key_length: int, enable_eve: bool):
+    # A threshold of 1.0 never aborts, so every run does the full amount of work
+    protocol = BB84Protocol(
+        key_length=key_length,
+        enable_eve=enable_eve,
+        eve_intercept_prob=1.0,
+        qber_threshold=1.0
+    )
+    return protocol.run
+
+
+@benchmark('bb84.scheme_run', params={'protocol': tuple(SCHEMES), 'key_length': (256, 2048)})
+def scheme_run(protocol: str, key_length: int):
+    return QKDProtocol(key_length=key_length, qber_threshold=1.0, protocol=protocol).run
+
+
+@benchmark('bb84.eve_attack', params={'strategy': tuple(EVE_STRATEGIES), 'size': ARRAY_SIZES})
+def eve_attack(strategy: str, size: int):
+    rng = np.random.RandomState(0)
+    alice_bits = rng.randint(0, 2, size)
+    alice_bases = rng.randint(0, 2, size)
+    attack = EVE_STRATEGIES[strategy]
+    scheme = SCHEMES['bb84']
+    return lambda: attack(
+        alice_bits, alice_bases, rng, scheme, intercept_prob=1.0, disturbance=0.15, mean_photons=0.5
+    )
+
+
+@benchmark('bb84.bits_to_hex_key', params={'key_length': KEY_LENGTHS})
+def hex_key(key_length: int):
+    bits = [int(b) for b in np.random.randint(0, 2, key_length)]
+    return lambda: bits_to_hex_key(bits, key_length)
+
+
+@benchmark('bb84.sift_key', params={'size': ARRAY_SIZES})
+def sifting(size: int):
+    alice_bits = np.random.randint(0, 2, size)
+    bob_bits = np.random.randint(0, 2, size)
+    alice_bases = np.random.randint(0, 2, size)
+    bob_bases = np.random.randint(0, 2, size)
+    return lambda: sift_key(alice_bits, bob_bits, alice_bases, bob_bases)
+
+
+@benchmark('bb84.apply_channel_error', params={'size': ARRAY_SIZES})
+def channel_error(size: int):
+    bits = np.random.randint(0, 2, size)
+    return lambda: apply_channel_error(bits, 0.01)
@@ -0,0 +1,41 @@
+"""
+Benchmarks for the encryption layer and session message path.
+"""
+import secrets
+
+from ..api.session_manager import Session
+from ..encryption import QuantumCrypto
+from .runner import benchmark
+
+MESSAGE_SIZES = (10, 1000, 100_000, 1_000_000)
+
+
+def _key() -> str:
+    return secrets.token_hex(32)
+
+
+@benchmark('crypto.encrypt', params={'size': MESSAGE_SIZES})
+def encrypt(size: int):
+    crypto = QuantumCrypto(_key())
+    plaintext = 'x' * size
+    return lambda: crypto.encrypt(plaintext)
+
+
+@benchmark('crypto.decrypt', params={'size': MESSAGE_SIZES})
+def decrypt(size: int):
+    crypto = QuantumCrypto(_key())
+    ciphertext = crypto.encrypt('x' * size)
+    return lambda: crypto.decrypt(ciphertext)
+
+
+@benchmark('session.encrypt_message', params={'size': (10, 1000)})
+def session_encrypt(size: int):
+    session = Session('benchmark', _key(), {'key_length': 256})
+    plaintext = 'x' * size
+
+    def target():
+        session.encrypt_message('alice', plaintext)
+        # Keep the history from growing across calibration and samples
+        if len(session.messages) >= 10000:
+            session.messages.clear()
+    return target
@@ -0,0 +1,92 @@
+"""
+Benchmark per-message memory and history serialization for session storage.
+
+Compares the compact ``MessageRecord`` kept by sessions with the pydantic
+``EncryptedMessage`` it replaced.
+
+Usage:
+    python -m backend.benchmarks.bench_message_storage [n_messages]
+"""
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+
+from ..encryption import QuantumCrypto
+from ..models.records import MessageRecord
+from ..models.schemas import EncryptedMessage
+from .runner import benchmark
+
+
+def _measure(build, serialize, n_messages: int) -> dict:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    messages = build()
+    per_message = (tracemalloc.get_traced_memory()[0] - before) / n_messages
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    serialize(messages)
+    elapsed = time.perf_counter() - start
+    return {'bytes_per_message': per_message, 'history_seconds': elapsed}
+
+
+def run(n_messages: int = 10000) -> dict:
+    """
+    Measure both representations over ``n_messages`` encrypted messages.
+
+    Each side encrypts its messages inside the measured region, the way its
+    session stored them, so the ciphertext payload is counted for both.
+
+    Returns:
+        Mapping of representation name to bytes per message and the time to
+        serialize the whole history
+    """
+    crypto = QuantumCrypto('ab' * 32)
+    plaintexts = [f'message {i}' for i in range(n_messages)]
+    senders = ['alice', 'bob']
+
+    pydantic = _measure(
+        lambda: [
+            EncryptedMessage(
+                sender=senders[i % 2],
+                ciphertext=crypto.encrypt(plaintext),
+                timestamp=datetime.utcnow().isoformat()
+            )
+            for i, plaintext in enumerate(plaintexts)
+        ],
+        lambda messages: [msg.dict() for msg in messages],
+        n_messages
+    )
+    records = _measure(
+        lambda: [
+            MessageRecord(senders[i % 2], crypto.encrypt_token(plaintext), time.time())
+            for i, plaintext in enumerate(plaintexts)
+        ],
+        lambda messages: [msg.to_dict() for msg in messages],
+        n_messages
+    )
+    return {'EncryptedMessage': pydantic, 'MessageRecord': records}
+
+
+@benchmark('session.history_serialize', params={'n_messages': (100, 10000)})
+def history_serialize(n_messages: int):
+    crypto = QuantumCrypto('ab' * 32)
+    records = [
+        MessageRecord('alice', crypto.encrypt_token(f'message {i}'), time.time())
+        for i in range(n_messages)
+    ]
+    return lambda: [msg.to_dict() for msg in records]
+
+
+def main() -> None:
+    n_messages = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    for name, stats in run(n_messages).items():
+        print(
+            f"{name:18s} {stats['bytes_per_message']:8.1f} B/message  "
+            f"history of {n_messages}: {stats['history_seconds'] * 1000:8.2f} ms"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,443 @@
+"""
+End-to-end WebSocket load generator and latency harness.
+
+Creates N sessions through ``/api/key-exchange``, opens M WebSocket clients
+per session on ``/ws/{session_id}`` and drives ``send_message`` /
+``decrypt_message`` traffic at a target rate. Reports throughput,
+p50/p95/p99 delivery latency (send on one client to ``new_message`` on each
+peer), decrypt and reconnect latency, and server CPU/RSS.
+
+By default a single uvicorn worker is spawned on a free localhost port so its
+resource usage can be sampled from ``/proc``; pass ``--url`` (and optionally
+``--server-pid``) to target a server that is already running. Every session
+is created from the same address, so the spawned worker gets a relaxed
+key-exchange rate limit (``BENCHMARK_SERVER_ENV``), and key exchanges
+answered 429/503 are retried after their ``Retry-After``.
+
+Scenarios are lists of phases, given by name or as a JSON file::
+
+    [
+      {"phase": "steady", "duration": 10, "rate": 200, "decrypt_ratio": 0.1},
+      {"phase": "broadcast_storm", "duration": 2, "rate": 5000},
+      {"phase": "reconnect_storm", "fraction": 0.5},
+      {"phase": "idle", "duration": 1}
+    ]
+
+Usage (from the repository root):
+    python -m backend.benchmarks.loadgen --sessions 20 --clients 4 --scenario steady
+    python -m backend.benchmarks.loadgen --scenario my_scenario.json --json report.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Dict, List, Optional
+
+import msgpack
+import websockets
+
+from ..api.wire import MSGPACK_SUBPROTOCOL
+
+SCENARIOS = {
+    'steady': [
+        {'phase': 'steady', 'duration': 10, 'rate': 200, 'decrypt_ratio': 0.1},
+    ],
+    'broadcast-storm': [
+        {'phase': 'steady', 'duration': 3, 'rate': 100},
+        {'phase': 'broadcast_storm', 'duration': 3, 'rate': 5000},
+        {'phase': 'idle', 'duration': 1},
+    ],
+    'reconnect-storm': [
+        {'phase': 'steady', 'duration': 3, 'rate': 100},
+        {'phase': 'reconnect_storm', 'fraction': 1.0},
+        {'phase': 'steady', 'duration': 3, 'rate': 100},
+    ],
+}
+
+# Admission limits for spawned servers, unless set in the environment: all
+# sessions come from one client, which the default burst of 5 would throttle
+BENCHMARK_SERVER_ENV = {'KEY_EXCHANGE_RATE': '1000', 'KEY_EXCHANGE_BURST': '1000'}
+# Attempts of a key exchange shed by admission control (429/503)
+KEY_EXCHANGE_ATTEMPTS = 10
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+class ProcessSampler:
+    """Samples CPU seconds and RSS of a Linux process from /proc."""
+
+    def __init__(self, pid: Optional[int]):
+        self.pid = pid
+        self.peak_rss = 0
+        self.rss_samples: List[int] = []
+        self._ticks = os.sysconf('SC_CLK_TCK')
+        self._page = os.sysconf('SC_PAGE_SIZE')
+        self._start_cpu = self.cpu_seconds()
+        self._start_wall = time.monotonic()
+
+    def cpu_seconds(self) -> Optional[float]:
+        if self.pid is None:
+            return None
+        try:
+            with open(f'/proc/{self.pid}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except OSError:
+            return None
+        # utime and stime are fields 14 and 15 of /proc/<pid>/stat
+        return (int(fields[11]) + int(fields[12])) / self._ticks
+
+    def sample(self) -> None:
+        if self.pid is None:
+            return
+        try:
+            with open(f'/proc/{self.pid}/statm') as f:
+                rss = int(f.read().split()[1]) * self._page
+        except OSError:
+            return
+        self.rss_samples.append(rss)
+        self.peak_rss = max(self.peak_rss, rss)
+
+    async def run(self, interval: float = 0.25) -> None:
+        while True:
+            self.sample()
+            await asyncio.sleep(interval)
+
+    def report(self) -> dict:
+        cpu = self.cpu_seconds()
+        wall = time.monotonic() - self._start_wall
+        if cpu is None or self._start_cpu is None:
+            return {}
+        return {
+            'cpu_seconds': cpu - self._start_cpu,
+            'cpu_percent': 100.0 * (cpu - self._start_cpu) / wall if wall else 0.0,
+            'rss_peak_bytes': self.peak_rss,
+            'rss_last_bytes': self.rss_samples[-1] if self.rss_samples else None
+        }
+
+
+class Stats:
+    """Latency and throughput accounting shared by all clients."""
+
+    def __init__(self):
+        self.sent = 0
+        self.delivered = 0
+        self.decrypts = 0
+        self.errors = 0
+        self.delivery_latency: List[float] = []
+        self.decrypt_latency: List[float] = []
+        self.reconnect_latency: List[float] = []
+        # sender tag -> (send time, expected deliveries remaining)
+        self.in_flight: Dict[str, List] = {}
+
+    def summary(self, elapsed: float) -> dict:
+        def latency(values):
+            return {
+                'count': len(values),
+                'p50_ms': _ms(percentile(values, 0.50)),
+                'p95_ms': _ms(percentile(values, 0.95)),
+                'p99_ms': _ms(percentile(values, 0.99)),
+                'max_ms': _ms(max(values) if values else None)
+            }
+        return {
+            'elapsed_seconds': elapsed,
+            'messages_sent': self.sent,
+            'messages_per_second': self.sent / elapsed if elapsed else 0.0,
+            'deliveries': self.delivered,
+            'deliveries_per_second': self.delivered / elapsed if elapsed else 0.0,
+            'undelivered': sum(entry[1] for entry in self.in_flight.values()),
+            'errors': self.errors,
+            'delivery_latency': latency(self.delivery_latency),
+            'decrypt_latency': latency(self.decrypt_latency),
+            'reconnect_latency': latency(self.reconnect_latency)
+        }
+
+
+def _ms(seconds: Optional[float]) -> Optional[float]:
+    return None if seconds is None else round(seconds * 1000, 3)
+
+
+class Client:
+    """One WebSocket client attached to a session."""
+
+    _tags = itertools.count()
+
+    def __init__(self, ws_url: str, session_id: str, peers: int, stats: Stats, binary: bool):
+        self.url = f'{ws_url}/ws/{session_id}'
+        self.peers = peers
+        self.stats = stats
+        self.binary = binary
+        self.ws = None
+        self.ready = asyncio.Event()
+        self.reader: Optional[asyncio.Task] = None
+        self.received_ciphertexts: List = []
+        self.pending_decrypts: Dict = {}
+
+    async def connect(self) -> float:
+        """Connect and wait for session info and history; returns the time taken."""
+        start = time.perf_counter()
+        self.ready.clear()
+        self.ws = await websockets.connect(
+            self.url,
+            subprotocols=[MSGPACK_SUBPROTOCOL] if self.binary else None,
+            max_size=None
+        )
+        self.reader = asyncio.create_task(self._read())
+        await self.ready.wait()
+        return time.perf_counter() - start
+
+    async def close(self) -> None:
+        if self.ws is not None:
+            await self.ws.close()
+        if self.reader is not None:
+            self.reader.cancel()
+
+    def _decode(self, frame) -> dict:
+        return msgpack.unpackb(frame, raw=False) if self.binary else json.loads(frame)
+
+    async def _read(self) -> None:
+        stats = self.stats
+        try:
+            async for frame in self.ws:
+                now = time.perf_counter()
+                event = self._decode(frame)
+                kind = event.get('type')
+                if kind == 'message_history':
+                    self.ready.set()
+                elif kind == 'new_message':
+                    data = event['data']
+                    entry = stats.in_flight.get(data['sender'])
+                    if entry is not None:
+                        stats.delivery_latency.append(now - entry[0])
+                        stats.delivered += 1
+                        entry[1] -= 1
+                        if entry[1] <= 0:
+                            del stats.in_flight[data['sender']]
+                    if len(self.received_ciphertexts) < 64:
+                        self.received_ciphertexts.append(data['ciphertext'])
+                elif kind == 'decrypted_message':
+                    started = self.pending_decrypts.pop(event['data']['ciphertext'], None)
+                    if started is not None:
+                        stats.decrypt_latency.append(now - started)
+                        stats.decrypts += 1
+                elif kind == 'error':
+                    stats.errors += 1
+        except websockets.ConnectionClosed:
+            pass
+
+    async def send_message(self, size: int) -> None:
+        tag = f'lg-{next(self._tags)}'
+        body = 'x' * size
+        self.stats.in_flight[tag] = [time.perf_counter(), self.peers]
+        self.stats.sent += 1
+        if self.binary:
+            await self.ws.send(msgpack.packb(['send_message', tag, body]))
+        else:
+            await self.ws.send(json.dumps({'type': 'send_message', 'sender': tag, 'message': body}))
+
+    async def decrypt(self) -> None:
+        if not self.received_ciphertexts:
+            return
+        ciphertext = random.choice(self.received_ciphertexts)
+        self.pending_decrypts[ciphertext] = time.perf_counter()
+        if self.binary:
+            await self.ws.send(msgpack.packb(['decrypt_message', ciphertext]))
+        else:
+            await self.ws.send(json.dumps({'type': 'decrypt_message', 'ciphertext': ciphertext}))
+
+
+def key_exchange(http_url: str, payload: dict) -> dict:
+    """POST ``/api/key-exchange``, waiting out ``Retry-After`` when admission control sheds it."""
+    body = json.dumps(payload).encode()
+    for attempt in range(KEY_EXCHANGE_ATTEMPTS):
+        request = urllib.request.Request(
+            f'{http_url}/api/key-exchange', data=body, headers={'Content-Type': 'application/json'}
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                return json.load(response)
+        except urllib.error.HTTPError as e:
+            if e.code not in (429, 503) or attempt == KEY_EXCHANGE_ATTEMPTS - 1:
+                raise
+            time.sleep(float(e.headers.get('Retry-After', 1)))
+
+
+def create_session(http_url: str, key_length: int) -> str:
+    return key_exchange(http_url, {'user_id': 'loadgen', 'config': {'key_length': key_length}})['session_id']
+
+
+def server_env() -> dict:
+    """Environment for a spawned server: ours, plus relaxed admission limits."""
+    return {**BENCHMARK_SERVER_ENV, **os.environ}
+
+
+async def drive(clients: List[Client], duration: float, rate: float,
+                decrypt_ratio: float, message_size: int) -> None:
+    """Open-loop arrivals: issue operations on schedule regardless of responses."""
+    interval = 1.0 / rate
+    start = time.perf_counter()
+    issued = 0
+    while True:
+        elapsed = time.perf_counter() - start
+        if elapsed >= duration:
+            return
+        due = int(elapsed / interval) + 1 - issued
+        for _ in range(due):
+            client = random.choice(clients)
+            try:
+                if decrypt_ratio and random.random() < decrypt_ratio:
+                    await client.decrypt()
+                else:
+                    await client.send_message(message_size)
+            except websockets.ConnectionClosed:
+                client.stats.errors += 1
+        issued += due
+        await asyncio.sleep(max(interval, 0.001))
+
+
+async def reconnect_storm(clients: List[Client], fraction: float, stats: Stats) -> None:
+    chosen = random.sample(clients, max(1, int(len(clients) * fraction)))
+    await asyncio.gather(*(client.close() for client in chosen))
+    latencies = await asyncio.gather(*(client.connect() for client in chosen))
+    stats.reconnect_latency.extend(latencies)
+
+
+async def run_scenario(args, http_url: str, ws_url: str, server_pid: Optional[int]) -> dict:
+    stats = Stats()
+    session_ids = await asyncio.gather(*(
+        asyncio.to_thread(create_session, http_url, args.key_length)
+        for _ in range(args.sessions)
+    ))
+    clients = [
+        Client(ws_url, session_id, args.clients, stats, args.protocol == 'msgpack')
+        for session_id in session_ids
+        for _ in range(args.clients)
+    ]
+    await asyncio.gather(*(client.connect() for client in clients))
+
+    sampler = ProcessSampler(server_pid)
+    sampling = asyncio.create_task(sampler.run())
+    start = time.perf_counter()
+    for phase in load_scenario(args.scenario):
+        kind = phase['phase']
+        print(f"phase {kind}: {json.dumps(phase)}", file=sys.stderr)
+        if kind in ('steady', 'broadcast_storm'):
+            await drive(
+                clients,
+                phase.get('duration', 10),
+                phase.get('rate', 100),
+                phase.get('decrypt_ratio', 0.0),
+                phase.get('message_size', args.message_size)
+            )
+        elif kind == 'reconnect_storm':
+            await reconnect_storm(clients, phase.get('fraction', 1.0), stats)
+        elif kind == 'idle':
+            await asyncio.sleep(phase.get('duration', 1))
+        else:
+            raise ValueError(f"Unknown phase: {kind}")
+
+    # Give in-flight deliveries a moment to land before reporting
+    deadline = time.perf_counter() + args.drain
+    while stats.in_flight and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    elapsed = time.perf_counter() - start
+
+    sampling.cancel()
+    await asyncio.gather(*(client.close() for client in clients), return_exceptions=True)
+    return {
+        'config': {
+            'sessions': args.sessions,
+            'clients_per_session': args.clients,
+            'protocol': args.protocol,
+            'scenario': args.scenario
+        },
+        'client': stats.summary(elapsed),
+        'server': sampler.report()
+    }
+
+
+def load_scenario(scenario: str) -> List[dict]:
+    if scenario in SCENARIOS:
+        return SCENARIOS[scenario]
+    with open(scenario) as f:
+        return json.load(f)
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def spawn_server() -> tuple:
+    """Start one uvicorn worker on localhost; returns (process, base_url)."""
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'backend.api.main:app',
+         '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning'],
+        env=server_env()
+    )
+    base_url = f'http://127.0.0.1:{port}'
+    for _ in range(200):
+        try:
+            urllib.request.urlopen(f'{base_url}/health').read()
+            return process, base_url
+        except OSError:
+            time.sleep(0.05)
+    process.terminate()
+    raise RuntimeError("Server did not start")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Quantum Chat WebSocket load generator")
+    parser.add_argument('--url', help="Base URL of a running server (default: spawn one)")
+    parser.add_argument('--server-pid', type=int, help="PID to sample CPU/RSS from with --url")
+    parser.add_argument('--sessions', type=int, default=10)
+    parser.add_argument('--clients', type=int, default=2, help="WebSocket clients per session")
+    parser.add_argument('--scenario', default='steady',
+                        help=f"Built-in ({', '.join(SCENARIOS)}) or path to a JSON file")
+    parser.add_argument('--protocol', choices=('json', 'msgpack'), default='json')
+    parser.add_argument('--message-size', type=int, default=64)
+    parser.add_argument('--key-length', type=int, default=256)
+    parser.add_argument('--drain', type=float, default=2.0,
+                        help="Seconds to wait for in-flight deliveries at the end")
+    parser.add_argument('--json', help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    process = None
+    if args.url:
+        base_url, server_pid = args.url.rstrip('/'), args.server_pid
+    else:
+        process, base_url = spawn_server()
+        server_pid = process.pid
+    ws_url = 'ws' + base_url[len('http'):]
+
+    try:
+        report = asyncio.run(run_scenario(args, base_url, ws_url, server_pid))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
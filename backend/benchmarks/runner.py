@@ -0,0 +1,180 @@
+"""
+Minimal benchmark registry and runner.
+
+A benchmark is a function decorated with :func:`benchmark`. It performs any
+setup for one parameter combination and returns a zero-argument callable;
+only that callable is timed. Each case is auto-calibrated so a sample lasts
+at least ``min_sample_time`` seconds, sampled ``repeat`` times, and reported
+as seconds per call.
+
+Results are written as JSON and can be compared with a saved baseline; a case
+whose median is slower than the baseline by more than the threshold counts as
+a regression.
+"""
+import itertools
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+BENCHMARKS: List['Benchmark'] = []
+
+
+class Benchmark:
+    """A registered benchmark and its parameter grid."""
+
+    def __init__(self, name: str, func: Callable[..., Callable[[], Any]], params: Dict[str, Sequence]):
+        self.name = name
+        self.func = func
+        self.params = params
+
+    def cases(self):
+        """Yield (case_id, kwargs) for every combination of parameters."""
+        names = list(self.params)
+        for values in itertools.product(*(self.params[n] for n in names)):
+            kwargs = dict(zip(names, values))
+            if kwargs:
+                label = ','.join(f'{k}={v}' for k, v in kwargs.items())
+                yield f'{self.name}[{label}]', kwargs
+            else:
+                yield self.name, kwargs
+
+
+def benchmark(name: str, params: Optional[Dict[str, Sequence]] = None):
+    """
+    Register a benchmark.
+
+    Args:
+        name: Dotted benchmark name, e.g. ``bb84.protocol_run``
+        params: Mapping of parameter name to the values to benchmark
+    """
+    def decorator(func):
+        BENCHMARKS.append(Benchmark(name, func, params or {}))
+        return func
+    return decorator
+
+
+def _calibrate(target: Callable[[], Any], min_sample_time: float) -> int:
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            target()
+        if time.perf_counter() - start >= min_sample_time:
+            return loops
+        loops *= 2 if loops < 1024 else 10
+
+
+def time_case(target: Callable[[], Any], repeat: int = 5, min_sample_time: float = 0.05) -> dict:
+    """
+    Time a callable.
+
+    Returns:
+        Dictionary with per-call ``min``, ``median``, ``mean`` and ``stdev``
+        seconds, plus ``loops`` per sample and ``ops_per_sec``
+    """
+    loops = _calibrate(target, min_sample_time)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            target()
+        samples.append((time.perf_counter() - start) / loops)
+    median = statistics.median(samples)
+    return {
+        'min': min(samples),
+        'median': median,
+        'mean': statistics.fmean(samples),
+        'stdev': statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        'loops': loops,
+        'repeat': repeat,
+        'ops_per_sec': 1.0 / median if median else float('inf')
+    }
+
+
+def machine_info() -> dict:
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'numpy': np.__version__
+    }
+
+
+def run(
+    pattern: Optional[str] = None,
+    repeat: int = 5,
+    min_sample_time: float = 0.05,
+    out=sys.stdout
+) -> dict:
+    """
+    Run every registered benchmark whose case id contains ``pattern``.
+
+    Returns:
+        Results document with machine info and per-case timings
+    """
+    results = {}
+    for bench in BENCHMARKS:
+        for case_id, kwargs in bench.cases():
+            if pattern and pattern not in case_id:
+                continue
+            stats = time_case(bench.func(**kwargs), repeat, min_sample_time)
+            results[case_id] = stats
+            print(f"{case_id:60s} {_format_seconds(stats['median']):>10s}  "
+                  f"({stats['ops_per_sec']:,.0f} ops/s)", file=out)
+    return {
+        'timestamp': datetime.utcnow().isoformat(),
+        'machine': machine_info(),
+        'results': results
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> List[dict]:
+    """
+    Compare medians against a baseline.
+
+    Args:
+        current: Results document from :func:`run`
+        baseline: Previously saved results document
+        threshold: Allowed slowdown as a fraction (0.15 = 15% slower)
+
+    Returns:
+        One entry per case present in both documents, with the ratio and
+        whether it is a regression
+    """
+    rows = []
+    for case_id, stats in current['results'].items():
+        base = baseline.get('results', {}).get(case_id)
+        if base is None:
+            continue
+        ratio = stats['median'] / base['median'] if base['median'] else float('inf')
+        rows.append({
+            'case': case_id,
+            'baseline': base['median'],
+            'current': stats['median'],
+            'ratio': ratio,
+            'regression': ratio > 1.0 + threshold
+        })
+    return rows
+
+
+def _format_seconds(seconds: float) -> str:
+    for unit, scale in (('s', 1.0), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f'{seconds / scale:.2f} {unit}'
+    return f'{seconds / 1e-9:.0f} ns'
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def save(document: dict, path: str) -> None:
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=2, sort_keys=True)
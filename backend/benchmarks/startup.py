@@ -0,0 +1,98 @@
+"""
+Startup benchmark: import time and time-to-first-request.
+
+Each measurement runs in a fresh interpreter so nothing is cached in-process:
+
+- ``import_app``: importing ``backend.api.main``
+- ``warm_up``: the worker warm-up (numpy/crypto import and first use)
+- ``time_to_health``: spawning a uvicorn worker until ``/health`` answers
+- ``first_key_exchange``: latency of the first ``/api/key-exchange`` after that
+
+Usage (from the repository root):
+    python -m backend.benchmarks.startup [--runs 5] [--json startup.json]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+from .loadgen import _free_port, key_exchange, server_env
+
+IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import backend.api.main
+imported = time.perf_counter()
+from backend.api.warmup import warm_up
+warm_up()
+print((imported - start) * 1000, (time.perf_counter() - imported) * 1000)
+"""
+
+
+def measure_import() -> tuple:
+    output = subprocess.check_output([sys.executable, '-c', IMPORT_SNIPPET], text=True)
+    import_ms, warm_up_ms = output.split()
+    return float(import_ms), float(warm_up_ms)
+
+
+def measure_first_request() -> tuple:
+    port = _free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'backend.api.main:app',
+         '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning'],
+        env=server_env()
+    )
+    try:
+        while True:
+            try:
+                urllib.request.urlopen(f'{base_url}/health').read()
+                break
+            except OSError:
+                if process.poll() is not None:
+                    raise RuntimeError("Server exited during startup")
+                time.sleep(0.005)
+        ready = time.perf_counter()
+
+        key_exchange(base_url, {'user_id': 'startup-benchmark'})
+        done = time.perf_counter()
+    finally:
+        process.terminate()
+        process.wait()
+    return (ready - start) * 1000, (done - ready) * 1000
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Quantum Chat startup benchmark")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--json', help="Also write the results to this file")
+    args = parser.parse_args(argv)
+
+    samples = {'import_app': [], 'warm_up': [], 'time_to_health': [], 'first_key_exchange': []}
+    for _ in range(args.runs):
+        import_ms, warm_up_ms = measure_import()
+        samples['import_app'].append(import_ms)
+        samples['warm_up'].append(warm_up_ms)
+        health_ms, exchange_ms = measure_first_request()
+        samples['time_to_health'].append(health_ms)
+        samples['first_key_exchange'].append(exchange_ms)
+
+    report = {
+        name: {'median_ms': statistics.median(values), 'min_ms': min(values), 'max_ms': max(values)}
+        for name, values in samples.items()
+    }
+    for name, stats in report.items():
+        print(f"{name:20s} median {stats['median_ms']:8.1f} ms  "
+              f"(min {stats['min_ms']:.1f}, max {stats['max_ms']:.1f})")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
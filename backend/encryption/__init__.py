@@ -1,6 +1,20 @@
 """
 Encryption module for quantum-secure communication.
 """
-from .crypto import QuantumCrypto, create_secure_channel
+import importlib
 
-__all__ = ['QuantumCrypto', 'create_secure_channel']
+_EXPORTS = {
+    'QuantumCrypto': 'crypto',
+    'create_secure_channel': 'crypto',
+    'OneTimePad': 'otp',
+    'PadExhausted': 'otp'
+}
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    # Imported lazily so loading the package does not pull in cryptography
+    if name in _EXPORTS:
+        module = importlib.import_module(f'.{_EXPORTS[name]}', __name__)
+        return getattr(module, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -53,8 +53,19 @@ class QuantumCrypto:
         Returns:
             Encrypted message as string (Fernet already produces URL-safe base64)
         """
-        encrypted_bytes = self.fernet.encrypt(plaintext.encode('utf-8'))
-        return encrypted_bytes.decode('utf-8')
+        return self.encrypt_token(plaintext).decode('utf-8')
+
+    def encrypt_token(self, plaintext: str) -> bytes:
+        """
+        Encrypt a message, returning the Fernet token as ASCII bytes.
+
+        Args:
+            plaintext: Message to encrypt
+
+        Returns:
+            Fernet token bytes (URL-safe base64)
+        """
+        return self.fernet.encrypt(plaintext.encode('utf-8'))
 
     def decrypt(self, ciphertext: str) -> str:
         """
@@ -0,0 +1,285 @@
+"""
+One-time-pad encryption over a consumable quantum key stream.
+
+The pad is the raw BB84 key: each message consumes as many pad bytes as it
+has plaintext bytes and is XORed with them. Pad bytes are handed out by a
+single, only-increasing offset, so no byte is ever used for two messages.
+The offset travels in the token, which lets either party decrypt any
+message without tracking the other's position::
+
+    urlsafe_b64(offset: u64 big-endian || body || tag)
+    body = plaintext XOR pad[offset:offset + n]
+    tag  = HMAC-SHA256(mac_key, offset || body)[:16]
+
+The tag is checked before any pad byte is touched. Without it, decrypting
+a forged body at an issued offset would hand back ``body XOR pad`` and so
+reveal the pad. ``mac_key`` is derived from the first ``mac_key_bytes`` of
+the initial key material, which are kept back and never issued as
+keystream: anyone who knows their own plaintexts can recover every issued
+pad byte, but not the MAC key, so they cannot forge tokens for pad bytes
+still to come.
+
+When fewer than ``low_water`` unused bytes remain, a background thread runs
+``refill`` (a fresh key exchange) and appends its output to the pad. Pad
+chunks are kept as immutable ``bytes`` and sliced through ``memoryview``, so
+neither refills nor encryption copy the buffer.
+"""
+import base64
+import hashlib
+import hmac
+import struct
+import threading
+from bisect import bisect_right
+from typing import Callable, List, Optional, Tuple
+
+from ..telemetry import metrics
+
+OFFSET = struct.Struct('>Q')
+TAG_SIZE = 16
+MAC_LABEL = b'quantum-chat otp token mac'
+# Initial pad bytes kept back as the MAC key
+MAC_KEY_BYTES = 32
+
+
+class PadExhausted(ValueError):
+    """Raised when too few unused pad bytes remain for a message."""
+
+
+def xor_bytes(data, pad) -> bytes:
+    """XOR two equal-length byte buffers."""
+    import numpy as np
+    return np.bitwise_xor(
+        np.frombuffer(data, dtype=np.uint8),
+        np.frombuffer(pad, dtype=np.uint8)
+    ).tobytes()
+
+
+class OneTimePad:
+    """Encrypts messages with never-reused bytes of a quantum key stream."""
+
+    def __init__(
+        self,
+        pad: bytes,
+        offset: int = 0,
+        low_water: int = 4096,
+        refill: Optional[Callable[[], bytes]] = None,
+        on_refill: Optional[Callable[[bytes], None]] = None,
+        on_advance: Optional[Callable[[int], None]] = None,
+        lease: int = 4096,
+        mac_key_bytes: int = MAC_KEY_BYTES
+    ):
+        """
+        Initialize the pad.
+
+        Args:
+            pad: Initial key material
+            offset: Bytes already consumed (when recovering a session)
+            low_water: Unused bytes below which a refill is started
+            refill: Produces fresh key material; called on a background thread
+            on_refill: Called with each refilled chunk before any of it is used,
+                e.g. to persist it
+            on_advance: Called with a new high-water offset before any pad byte
+                below it is issued, e.g. to persist it; the mark runs ``lease``
+                bytes ahead so this happens once per lease, not per message
+            lease: Bytes issued per ``on_advance`` call
+            mac_key_bytes: Leading pad bytes reserved for the MAC key; must
+                match the value the pad was first created with
+
+        Raises:
+            ValueError: If the pad is not longer than ``mac_key_bytes``
+        """
+        if len(pad) <= mac_key_bytes:
+            raise ValueError(
+                f"One-time pad needs more than {mac_key_bytes} bytes of key material"
+            )
+        self.mac_key_bytes = mac_key_bytes
+        self._mac_key = hmac.new(bytes(pad[:mac_key_bytes]), MAC_LABEL, hashlib.sha256).digest()
+        # Keystream starts after the MAC key bytes
+        offset = max(offset, mac_key_bytes)
+        self.offset = offset
+        # Highest offset reported to on_advance
+        self.durable = offset
+        self.on_advance = on_advance
+        self.lease = lease
+        self.low_water = low_water
+        self.refill = refill
+        self.on_refill = on_refill
+        self.size = 0
+        self._starts: List[int] = []
+        self._chunks: List[bytes] = []
+        self._lock = threading.Lock()
+        self._refilling = False
+        self.extend(pad)
+
+    @property
+    def remaining(self) -> int:
+        """Unused pad bytes."""
+        return self.size - self.offset
+
+    def extend(self, chunk: bytes) -> None:
+        """Append key material to the end of the pad."""
+        chunk = bytes(chunk)
+        if not chunk:
+            return
+        with self._lock:
+            self._starts.append(self.size)
+            self._chunks.append(chunk)
+            # Published last: readers only touch bytes below size
+            self.size += len(chunk)
+
+    def _slice(self, start: int, length: int):
+        """Pad bytes ``[start, start + length)``; copies only across a chunk boundary."""
+        i = bisect_right(self._starts, start) - 1
+        view = memoryview(self._chunks[i])[start - self._starts[i]:]
+        if len(view) >= length:
+            return view[:length]
+        parts = [view]
+        needed = length - len(view)
+        while needed > 0:
+            i += 1
+            part = memoryview(self._chunks[i])[:needed]
+            parts.append(part)
+            needed -= len(part)
+        return b''.join(parts)
+
+    def reserve(self, length: int) -> int:
+        """
+        Consume ``length`` pad bytes.
+
+        Returns:
+            Offset of the first reserved byte
+
+        Raises:
+            PadExhausted: If fewer than ``length`` unused bytes remain
+        """
+        with self._lock:
+            if self.size - self.offset < length:
+                raise PadExhausted(
+                    f"One-time pad exhausted: {self.size - self.offset} bytes left, "
+                    f"message needs {length}"
+                )
+            start = self.offset
+            end = start + length
+            if self.on_advance is not None and end > self.durable:
+                durable = min(self.size, max(end, start + self.lease))
+                self.on_advance(durable)
+                self.durable = durable
+            self.offset = end
+        self._maybe_refill()
+        return start
+
+    def _maybe_refill(self) -> None:
+        if self.refill is None:
+            return
+        with self._lock:
+            if self._refilling or self.size - self.offset >= self.low_water:
+                return
+            self._refilling = True
+        threading.Thread(target=self._run_refill, name='otp-refill', daemon=True).start()
+
+    def _run_refill(self) -> None:
+        try:
+            chunk = self.refill()
+            if self.on_refill is not None:
+                self.on_refill(chunk)
+            self.extend(chunk)
+            metrics.OTP_REFILLS.labels('success').inc()
+        except Exception:
+            metrics.OTP_REFILLS.labels('failure').inc()
+        finally:
+            with self._lock:
+                self._refilling = False
+
+    def encrypt_token(self, plaintext: str) -> bytes:
+        """
+        Encrypt a message with fresh pad bytes.
+
+        Args:
+            plaintext: Message to encrypt
+
+        Returns:
+            Token as URL-safe base64 bytes
+
+        Raises:
+            PadExhausted: If the pad cannot cover the message
+        """
+        return self.encrypt_file(plaintext.encode('utf-8'))
+
+    def encrypt_file(self, data: bytes) -> bytes:
+        """
+        Encrypt raw bytes (e.g. a room key) with fresh pad bytes.
+
+        Returns:
+            Token as URL-safe base64 bytes
+
+        Raises:
+            PadExhausted: If the pad cannot cover the data
+        """
+        start = self.reserve(len(data))
+        body = xor_bytes(data, self._slice(start, len(data))) if data else b''
+        header = OFFSET.pack(start) + body
+        return base64.urlsafe_b64encode(header + self._tag(header))
+
+    def _tag(self, header) -> bytes:
+        return hmac.new(self._mac_key, header, hashlib.sha256).digest()[:TAG_SIZE]
+
+    def encrypt(self, plaintext: str) -> str:
+        """Encrypt a message, returning the token as a string."""
+        return self.encrypt_token(plaintext).decode('ascii')
+
+    @staticmethod
+    def _parse(token: bytes) -> Tuple[int, memoryview, memoryview, memoryview]:
+        """Split a token into (offset, body, tagged ``offset || body``, tag)."""
+        try:
+            raw = base64.urlsafe_b64decode(token)
+        except (ValueError, TypeError):
+            raise ValueError("Invalid one-time-pad token")
+        if len(raw) < OFFSET.size + TAG_SIZE:
+            raise ValueError("Invalid one-time-pad token")
+        (start,) = OFFSET.unpack_from(raw)
+        view = memoryview(raw)
+        return start, view[OFFSET.size:-TAG_SIZE], view[:-TAG_SIZE], view[-TAG_SIZE:]
+
+    @classmethod
+    def token_span(cls, token: bytes) -> Tuple[int, int]:
+        """
+        Pad range ``(start, end)`` used by a token.
+
+        Raises:
+            ValueError: If the token is malformed
+        """
+        start, body, _, _ = cls._parse(token)
+        return start, start + len(body)
+
+    def decrypt(self, ciphertext: str) -> str:
+        """
+        Decrypt a token produced by this pad.
+
+        Args:
+            ciphertext: Token string
+
+        Returns:
+            Decrypted plaintext message
+
+        Raises:
+            ValueError: If the token is malformed, fails authentication or
+                names pad bytes never issued
+        """
+        return self.decrypt_file(ciphertext.encode('ascii')).decode('utf-8')
+
+    def decrypt_file(self, token: bytes) -> bytes:
+        """
+        Decrypt a token produced by :meth:`encrypt_file` to raw bytes.
+
+        Raises:
+            ValueError: If the token is malformed, fails authentication or
+                names pad bytes never issued
+        """
+        start, body, header, tag = self._parse(token)
+        if not hmac.compare_digest(self._tag(header), tag):
+            raise ValueError("One-time-pad token failed authentication")
+        if start < self.mac_key_bytes or start + len(body) > self.offset:
+            raise ValueError("Token refers to pad bytes that were never issued")
+        if not body:
+            return b''
+        return xor_bytes(body, self._slice(start, len(body)))
@@ -1,6 +1,7 @@
 # Gunicorn configuration for production deployment
 import multiprocessing
 import os
+import shutil
 
 # Server socket
 bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
@@ -8,15 +9,39 @@ backlog = 2048
 
 # Worker processes
 workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "uvicorn.workers.UvicornWorker"
+worker_class = "backend.api.ws_protocol.UvicornWorker"  # uvicorn worker with thresholded permessage-deflate
 worker_connections = 1000
 max_requests = 1000
 max_requests_jitter = 50
 timeout = 30
 keepalive = 2
 
-# Logging
-accesslog = "-"
+# Import and warm up the app once in the master so recycled and scaled-up
+# workers fork with everything loaded (see backend/api/warmup.py)
+preload_app = os.getenv("PRELOAD_APP", "1") == "1"
+if preload_app:
+    os.environ["PRELOAD_APP"] = "1"
+
+# Logging: gunicorn writes its access log synchronously in each worker, so it
+# is off by default; the app logs sampled http_request events through a queue
+# instead (see backend/telemetry/logs.py)
+accesslog = os.getenv("ACCESS_LOG") or None
 errorlog = "-"
 loglevel = "info"
 access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s"'
+
+# Metrics: each worker keeps its values in a file here and /metrics sums them
+metrics_dir = os.environ.setdefault("METRICS_DIR", "/tmp/quantum-chat-metrics")
+
+
+def on_starting(server):
+    # Values left by a previous master do not belong to this one
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    # Keep an exited worker's counters and histograms; its gauges are dropped
+    path = os.path.join(metrics_dir, f"metrics-{worker.pid}.db")
+    if os.path.exists(path):
+        os.replace(path, os.path.join(metrics_dir, f"dead-{worker.pid}.db"))
@@ -0,0 +1,72 @@
+"""
+Compact in-memory records for stored session data.
+
+Pydantic models in ``schemas`` describe the API; these are what sessions keep
+in memory, and are only converted to models at the HTTP response edge.
+"""
+import sys
+from datetime import datetime
+from typing import Optional
+
+from .schemas import EncryptedMessage
+
+
+class MessageRecord:
+    """An encrypted chat message as stored in a session."""
+
+    __slots__ = ('sender', 'ciphertext', 'timestamp')
+
+    def __init__(self, sender: str, ciphertext: bytes, timestamp: float):
+        """
+        Initialize a message record.
+
+        Args:
+            sender: Message sender; interned so repeated senders share one string
+            ciphertext: Fernet token bytes
+            timestamp: Unix epoch timestamp (UTC)
+        """
+        self.sender = sys.intern(sender)
+        self.ciphertext = ciphertext
+        self.timestamp = timestamp
+
+    def isoformat(self) -> str:
+        """Timestamp as a naive UTC ISO-8601 string, as used by the API."""
+        return datetime.utcfromtimestamp(self.timestamp).isoformat()
+
+    def to_dict(self) -> dict:
+        """Serialize to the JSON shape of ``EncryptedMessage``."""
+        return {
+            'sender': self.sender,
+            'ciphertext': self.ciphertext.decode('ascii'),
+            'timestamp': self.isoformat()
+        }
+
+    def to_model(self) -> EncryptedMessage:
+        """Build the pydantic response model."""
+        return EncryptedMessage(**self.to_dict())
+
+    def __repr__(self) -> str:
+        return f"MessageRecord(sender={self.sender!r}, timestamp={self.timestamp!r})"
+
+
+class RoomMessageRecord(MessageRecord):
+    """A room message, encrypted once under the room key of its epoch."""
+
+    __slots__ = ('epoch',)
+
+    def __init__(self, sender: str, ciphertext: bytes, timestamp: float, epoch: int):
+        """
+        Initialize a room message record.
+
+        Args:
+            sender: Message sender
+            ciphertext: Fernet token bytes under the room key
+            timestamp: Unix epoch timestamp (UTC)
+            epoch: Room key epoch the message was encrypted under
+        """
+        super().__init__(sender, ciphertext, timestamp)
+        self.epoch = epoch
+
+    def to_dict(self) -> dict:
+        """Serialize to the JSON shape of ``EncryptedMessage`` plus the key epoch."""
+        return {**super().to_dict(), 'epoch': self.epoch}
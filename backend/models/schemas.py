@@ -1,32 +1,104 @@
 """
 Pydantic models for API request/response validation.
 """
-from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any, List
+from pydantic import BaseModel, Field, model_serializer, model_validator
+from typing import ClassVar, Optional, Dict, Any, List, Literal, Tuple
 
 
 class BB84Config(BaseModel):
     """Configuration for BB84 protocol execution."""
-    key_length: int = Field(default=256, ge=64, le=2048, description="Desired key length in bits")
+    key_length: int = Field(
+        default=256,
+        ge=64,
+        le=1048576,
+        description="Desired key length in bits (above 2048 only for one-time-pad sessions, which need at least 512)"
+    )
+    protocol: Literal['bb84', 'b92', 'six_state', 'e91'] = Field(
+        default='bb84',
+        description="QKD protocol: BB84, B92, the six-state protocol, or entanglement-based E91"
+    )
     enable_eve: bool = Field(default=False, description="Enable eavesdropping simulation")
-    eve_intercept_prob: float = Field(default=1.0, ge=0.0, le=1.0, description="Eve interception probability")
+    eve_intercept_prob: Optional[float] = Field(
+        default=None,
+        ge=0.0,
+        le=1.0,
+        description="Eve interception probability; defaults to 1.0, or 0.0 for pns (single-photon pulses are left alone)"
+    )
+    eve_strategy: Literal['intercept_resend', 'breidbart', 'pns', 'cloning'] = Field(
+        default='intercept_resend',
+        description="Eve's attack: random-basis or Breidbart-basis intercept-resend, photon-number splitting, or cloning"
+    )
+    eve_disturbance: float = Field(default=0.15, ge=0.0, le=0.5, description="Error rate of the cloning attack on attacked qubits")
+    mean_photons: float = Field(default=0.1, ge=0.0, le=10.0, description="Mean photons per pulse of the source (pns attack)")
     qber_threshold: float = Field(default=0.11, ge=0.0, le=1.0, description="Maximum acceptable QBER")
+    trace: bool = Field(default=False, description="Include per-stage wall/CPU timings in the result")
+    detail: Literal['none', 'summary', 'trace'] = Field(
+        default='summary',
+        description="Result detail: no per-party state, aggregate counts, or sampled per-qubit arrays"
+    )
+    trace_points: int = Field(default=512, ge=16, le=8192, description="Qubits sampled when detail is 'trace'")
+    qber_estimation: Literal['full', 'sampled'] = Field(
+        default='full',
+        description="Compare every sifted bit, or disclose a random sample and bound the QBER of the rest"
+    )
+    qber_confidence: float = Field(default=0.99, gt=0.5, lt=1.0, description="Confidence of the sampled QBER bound")
+    qber_margin: float = Field(
+        default=0.06,
+        gt=0.0,
+        le=0.5,
+        description="Largest gap between sampled QBER and its bound; sets the sample size (short keys cannot reach small margins)"
+    )
+    encryption: Literal['fernet', 'otp'] = Field(
+        default='fernet',
+        description="Session cipher: Fernet under a key derived from the quantum key, or a one-time pad consuming it"
+    )
+
+    @model_validator(mode='after')
+    def _check_key_length(self) -> 'BB84Config':
+        # Fernet hashes the key down to 256 bits, so longer keys only cost time
+        if self.encryption == 'fernet' and self.key_length > 2048:
+            raise ValueError("key_length above 2048 bits requires encryption 'otp'")
+        # The pad keeps its first 256 bits back as the token MAC key
+        if self.encryption == 'otp' and self.key_length < 512:
+            raise ValueError("encryption 'otp' requires key_length of at least 512 bits")
+        return self
 
 
 class BB84Result(BaseModel):
     """Result of BB84 protocol execution."""
     success: bool
+    protocol: str = 'bb84'
     key_established: bool
     final_key: str
     key_length: int
     qber: Optional[float]
     qber_threshold: float
+    qber_upper_bound: Optional[float] = None
+    qber_sample_size: Optional[int] = None
+    chsh: Optional[float] = None
     error_detected: bool
     eavesdropping_enabled: bool
     alice_state: Dict[str, Any]
     bob_state: Dict[str, Any]
     eve_state: Optional[Dict[str, Any]] = None
     failure_reason: Optional[str] = None
+    trace: Optional[Dict[str, Any]] = None
+    visualization: Optional[Dict[str, Any]] = None
+    transcript_id: Optional[str] = None
+
+    # Opt-in extras, left out of the response while unset so the default
+    # payload keeps its original shape
+    _OMIT_WHEN_NONE: ClassVar[Tuple[str, ...]] = (
+        'qber_upper_bound', 'qber_sample_size', 'chsh', 'trace', 'visualization', 'transcript_id'
+    )
+
+    @model_serializer(mode='wrap')
+    def _omit_unset_extras(self, handler):
+        data = handler(self)
+        for name in self._OMIT_WHEN_NONE:
+            if data.get(name, ...) is None:
+                del data[name]
+        return data
 
 
 class ChatMessage(BaseModel):
@@ -50,6 +122,11 @@ class KeyExchangeRequest(BaseModel):
     config: BB84Config = Field(default_factory=BB84Config)
 
 
+class KeyExchangeStreamQuery(BB84Config):
+    """Query parameters of the streaming key exchange (EventSource only supports GET)."""
+    user_id: str = Field(..., description="User identifier")
+
+
 class KeyExchangeResponse(BaseModel):
     """Response from key exchange."""
     session_id: str
@@ -64,6 +141,31 @@ class SendMessageRequest(BaseModel):
     message: str
 
 
+class CreateRoomRequest(BaseModel):
+    """Request to create a group room."""
+    session_id: str = Field(..., description="Creator's session (its pairwise key wraps the room key)")
+    name: Optional[str] = Field(default=None, max_length=100, description="Display name")
+
+
+class RoomMemberRequest(BaseModel):
+    """Request to add a session to a room."""
+    session_id: str
+
+
+class RoomMessageRequest(BaseModel):
+    """Request to send a message to a room."""
+    session_id: str = Field(..., description="Sending member's session")
+    sender: str
+    message: str
+
+
+class RoomDecryptRequest(BaseModel):
+    """Request to decrypt a room message."""
+    session_id: str = Field(..., description="Member session")
+    ciphertext: str
+    epoch: int = Field(..., ge=0, description="Room key epoch the message was sent under")
+
+
 class SendMessageResponse(BaseModel):
     """Response after sending message."""
     success: bool
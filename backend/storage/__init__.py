@@ -0,0 +1,7 @@
+"""
+Durable storage for chat sessions.
+"""
+from .message_log import MessageLog, SessionLog, LogRecord
+from .transcripts import Transcript, TranscriptStore
+
+__all__ = ['MessageLog', 'SessionLog', 'LogRecord', 'Transcript', 'TranscriptStore']
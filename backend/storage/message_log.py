@@ -0,0 +1,611 @@
+"""
+Append-only, segmented on-disk message log.
+
+Each session gets its own directory::
+
+    <root>/<session_id>/
+        session.json                 # key material and BB84 result, written once
+        pad.bin                      # one-time-pad refills, appended (OTP sessions)
+        pad.offset                   # fsynced high-water mark of issued pad bytes (OTP sessions)
+        ACTIVITY                     # mtime records the last activity when the session is unloaded
+        LOCK                         # flock held by the worker owning the session
+        00000000000000000000.log     # segment, named by its first sequence number
+        00000000000000000000.idx     # sparse (seq, offset) index for the segment
+
+Records are length-prefixed and checksummed so a torn write at the tail of
+the active segment is detected and truncated on recovery. Writes go straight
+to the file descriptor; a background thread fsyncs dirty segments in batches
+(group commit) so the request path never waits on the disk. Reads memory-map
+the segment and start from the nearest sparse index entry, so fetching a page
+of history does not scan the file from the beginning.
+"""
+import atexit
+import bisect
+import fcntl
+import json
+import mmap
+import os
+import shutil
+import struct
+import threading
+import uuid
+import zlib
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# payload length, crc32, sequence number, epoch timestamp
+RECORD_HEADER = struct.Struct('<IIQd')
+# sequence number, byte offset of the record in its segment
+INDEX_ENTRY = struct.Struct('<QQ')
+SENDER_LENGTH = struct.Struct('<H')
+PAD_OFFSET = struct.Struct('<Q')
+
+META_FILE = 'session.json'
+PAD_FILE = 'pad.bin'
+PAD_OFFSET_FILE = 'pad.offset'
+ACTIVITY_FILE = 'ACTIVITY'
+LOCK_FILE = 'LOCK'
+SEGMENT_SUFFIX = '.log'
+INDEX_SUFFIX = '.idx'
+
+
+class LogRecord(NamedTuple):
+    """A single message read back from the log."""
+    seq: int
+    timestamp: float
+    sender: str
+    ciphertext: bytes
+
+
+def _encode_record(seq: int, timestamp: float, sender: str, ciphertext: bytes) -> bytes:
+    sender_bytes = sender.encode('utf-8')
+    payload = SENDER_LENGTH.pack(len(sender_bytes)) + sender_bytes + ciphertext
+    crc = zlib.crc32(payload, zlib.crc32(struct.pack('<Qd', seq, timestamp)))
+    return RECORD_HEADER.pack(len(payload), crc, seq, timestamp) + payload
+
+
+def _decode_record(buf, offset: int) -> Optional[Tuple[LogRecord, int]]:
+    """
+    Decode the record starting at ``offset``.
+
+    Returns:
+        Tuple of (record, next_offset), or None if the bytes at ``offset`` are
+        not a complete, valid record (end of data or a torn write)
+    """
+    end = offset + RECORD_HEADER.size
+    if end > len(buf):
+        return None
+    length, crc, seq, timestamp = RECORD_HEADER.unpack_from(buf, offset)
+    if length < SENDER_LENGTH.size or end + length > len(buf):
+        return None
+    payload = buf[end:end + length]
+    if zlib.crc32(payload, zlib.crc32(struct.pack('<Qd', seq, timestamp))) != crc:
+        return None
+    (sender_length,) = SENDER_LENGTH.unpack_from(payload, 0)
+    body = SENDER_LENGTH.size + sender_length
+    if body > length:
+        return None
+    sender = bytes(payload[SENDER_LENGTH.size:body]).decode('utf-8')
+    return LogRecord(seq, timestamp, sender, bytes(payload[body:])), end + length
+
+
+def _last_modified(directory: str) -> float:
+    """Newest mtime of the files in a session directory (appends and unloads move it)."""
+    newest = 0.0
+    for name in os.listdir(directory):
+        try:
+            newest = max(newest, os.stat(os.path.join(directory, name)).st_mtime)
+        except FileNotFoundError:
+            pass
+    return newest
+
+
+def _segment_name(first_seq: int, suffix: str) -> str:
+    return f'{first_seq:020d}{suffix}'
+
+
+class _Segment:
+    """Bookkeeping for one segment file and its sparse index."""
+
+    def __init__(self, directory: str, first_seq: int):
+        self.first_seq = first_seq
+        self.path = os.path.join(directory, _segment_name(first_seq, SEGMENT_SUFFIX))
+        self.index_path = os.path.join(directory, _segment_name(first_seq, INDEX_SUFFIX))
+        self.index_seqs: List[int] = []
+        self.index_offsets: List[int] = []
+        self.size = 0
+
+    def load_index(self, size: int) -> None:
+        """Load index entries, dropping any that point past ``size`` bytes."""
+        self.size = size
+        try:
+            with open(self.index_path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            data = b''
+        usable = len(data) - len(data) % INDEX_ENTRY.size
+        for seq, offset in INDEX_ENTRY.iter_unpack(data[:usable]):
+            if offset >= size:
+                break
+            self.index_seqs.append(seq)
+            self.index_offsets.append(offset)
+
+    def start_offset(self, seq: int) -> int:
+        """Offset of the last indexed record at or before ``seq``."""
+        i = bisect.bisect_right(self.index_seqs, seq) - 1
+        return self.index_offsets[i] if i >= 0 else 0
+
+
+class SessionLog:
+    """Append/read handle for a single session's log, owned by one process."""
+
+    def __init__(self, owner: 'MessageLog', directory: str, lock_fd: int):
+        self._owner = owner
+        self.directory = directory
+        self._lock_fd = lock_fd
+        self._lock = threading.Lock()
+        self._segments: List[_Segment] = []
+        self._fd: Optional[int] = None
+        self._index_fd: Optional[int] = None
+        self.next_seq = 0
+        # Read before recovery, whose tail truncation touches the files
+        self.last_active = _last_modified(directory)
+        self._recover()
+
+    def _recover(self) -> None:
+        """Load segment indexes and truncate any torn record at the tail."""
+        first_seqs = sorted(
+            int(name[:-len(SEGMENT_SUFFIX)])
+            for name in os.listdir(self.directory)
+            if name.endswith(SEGMENT_SUFFIX)
+        )
+        for first_seq in first_seqs:
+            segment = _Segment(self.directory, first_seq)
+            segment.load_index(os.path.getsize(segment.path))
+            self._segments.append(segment)
+
+        if not self._segments:
+            self._open_segment(0)
+            return
+
+        # Only the tail of the active segment can be incomplete; scan it from
+        # the last index entry rather than from the start of the file.
+        active = self._segments[-1]
+        offset = active.index_offsets[-1] if active.index_offsets else 0
+        self.next_seq = active.index_seqs[-1] if active.index_seqs else active.first_seq
+        with open(active.path, 'rb') as f:
+            f.seek(offset)
+            tail = f.read()
+        position = 0
+        while True:
+            decoded = _decode_record(tail, position)
+            if decoded is None:
+                break
+            record, position = decoded
+            self.next_seq = record.seq + 1
+        valid_size = offset + position
+        if valid_size < active.size:
+            os.truncate(active.path, valid_size)
+            active.size = valid_size
+        if os.path.exists(active.index_path):
+            os.truncate(active.index_path, len(active.index_seqs) * INDEX_ENTRY.size)
+
+        self._fd = os.open(active.path, os.O_WRONLY | os.O_APPEND)
+        self._index_fd = os.open(active.index_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+
+    def _open_segment(self, first_seq: int) -> None:
+        segment = _Segment(self.directory, first_seq)
+        self._fd = os.open(segment.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        self._index_fd = os.open(segment.index_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        self._segments.append(segment)
+
+    def append(self, sender: str, ciphertext: bytes, timestamp: float) -> int:
+        """
+        Append a message to the log.
+
+        The write reaches the OS immediately; durability follows within one
+        group-commit interval.
+
+        Args:
+            sender: Message sender
+            ciphertext: Encrypted message bytes
+            timestamp: Unix epoch timestamp of the message
+
+        Returns:
+            Sequence number assigned to the message
+        """
+        with self._lock:
+            if self._fd is None:
+                raise ValueError("Session log is closed")
+            seq = self.next_seq
+            record = _encode_record(seq, timestamp, sender, ciphertext)
+            segment = self._segments[-1]
+
+            if segment.size and segment.size + len(record) > self._owner.segment_bytes:
+                self._owner._retire(self._fd, self._index_fd)
+                self._open_segment(seq)
+                segment = self._segments[-1]
+
+            offset = segment.size
+            os.write(self._fd, record)
+            segment.size += len(record)
+            if offset == 0 or seq % self._owner.index_interval == 0:
+                os.write(self._index_fd, INDEX_ENTRY.pack(seq, offset))
+                segment.index_seqs.append(seq)
+                segment.index_offsets.append(offset)
+            self.next_seq = seq + 1
+
+        self._owner._mark_dirty(self)
+        return seq
+
+    def read(self, start_seq: int = 0, limit: Optional[int] = None) -> Iterator[LogRecord]:
+        """
+        Iterate over records with ``seq >= start_seq`` using memory-mapped reads.
+
+        Args:
+            start_seq: First sequence number to return
+            limit: Maximum number of records to return (all if None)
+
+        Yields:
+            LogRecord entries in sequence order
+        """
+        with self._lock:
+            segments = [(s, s.size) for s in self._segments]
+
+        first_seqs = [s.first_seq for s, _ in segments]
+        start = max(bisect.bisect_right(first_seqs, start_seq) - 1, 0)
+        remaining = limit
+        for segment, size in segments[start:]:
+            if size == 0:
+                continue
+            with open(segment.path, 'rb') as f:
+                with mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ) as mapped:
+                    view = memoryview(mapped)
+                    try:
+                        position = segment.start_offset(start_seq)
+                        while position < size:
+                            decoded = _decode_record(view, position)
+                            if decoded is None:
+                                break
+                            record, position = decoded
+                            if record.seq < start_seq:
+                                continue
+                            yield record
+                            if remaining is not None:
+                                remaining -= 1
+                                if remaining <= 0:
+                                    return
+                    finally:
+                        view.release()
+
+    def append_pad(self, chunk: bytes) -> None:
+        """
+        Durably append one-time-pad key material.
+
+        Refills are rare and must survive a crash before any of their bytes
+        encrypt a message, so this fsyncs immediately instead of waiting for
+        the group commit.
+        """
+        fd = os.open(os.path.join(self.directory, PAD_FILE), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            os.write(fd, chunk)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def read_pad(self) -> bytes:
+        """One-time-pad key material appended with :meth:`append_pad`."""
+        try:
+            with open(os.path.join(self.directory, PAD_FILE), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return b''
+
+    def write_pad_offset(self, offset: int) -> None:
+        """
+        Durably record that pad bytes below ``offset`` may have been issued.
+
+        Message records are only group-committed, so after a crash the log
+        alone can understate the consumed offset; recovery resumes from this
+        mark as well, and a pad byte is never issued twice.
+        """
+        fd = os.open(os.path.join(self.directory, PAD_OFFSET_FILE), os.O_WRONLY | os.O_CREAT, 0o600)
+        try:
+            os.pwrite(fd, PAD_OFFSET.pack(offset), 0)
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def read_pad_offset(self) -> int:
+        """High-water mark written by :meth:`write_pad_offset` (0 if none)."""
+        try:
+            with open(os.path.join(self.directory, PAD_OFFSET_FILE), 'rb') as f:
+                data = f.read(PAD_OFFSET.size)
+        except FileNotFoundError:
+            return 0
+        return PAD_OFFSET.unpack(data)[0] if len(data) == PAD_OFFSET.size else 0
+
+    def mark_active(self, when: float) -> None:
+        """
+        Record the session's last activity (epoch seconds) before it is unloaded.
+
+        Reads and decrypts do not write to the log, so without this a session
+        recovered later would look idle since its last message.
+        """
+        path = os.path.join(self.directory, ACTIVITY_FILE)
+        with open(path, 'a'):
+            pass
+        os.utime(path, (when, when))
+        self.last_active = max(self.last_active, when)
+
+    def sync(self) -> None:
+        """Flush written records to stable storage."""
+        with self._lock:
+            if self._fd is None:
+                return
+            fds = (os.dup(self._fd), os.dup(self._index_fd))
+        try:
+            for fd in fds:
+                os.fsync(fd)
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+    def close(self) -> None:
+        """Sync and close the log, releasing ownership of the session."""
+        self.sync()
+        with self._lock:
+            for fd in (self._fd, self._index_fd, self._lock_fd):
+                if fd is not None:
+                    os.close(fd)
+            self._fd = self._index_fd = self._lock_fd = None
+
+
+class MessageLog:
+    """
+    Root of the on-disk message log for all sessions in this deployment.
+
+    A session directory is owned by at most one process at a time through an
+    exclusive ``flock``, so two gunicorn workers never append to the same
+    segment. Sessions are not loaded at startup; :meth:`open` recovers one on
+    first access, and :meth:`reap` removes expired ones nobody has asked for.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        segment_bytes: int = 8 * 1024 * 1024,
+        fsync_interval: float = 0.05,
+        index_interval: int = 64
+    ):
+        """
+        Initialize the message log.
+
+        Args:
+            root: Directory holding one subdirectory per session
+            segment_bytes: Size at which the active segment is rolled over
+            fsync_interval: Seconds between group-commit fsyncs
+            index_interval: Write a sparse index entry every N records
+        """
+        self.root = root
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.index_interval = max(index_interval, 1)
+        os.makedirs(root, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._dirty: Dict[int, SessionLog] = {}
+        self._retired: List[int] = []
+        self._wakeup = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        self._closed = False
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self) -> None:
+        # The flusher thread does not survive fork and locks may be held by it
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._flusher = None
+        self._dirty = {}
+        self._retired = []
+
+    @classmethod
+    def from_env(cls) -> Optional['MessageLog']:
+        """Build a log from ``MESSAGE_LOG_*`` variables, or None if disabled."""
+        root = os.getenv('MESSAGE_LOG_DIR')
+        if not root:
+            return None
+        return cls(
+            root,
+            segment_bytes=int(os.getenv('MESSAGE_LOG_SEGMENT_BYTES', 8 * 1024 * 1024)),
+            fsync_interval=float(os.getenv('MESSAGE_LOG_FSYNC_MS', 50)) / 1000,
+            index_interval=int(os.getenv('MESSAGE_LOG_INDEX_INTERVAL', 64))
+        )
+
+    def _session_dir(self, session_id: str) -> str:
+        # Session IDs come from URLs; only canonical UUIDs may touch the disk
+        try:
+            if str(uuid.UUID(session_id)) != session_id:
+                raise ValueError
+        except ValueError:
+            raise ValueError(f"Invalid session id: {session_id!r}")
+        return os.path.join(self.root, session_id)
+
+    @staticmethod
+    def _acquire(directory: str) -> Optional[int]:
+        fd = os.open(os.path.join(directory, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    def create(self, session_id: str, meta: dict) -> SessionLog:
+        """
+        Create the log for a new session.
+
+        Args:
+            session_id: Session identifier (UUID)
+            meta: JSON-serializable session state needed to rebuild the session
+
+        Returns:
+            SessionLog handle owned by this process
+        """
+        directory = self._session_dir(session_id)
+        os.makedirs(directory, exist_ok=False)
+        lock_fd = self._acquire(directory)
+
+        tmp_path = os.path.join(directory, META_FILE + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(directory, META_FILE))
+        return SessionLog(self, directory, lock_fd)
+
+    def open(self, session_id: str) -> Optional[Tuple[dict, SessionLog]]:
+        """
+        Recover a session persisted by this or a previous process.
+
+        Returns:
+            Tuple of (meta, SessionLog), or None if the session does not exist
+            on disk or is currently owned by another worker
+        """
+        try:
+            directory = self._session_dir(session_id)
+        except ValueError:
+            return None
+        meta_path = os.path.join(directory, META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+        lock_fd = self._acquire(directory)
+        if lock_fd is None:
+            return None
+        try:
+            with open(meta_path) as f:
+                meta = json.load(f)
+            return meta, SessionLog(self, directory, lock_fd)
+        except Exception:
+            os.close(lock_fd)
+            raise
+
+    def peek(self, session_id: str) -> Optional[Tuple[dict, float]]:
+        """
+        Read a persisted session's meta without taking its lock.
+
+        Returns:
+            Tuple of (meta, last activity in epoch seconds), or None if the
+            session does not exist on disk
+        """
+        try:
+            directory = self._session_dir(session_id)
+            with open(os.path.join(directory, META_FILE)) as f:
+                meta = json.load(f)
+            return meta, _last_modified(directory)
+        except (ValueError, OSError):
+            return None
+
+    def session_ids(self) -> List[str]:
+        """IDs of every session persisted under the root."""
+        ids = []
+        for name in os.listdir(self.root):
+            try:
+                directory = self._session_dir(name)
+            except ValueError:
+                continue
+            if os.path.exists(os.path.join(directory, META_FILE)):
+                ids.append(name)
+        return ids
+
+    def reap(self, session_id: str, expired: Callable[[dict, float], Optional[str]]) -> Optional[str]:
+        """
+        Delete a session's log if it has expired.
+
+        Sessions owned by a worker (including this one) are left alone.
+
+        Args:
+            session_id: Session identifier (UUID)
+            expired: Called with the session's meta and last activity (epoch
+                seconds); returns the expiry reason, or None to keep it
+
+        Returns:
+            The expiry reason if the log was deleted, else None
+        """
+        try:
+            directory = self._session_dir(session_id)
+            with open(os.path.join(directory, META_FILE)) as f:
+                meta = json.load(f)
+            # Checked before locking so a live session is never locked out by a sweep
+            if expired(meta, _last_modified(directory)) is None:
+                return None
+        except (ValueError, OSError):
+            return None
+        lock_fd = self._acquire(directory)
+        if lock_fd is None:
+            return None
+        try:
+            reason = expired(meta, _last_modified(directory))
+            if reason is not None:
+                shutil.rmtree(directory, ignore_errors=True)
+            return reason
+        finally:
+            os.close(lock_fd)
+
+    def delete(self, session_id: str, log: Optional[SessionLog] = None) -> None:
+        """Remove a session's log from disk."""
+        if log is not None:
+            with log._lock:
+                for fd in (log._fd, log._index_fd, log._lock_fd):
+                    if fd is not None:
+                        os.close(fd)
+                log._fd = log._index_fd = log._lock_fd = None
+        try:
+            directory = self._session_dir(session_id)
+        except ValueError:
+            return
+        shutil.rmtree(directory, ignore_errors=True)
+
+    def _mark_dirty(self, log: SessionLog) -> None:
+        with self._lock:
+            self._dirty[id(log)] = log
+            if self._flusher is None and not self._closed:
+                self._flusher = threading.Thread(
+                    target=self._flush_loop, name='message-log-fsync', daemon=True
+                )
+                self._flusher.start()
+                atexit.register(self.close)
+
+    def _retire(self, fd: int, index_fd: int) -> None:
+        """Hand a rolled-over segment's descriptors to the flusher to sync and close."""
+        with self._lock:
+            self._retired.extend((fd, index_fd))
+
+    def flush(self) -> None:
+        """Fsync every log with pending writes (one group commit)."""
+        with self._lock:
+            dirty = list(self._dirty.values())
+            self._dirty.clear()
+            retired, self._retired = self._retired, []
+        for fd in retired:
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        for log in dirty:
+            try:
+                log.sync()
+            except OSError:
+                pass  # Deleted underneath us; nothing left to make durable
+
+    def _flush_loop(self) -> None:
+        while not self._closed:
+            self._wakeup.wait(self.fsync_interval)
+            self.flush()
+
+    def close(self) -> None:
+        """Stop the flusher after a final group commit."""
+        self._closed = True
+        self._wakeup.set()
+        if self._flusher is not None and self._flusher is not threading.current_thread():
+            self._flusher.join()
+        self.flush()
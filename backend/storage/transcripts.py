@@ -0,0 +1,273 @@
+"""
+Compressed BB84 protocol transcripts.
+
+A transcript holds everything needed to reconstruct one key exchange: the
+seed of its random generator, its configuration and outcome, and the
+per-qubit arrays (Alice's bits and bases, Bob's bases and measured bits,
+Eve's bases and intercept mask, channel-noise positions). 0/1 arrays are
+bit-packed, basis arrays of protocols with more than two bases are kept one
+byte per qubit, and the file is written with ``numpy.savez_compressed``::
+
+    <root>/<transcript_id>.npz
+
+Files are written by a background thread, so recording never blocks a
+request, and numpy is only imported once a transcript is written or read.
+A full queue drops the transcript rather than waiting. After each batch of
+writes the oldest files are removed until the directory is within
+``max_bytes`` and no file is older than ``max_age``.
+
+Transcripts of successful exchanges contain the key material, so the
+directory must be protected like the message log.
+"""
+import atexit
+import json
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from ..telemetry import metrics
+
+TRANSCRIPT_SUFFIX = '.npz'
+MODES = ('off', 'failures', 'all')
+_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+
+class Transcript:
+    """One recorded protocol run."""
+
+    __slots__ = ('transcript_id', 'seed', 'config', 'outcome', 'created_at', 'arrays')
+
+    def __init__(
+        self,
+        seed: int,
+        config: dict,
+        outcome: str,
+        arrays: Dict[str, Any],
+        transcript_id: Optional[str] = None,
+        created_at: Optional[float] = None
+    ):
+        self.transcript_id = transcript_id or uuid.uuid4().hex
+        self.seed = seed
+        self.config = config
+        self.outcome = outcome
+        self.created_at = created_at if created_at is not None else time.time()
+        self.arrays = arrays
+
+    def meta(self) -> dict:
+        """Everything but the arrays, JSON-serialisable."""
+        return {
+            'transcript_id': self.transcript_id,
+            'seed': str(self.seed),
+            'config': self.config,
+            'outcome': self.outcome,
+            'created_at': self.created_at,
+            'lengths': {name: int(len(values)) for name, values in self.arrays.items()}
+        }
+
+
+class TranscriptStore:
+    """Directory of transcripts with a background writer and retention limits."""
+
+    def __init__(
+        self,
+        root: str,
+        mode: str = 'failures',
+        max_bytes: int = 256 * 1024 * 1024,
+        max_age: float = 7 * 24 * 60 * 60,
+        queue_size: int = 64
+    ):
+        """
+        Initialize the store.
+
+        Args:
+            root: Directory holding the transcript files
+            mode: ``failures`` records only failed exchanges, ``all`` every one
+            max_bytes: Total size beyond which the oldest transcripts are deleted
+            max_age: Seconds after which a transcript is deleted
+            queue_size: Transcripts waiting to be written before new ones are dropped
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown transcript mode: {mode}")
+        self.root = root
+        self.mode = mode
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.queue_size = queue_size
+        os.makedirs(root, mode=0o700, exist_ok=True)
+
+        self._queue: queue.Queue = queue.Queue(queue_size)
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self) -> None:
+        # The writer thread does not survive fork; queued items belong to the parent
+        self._queue = queue.Queue(self.queue_size)
+        self._writer = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional['TranscriptStore']:
+        """Build a store from ``TRANSCRIPT_*`` variables, or None if disabled."""
+        root = os.getenv('TRANSCRIPT_DIR')
+        mode = os.getenv('TRANSCRIPT_MODE', 'failures')
+        if not root or mode == 'off':
+            return None
+        return cls(
+            root,
+            mode=mode,
+            max_bytes=int(os.getenv('TRANSCRIPT_MAX_BYTES', 256 * 1024 * 1024)),
+            max_age=float(os.getenv('TRANSCRIPT_MAX_AGE', 7 * 24 * 60 * 60))
+        )
+
+    def wants(self, success: bool) -> bool:
+        return self.mode == 'all' or not success
+
+    def submit(self, transcript: Transcript) -> Optional[str]:
+        """
+        Queue a transcript for writing.
+
+        Returns:
+            The transcript id, or None if the queue was full and it was dropped
+        """
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(
+                    target=self._write_loop, name='transcript-writer', daemon=True
+                )
+                self._writer.start()
+                atexit.register(self.close)
+        try:
+            self._queue.put_nowait(transcript)
+        except queue.Full:
+            metrics.TRANSCRIPTS.labels('dropped').inc()
+            return None
+        return transcript.transcript_id
+
+    def _path(self, transcript_id: str) -> str:
+        # Ids come from URLs; only our own hex ids may touch the disk
+        if not _ID_PATTERN.match(transcript_id):
+            raise ValueError(f"Invalid transcript id: {transcript_id!r}")
+        return os.path.join(self.root, transcript_id + TRANSCRIPT_SUFFIX)
+
+    def write(self, transcript: Transcript) -> None:
+        """Write one transcript synchronously (atomically, via rename)."""
+        import numpy as np
+        path = self._path(transcript.transcript_id)
+        packed = {}
+        unpacked = []
+        for name, values in transcript.arrays.items():
+            values = values.astype(np.uint8)
+            if values.size and values.max() > 1:
+                packed[name] = values
+                unpacked.append(name)
+            else:
+                packed[name] = np.packbits(values)
+        meta = dict(transcript.meta(), unpacked=unpacked)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez_compressed(f, meta=np.array(json.dumps(meta)), **packed)
+        os.replace(tmp, path)
+        metrics.TRANSCRIPTS.labels('written').inc()
+
+    def _write_loop(self) -> None:
+        while True:
+            transcript = self._queue.get()
+            if transcript is None:
+                return
+            try:
+                self.write(transcript)
+                # Drain whatever else is queued before paying for a directory scan
+                while True:
+                    try:
+                        transcript = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if transcript is None:
+                        self.enforce_limits()
+                        return
+                    self.write(transcript)
+                self.enforce_limits()
+            except OSError:
+                metrics.TRANSCRIPTS.labels('dropped').inc()
+
+    def enforce_limits(self, now: Optional[float] = None) -> int:
+        """
+        Delete transcripts past ``max_age`` and the oldest beyond ``max_bytes``.
+
+        Returns:
+            Number of files removed
+        """
+        now = time.time() if now is None else now
+        entries = []
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if entry.name.endswith(TRANSCRIPT_SUFFIX):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, path in entries:
+            if total <= self.max_bytes and now - mtime <= self.max_age:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass  # Removed by another worker
+            total -= size
+            removed += 1
+        if removed:
+            metrics.TRANSCRIPTS.labels('expired').inc(removed)
+        return removed
+
+    def load(self, transcript_id: str) -> Optional[Transcript]:
+        """Read a transcript, or None if it does not exist."""
+        import numpy as np
+        try:
+            path = self._path(transcript_id)
+        except ValueError:
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                meta = json.loads(str(data['meta']))
+                unpacked = set(meta.get('unpacked', ()))
+                arrays = {
+                    name: data[name] if name in unpacked else np.unpackbits(data[name])[:length].astype(bool)
+                    for name, length in meta['lengths'].items()
+                }
+        except FileNotFoundError:
+            return None
+        return Transcript(
+            int(meta['seed']),
+            meta['config'],
+            meta['outcome'],
+            arrays,
+            transcript_id=meta['transcript_id'],
+            created_at=meta['created_at']
+        )
+
+    def list(self, limit: int = 100) -> List[dict]:
+        """Newest transcripts first (id, creation time and size only)."""
+        entries = []
+        with os.scandir(self.root) as it:
+            for entry in it:
+                if entry.name.endswith(TRANSCRIPT_SUFFIX):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.name[:-len(TRANSCRIPT_SUFFIX)]))
+        entries.sort(reverse=True)
+        return [
+            {'transcript_id': name, 'created_at': mtime, 'bytes': size}
+            for mtime, size, name in entries[:limit]
+        ]
+
+    def close(self) -> None:
+        """Write everything still queued and stop the writer."""
+        if self._writer is not None and self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
@@ -0,0 +1,7 @@
+"""
+Operational telemetry: Prometheus metrics, stage timing and structured logs.
+"""
+from .logs import event_log
+from .metrics import REGISTRY, StageTimer
+
+__all__ = ['REGISTRY', 'StageTimer', 'event_log']
@@ -0,0 +1,183 @@
+"""
+Structured, non-blocking application logging.
+
+Events are written one JSON object per line to stdout::
+
+    {"ts": 1760860800.123456, "level": "info", "event": "message", "session_id": "...", "latency_ms": 0.42, ...}
+
+Code on the request path only puts records on a bounded queue through a
+:class:`~logging.handlers.QueueHandler`. A :class:`~logging.handlers.QueueListener`
+thread formats and writes them, so a slow stdout stalls that thread rather
+than the event loop. When the queue is full a record is dropped and counted
+instead of waiting.
+
+High-volume event types are sampled. ``LOG_SAMPLE_RATES`` maps event types
+to the fraction kept, e.g. ``message=0.1,decrypt=0.05``. Kept records carry
+``sample_rate`` so counts can be scaled back up.
+"""
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from . import metrics
+
+LOGGER_NAME = 'quantum_chat'
+DEFAULT_SAMPLE_RATES = 'http_request=0.1,message=0.1,decrypt=0.1'
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """
+    Parse ``event=rate`` pairs separated by commas.
+
+    Raises:
+        ValueError: If a pair is malformed or a rate is outside [0, 1]
+    """
+    rates = {}
+    for pair in filter(None, (part.strip() for part in spec.split(','))):
+        event, sep, rate = pair.partition('=')
+        if not sep:
+            raise ValueError(f"Invalid sample rate {pair!r}, expected event=rate")
+        value = float(rate)
+        if not 0.0 <= value <= 1.0:
+            raise ValueError(f"Sample rate for {event.strip()!r} must be between 0 and 1")
+        rates[event.strip()] = value
+    return rates
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object: timestamp, level, event and its fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': round(record.created, 6),
+            'level': record.levelname.lower(),
+            'event': getattr(record, 'event', None) or record.getMessage()
+        }
+        if record.name != LOGGER_NAME:
+            entry['logger'] = record.name
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str, separators=(',', ':'))
+
+
+class DroppingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks: records that do not fit are dropped."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting is left to the listener thread; only what cannot safely
+        # cross threads (arguments, live tracebacks) is resolved here
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            metrics.LOG_RECORDS.labels('dropped').inc()
+            return
+        metrics.LOG_RECORDS.labels('queued').inc()
+
+
+class EventLog:
+    """Sampled structured events on a queued logger."""
+
+    def __init__(
+        self,
+        queue_size: int = 10000,
+        sample_rates: Optional[Dict[str, float]] = None,
+        level: int = logging.INFO,
+        stream=None
+    ):
+        """
+        Initialize the event log.
+
+        Args:
+            queue_size: Records buffered for the writer thread before new ones are dropped
+            sample_rates: Fraction of each event type to keep (default 1.0)
+            level: Lowest level logged
+            stream: Where the writer thread writes (default stdout)
+        """
+        self.sample_rates = sample_rates or {}
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.logger = logging.getLogger(LOGGER_NAME)
+        self.logger.setLevel(level)
+        # Events only go through the queue, never to the root logger's handlers
+        self.logger.propagate = False
+        self.handler = DroppingQueueHandler(self.queue)
+        self.logger.addHandler(self.handler)
+        writer = logging.StreamHandler(stream or sys.stdout)
+        writer.setFormatter(JsonFormatter())
+        self.listener = QueueListener(self.queue, writer)
+        self._running = False
+
+    @classmethod
+    def from_env(cls) -> 'EventLog':
+        """Create an event log from LOG_QUEUE_SIZE, LOG_SAMPLE_RATES and LOG_LEVEL."""
+        return cls(
+            queue_size=int(os.getenv('LOG_QUEUE_SIZE', 10000)),
+            sample_rates=parse_sample_rates(os.getenv('LOG_SAMPLE_RATES', DEFAULT_SAMPLE_RATES)),
+            level=logging.getLevelName(os.getenv('LOG_LEVEL', 'INFO').upper())
+        )
+
+    def start(self) -> None:
+        """Start the writer thread (once per process; threads do not survive fork)."""
+        if not self._running:
+            self.listener.start()
+            self._running = True
+
+    def stop(self) -> None:
+        """Write out queued records and stop the writer thread."""
+        if self._running:
+            self.listener.stop()
+            self._running = False
+
+    def event(
+        self,
+        event: str,
+        level: int = logging.INFO,
+        session_id: Optional[str] = None,
+        latency_ms: Optional[float] = None,
+        exc_info=None,
+        **fields
+    ) -> None:
+        """
+        Log one structured event, subject to its sample rate.
+
+        Args:
+            event: Event type, e.g. ``message`` or ``ws_error``
+            level: Logging level
+            session_id: Session the event belongs to
+            latency_ms: Time the operation took
+            exc_info: Exception to attach, as for :meth:`logging.Logger.log`
+            **fields: Further JSON-serialisable fields
+        """
+        if not self.logger.isEnabledFor(level):
+            return
+        rate = self.sample_rates.get(event, 1.0)
+        if rate < 1.0:
+            if random.random() >= rate:
+                metrics.LOG_RECORDS.labels('sampled_out').inc()
+                return
+            fields['sample_rate'] = rate
+        if session_id is not None:
+            fields['session_id'] = session_id
+        if latency_ms is not None:
+            fields['latency_ms'] = round(latency_ms, 3)
+        self.logger.log(level, event, exc_info=exc_info, extra={'event': event, 'fields': fields})
+
+
+event_log = EventLog.from_env()
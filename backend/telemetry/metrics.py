@@ -0,0 +1,462 @@
+"""
+Prometheus metrics with cheap hot-path updates and multi-worker aggregation.
+
+Every metric value lives in a flat array of doubles. An observation is a
+bisect plus two array increments: no locks, no allocation, no I/O. When
+``METRICS_DIR`` is set each process maps its array from
+``<METRICS_DIR>/metrics-<pid>.db``, and a scrape served by any worker sums the
+files of all workers. Files of exited workers (renamed to ``dead-<pid>.db`` by
+the gunicorn ``child_exit`` hook) keep contributing their counters and
+histograms but not their gauges, and are folded into a single archive file on
+the next scrape so the directory does not grow with worker recycling.
+
+Metric layout (the order slots are allocated in) is identical in every worker
+because all metrics are defined at import time in this module; a file whose
+layout fingerprint differs, e.g. one left over from an older release, is
+ignored.
+"""
+import bisect
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Slots available per process; raise if new metrics need more
+CAPACITY = 4096
+HEADER = struct.Struct('<Q')
+FILE_SIZE = HEADER.size + CAPACITY * 8
+ARCHIVE_FILE = 'archive.db'
+
+DEFAULT_LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+DEPTH_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+def _format_value(value: float) -> str:
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _format_labels(pairs: Iterable[Tuple[str, str]]) -> str:
+    rendered = ','.join(f'{name}="{value}"' for name, value in pairs)
+    return '{' + rendered + '}' if rendered else ''
+
+
+class Registry:
+    """Owns the value array and the ordered list of metric definitions."""
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+        self.metrics: List['_Metric'] = []
+        self.size = 0
+        self._layout = hashlib.blake2b(digest_size=8)
+        self._mmap: Optional[mmap.mmap] = None
+        self.values = self._open()
+        # A preloaded app forks workers from the master; give each child its own file
+        os.register_at_fork(after_in_child=self._reopen)
+
+    @classmethod
+    def from_env(cls) -> 'Registry':
+        return cls(os.getenv('METRICS_DIR') or None)
+
+    def _path(self, pid: int) -> str:
+        return os.path.join(self.directory, f'metrics-{pid}.db')
+
+    def _open(self) -> memoryview:
+        if not self.directory:
+            return memoryview(bytearray(FILE_SIZE))[HEADER.size:].cast('d')
+        os.makedirs(self.directory, exist_ok=True)
+        fd = os.open(self._path(os.getpid()), os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+        try:
+            os.ftruncate(fd, FILE_SIZE)
+            self._mmap = mmap.mmap(fd, FILE_SIZE)
+        finally:
+            os.close(fd)
+        self._write_header()
+        return memoryview(self._mmap)[HEADER.size:].cast('d')
+
+    def _reopen(self) -> None:
+        self._mmap = None
+        # Start from zero; values inherited from the parent belong to the parent
+        self.values = self._open()
+
+    def _write_header(self) -> None:
+        if self._mmap is not None:
+            HEADER.pack_into(self._mmap, 0, self.fingerprint)
+
+    @property
+    def fingerprint(self) -> int:
+        return int.from_bytes(self._layout.digest(), 'little')
+
+    def register(self, metric: '_Metric', slots: int) -> int:
+        """Reserve ``slots`` consecutive values for ``metric``; returns the offset."""
+        if self.size + slots > CAPACITY:
+            raise ValueError(f"Metrics registry is full ({CAPACITY} slots)")
+        offset = self.size
+        self.size += slots
+        self.metrics.append(metric)
+        self._layout.update(f'{metric.kind}:{metric.name}:{slots};'.encode())
+        self._write_header()
+        return offset
+
+    def _read_file(self, path: str) -> Optional[List[float]]:
+        try:
+            with open(path, 'rb') as f:
+                data = f.read(FILE_SIZE)
+        except FileNotFoundError:
+            return None
+        if len(data) < FILE_SIZE or HEADER.unpack_from(data, 0)[0] != self.fingerprint:
+            return None
+        return list(memoryview(data)[HEADER.size:].cast('d')[:self.size])
+
+    def _fold_dead(self) -> Optional[List[float]]:
+        """Merge files of exited workers into the archive and return its values."""
+        archive_path = os.path.join(self.directory, ARCHIVE_FILE)
+        lock_fd = os.open(archive_path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            archive = self._read_file(archive_path) or [0.0] * self.size
+            dead = [name for name in os.listdir(self.directory) if name.startswith('dead-')]
+            if not dead:
+                return archive
+            for name in dead:
+                path = os.path.join(self.directory, name)
+                values = self._read_file(path)
+                if values is not None:
+                    for metric in self.metrics:
+                        if metric.kind != 'gauge':
+                            for i in range(metric.offset, metric.offset + metric.slots):
+                                archive[i] += values[i]
+                os.unlink(path)
+            tmp_path = archive_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(HEADER.pack(self.fingerprint))
+                f.write(struct.pack(f'<{self.size}d', *archive))
+                f.write(bytes(FILE_SIZE - HEADER.size - self.size * 8))
+            os.replace(tmp_path, archive_path)
+            return archive
+        finally:
+            os.close(lock_fd)
+
+    def collect(self) -> List[float]:
+        """Sum values across this process, live workers and the dead-worker archive."""
+        totals = list(self.values[:self.size])
+        if not self.directory:
+            return totals
+
+        own = f'metrics-{os.getpid()}.db'
+        for name in os.listdir(self.directory):
+            if not name.startswith('metrics-') or name == own:
+                continue
+            values = self._read_file(os.path.join(self.directory, name))
+            if values is not None:
+                for i, value in enumerate(values):
+                    totals[i] += value
+
+        archive = self._fold_dead()
+        if archive is not None:
+            for metric in self.metrics:
+                if metric.kind != 'gauge':
+                    for i in range(metric.offset, metric.offset + metric.slots):
+                        totals[i] += archive[i]
+        return totals
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        values = self.collect()
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            metric.render(values, lines)
+        return '\n'.join(lines) + '\n'
+
+
+class _Child:
+    """A single labelled series; holds its offset into the registry values."""
+
+    __slots__ = ('_registry', '_offset', '_buckets', 'label')
+
+    def __init__(self, registry: Registry, offset: int, buckets: Tuple[float, ...], label):
+        self._registry = registry
+        self._offset = offset
+        self._buckets = buckets
+        self.label = label
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._registry.values[self._offset] += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._registry.values[self._offset] -= amount
+
+    def set(self, value: float) -> None:
+        self._registry.values[self._offset] = value
+
+    def observe(self, value: float) -> None:
+        values = self._registry.values
+        buckets = self._buckets
+        values[self._offset + bisect.bisect_left(buckets, value)] += 1
+        values[self._offset + len(buckets) + 1] += value
+
+
+class _Metric:
+    kind = ''
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        label: Optional[Tuple[str, Sequence[str]]] = None,
+        buckets: Tuple[float, ...] = (),
+        registry: Optional[Registry] = None
+    ):
+        """
+        Define a metric.
+
+        Args:
+            name: Prometheus metric name
+            documentation: HELP text
+            label: Optional ``(label_name, label_values)``; every value is
+                declared up front so the slot layout is fixed at import time
+            buckets: Histogram upper bounds (histograms only)
+            registry: Registry to allocate in (defaults to the global one)
+        """
+        self.name = name
+        self.documentation = documentation
+        self.registry = registry or REGISTRY
+        self.buckets = tuple(buckets)
+        self.label_name, label_values = label if label else (None, (None,))
+        width = len(self.buckets) + 2 if self.kind == 'histogram' else 1
+        self.slots = width * len(label_values)
+        self.offset = self.registry.register(self, self.slots)
+        self._children: Dict[Optional[str], _Child] = {
+            value: _Child(self.registry, self.offset + i * width, self.buckets, value)
+            for i, value in enumerate(label_values)
+        }
+        self._default = self._children.get(None)
+
+    def labels(self, value: str) -> _Child:
+        return self._children[value]
+
+    def _label_pairs(self, child: _Child) -> List[Tuple[str, str]]:
+        return [(self.label_name, child.label)] if self.label_name else []
+
+    def render(self, values: List[float], lines: List[str]) -> None:
+        for child in self._children.values():
+            labels = _format_labels(self._label_pairs(child))
+            lines.append(f'{self.name}{labels} {_format_value(values[child._offset])}')
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.inc(amount)
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default.inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._default.dec(amount)
+
+    def set(self, value: float) -> None:
+        self._default.set(value)
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, label=None, buckets=DEFAULT_LATENCY_BUCKETS, registry=None):
+        super().__init__(name, documentation, label, buckets, registry)
+
+    def observe(self, value: float) -> None:
+        self._default.observe(value)
+
+    def render(self, values: List[float], lines: List[str]) -> None:
+        n = len(self.buckets)
+        for child in self._children.values():
+            base = self._label_pairs(child)
+            offset = child._offset
+            cumulative = 0.0
+            for i, bound in enumerate(self.buckets + (float('inf'),)):
+                cumulative += values[offset + i]
+                le = '+Inf' if i == n else _format_value(bound)
+                lines.append(
+                    f'{self.name}_bucket{_format_labels(base + [("le", le)])} {_format_value(cumulative)}'
+                )
+            labels = _format_labels(base)
+            lines.append(f'{self.name}_sum{labels} {_format_value(values[offset + n + 1])}')
+            lines.append(f'{self.name}_count{labels} {_format_value(cumulative)}')
+
+
+class StageTimer:
+    """
+    Time consecutive stages of a computation into a labelled histogram.
+
+    Each :meth:`lap` observes the wall time since the previous lap (or since
+    construction) under the given stage label. With ``trace=True`` the wall
+    and CPU time of every stage is also kept in :attr:`stages`.
+    """
+
+    __slots__ = ('histogram', 'last', 'trace', 'stages', 'last_cpu', 'start', 'start_cpu')
+
+    def __init__(self, histogram: Histogram, trace: bool = False):
+        self.histogram = histogram
+        self.trace = trace
+        self.stages: List[dict] = []
+        self.last = self.start = time.perf_counter()
+        # Thread CPU time, so work done by other threads is not attributed here
+        self.last_cpu = self.start_cpu = time.thread_time() if trace else 0.0
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.histogram.labels(stage).observe(now - self.last)
+        if self.trace:
+            cpu = time.thread_time()
+            self.stages.append({
+                'stage': stage,
+                'wall_ms': (now - self.last) * 1000,
+                'cpu_ms': (cpu - self.last_cpu) * 1000
+            })
+            self.last_cpu = cpu
+        self.last = now
+
+    def summary(self) -> dict:
+        """Recorded stages with totals (only meaningful with ``trace=True``)."""
+        return {
+            'stages': self.stages,
+            'total_wall_ms': (self.last - self.start) * 1000,
+            'total_cpu_ms': (self.last_cpu - self.start_cpu) * 1000
+        }
+
+
+REGISTRY = Registry.from_env()
+
+BB84_STAGES = ('generation', 'eve', 'noise', 'measurement', 'sifting', 'qber', 'key_conversion')
+
+BB84_STAGE_SECONDS = Histogram(
+    'quantum_chat_bb84_stage_seconds',
+    'Wall time spent in each QKDProtocol.run stage',
+    label=('stage', BB84_STAGES)
+)
+ENCRYPT_SECONDS = Histogram(
+    'quantum_chat_encrypt_seconds',
+    'Time to encrypt and store one chat message'
+)
+DECRYPT_SECONDS = Histogram(
+    'quantum_chat_decrypt_seconds',
+    'Time to decrypt one chat message'
+)
+BROADCAST_SECONDS = Histogram(
+    'quantum_chat_broadcast_seconds',
+    'Time to fan one event out to every WebSocket in a session'
+)
+WS_QUEUE_DEPTH = Histogram(
+    'quantum_chat_ws_send_queue_depth',
+    'WebSocket sends already in flight on this worker when a new send starts',
+    buckets=DEPTH_BUCKETS
+)
+WS_PENDING_SENDS = Gauge(
+    'quantum_chat_ws_pending_sends',
+    'WebSocket sends currently in flight'
+)
+WS_CONNECTIONS = Gauge(
+    'quantum_chat_ws_connections',
+    'Open WebSocket connections'
+)
+KEY_EXCHANGES = Counter(
+    'quantum_chat_key_exchanges_total',
+    'BB84 key exchanges by outcome',
+    label=('outcome', ('success', 'qber_failure', 'insufficient_bits', 'cancelled'))
+)
+SESSIONS_CREATED = Counter(
+    'quantum_chat_sessions_created_total',
+    'Sessions created'
+)
+SESSIONS_EVICTED = Counter(
+    'quantum_chat_sessions_evicted_total',
+    'Sessions removed by expiry or capacity eviction',
+    label=('reason', ('idle', 'max_age', 'capacity'))
+)
+MESSAGES = Counter(
+    'quantum_chat_messages_total',
+    'Chat messages encrypted and stored'
+)
+DECRYPTS = Counter(
+    'quantum_chat_decrypts_total',
+    'Decryption requests by outcome',
+    label=('outcome', ('success', 'failure'))
+)
+ADMISSION_REJECTED = Counter(
+    'quantum_chat_admission_rejected_total',
+    'Key exchanges shed by admission control',
+    label=('reason', ('rate_limited', 'queue_full', 'queue_timeout'))
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    'quantum_chat_admission_in_flight',
+    'BB84 simulations currently running'
+)
+ADMISSION_QUEUED = Gauge(
+    'quantum_chat_admission_queued',
+    'Key exchanges waiting for a simulation slot'
+)
+WS_REAPED = Counter(
+    'quantum_chat_ws_reaped_total',
+    'WebSocket connections closed for missing heartbeats'
+)
+ROOM_REKEYS = Counter(
+    'quantum_chat_room_rekeys_total',
+    'Room keys generated and wrapped for the members, by membership change',
+    label=('reason', ('create', 'join', 'leave', 'expire'))
+)
+ROOM_MESSAGES = Counter(
+    'quantum_chat_room_messages_total',
+    'Room messages encrypted once and broadcast to all members'
+)
+WS_FRAMES = Counter(
+    'quantum_chat_ws_frames_total',
+    'WebSocket frames sent'
+)
+WS_EVENTS = Counter(
+    'quantum_chat_ws_events_total',
+    'Events delivered over WebSockets (a batched frame carries several)'
+)
+WS_PAYLOAD_BYTES = Counter(
+    'quantum_chat_ws_payload_bytes_total',
+    'WebSocket payload bytes sent, before permessage-deflate'
+)
+WS_DEFLATE_MESSAGES = Counter(
+    'quantum_chat_ws_deflate_messages_total',
+    'Messages on permessage-deflate connections, compressed or below the size threshold',
+    label=('result', ('compressed', 'skipped'))
+)
+WS_DEFLATE_BYTES = Counter(
+    'quantum_chat_ws_deflate_bytes_total',
+    'Bytes into and out of permessage-deflate for compressed messages',
+    label=('direction', ('in', 'out'))
+)
+TRANSCRIPTS = Counter(
+    'quantum_chat_transcripts_total',
+    'Protocol transcripts written, dropped (queue full or I/O error) or expired',
+    label=('result', ('written', 'dropped', 'expired'))
+)
+OTP_REFILLS = Counter(
+    'quantum_chat_otp_refills_total',
+    'Background key exchanges that extended a one-time pad',
+    label=('result', ('success', 'failure'))
+)
+LOG_RECORDS = Counter(
+    'quantum_chat_log_records_total',
+    'Structured log records queued for the writer thread, dropped on a full queue, or skipped by sampling',
+    label=('result', ('queued', 'dropped', 'sampled_out'))
+)
@@ -0,0 +1,116 @@
+"""
+Opt-in, per-request sampling profiler.
+
+Profiling is disabled unless ``PROFILE_TOKEN`` is set. A request that carries
+the profile flag and that token is run under :class:`SamplingProfiler`, which
+snapshots the request thread's stack from a background thread every
+``PROFILE_INTERVAL_MS`` milliseconds. The samples are written to
+``PROFILE_DIR`` in collapsed-stack format (one ``frame;frame;frame count``
+line per distinct stack), ready for flamegraph.pl or speedscope.
+
+Samples are taken from the thread that enters :func:`profiled`, so on the
+event loop they can include other requests interleaved with it. Key exchanges
+enter it from the worker thread running the BB84 simulation and are captured
+cleanly.
+"""
+import hmac
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN')
+PROFILE_DIR = os.getenv('PROFILE_DIR', '/tmp/quantum-chat-profiles')
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL_MS', 1)) / 1000
+
+
+def profiling_enabled() -> bool:
+    return bool(PROFILE_TOKEN)
+
+
+def authorized(token: Optional[str]) -> bool:
+    """Check an admin profiling token in constant time."""
+    if not PROFILE_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode(), PROFILE_TOKEN.encode())
+
+
+class SamplingProfiler:
+    """Samples one thread's Python stack at a fixed interval."""
+
+    def __init__(self, thread_id: Optional[int] = None, interval: float = PROFILE_INTERVAL):
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.started = 0.0
+        self.elapsed = 0.0
+        self.path: Optional[str] = None
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        self.started = time.perf_counter()
+        self._sampler = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None or self.thread_id == own:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            self.samples[';'.join(reversed(stack))] += 1
+
+    def write(self, label: str, directory: str = PROFILE_DIR) -> str:
+        """
+        Write samples in collapsed-stack format.
+
+        Args:
+            label: Short name for the profiled operation, used in the file name
+            directory: Output directory (created if missing)
+
+        Returns:
+            Path of the written profile
+        """
+        os.makedirs(directory, exist_ok=True)
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{label}-{uuid.uuid4().hex[:8]}.folded"
+        path = os.path.join(directory, name)
+        with open(path, 'w') as f:
+            for stack, count in self.samples.most_common():
+                f.write(f'{stack} {count}\n')
+        return path
+
+
+@contextmanager
+def profiled(label: str, enabled: bool = True) -> Iterator[Optional[SamplingProfiler]]:
+    """
+    Profile the enclosed block and write the result under ``label``.
+
+    Yields the profiler (or None when ``enabled`` is false); after the block
+    the profiler's ``path`` attribute holds the written file.
+    """
+    if not enabled:
+        yield None
+        return
+    profiler = SamplingProfiler()
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        profiler.path = profiler.write(label)
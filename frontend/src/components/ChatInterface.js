@@ -117,6 +117,11 @@ function setupChatWebSocket(sessionData) {
                 case 'error':
                     addSystemMessage(`Error: ${data.data.message}`, 'error');
                     break;
+
+                case 'ping':
+                    // Heartbeat: the server closes connections that stay silent
+                    ws.send(JSON.stringify({ type: 'pong' }));
+                    break;
             }
         } catch (error) {
             console.error('Error parsing WebSocket message:', error);
@@ -0,0 +1,3 @@
+"""
+Python tools for Quantum Chat.
+"""
@@ -0,0 +1,24 @@
+"""
+Async client SDK for the Quantum Chat API.
+
+Built on httpx (REST, with keep-alive connection pooling) and websockets
+(``/ws/{session_id}``, with automatic reconnect and resume)::
+
+    from quantum_chat.client import QuantumChatClient
+
+    async with QuantumChatClient('http://localhost:8000') as client:
+        exchange = await client.key_exchange('alice', key_length=512)
+        session_id = exchange['session_id']
+        sent = await client.send_many(session_id, 'alice', ['hi', 'there'])
+        plaintexts = await client.decrypt_many(session_id, [m['ciphertext'] for m in sent])
+
+        async with client.connect(session_id) as socket:
+            await socket.send_message('alice', 'live')
+            async for event in socket:
+                ...
+"""
+from .errors import QuantumChatError, SessionClosed
+from .http import QuantumChatClient
+from .ws import ChatSocket
+
+__all__ = ['ChatSocket', 'QuantumChatClient', 'QuantumChatError', 'SessionClosed']
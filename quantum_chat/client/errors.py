@@ -0,0 +1,25 @@
+"""
+Errors raised by the client.
+"""
+
+
+class QuantumChatError(Exception):
+    """The server rejected a request or an operation failed."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(f"{status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+    @classmethod
+    def from_response(cls, response) -> 'QuantumChatError':
+        """Build from an error response, using FastAPI's ``detail`` when present."""
+        try:
+            detail = response.json().get('detail', response.text)
+        except ValueError:
+            detail = response.text
+        return cls(response.status_code, str(detail))
+
+
+class SessionClosed(QuantumChatError):
+    """The WebSocket was closed for good (e.g. the session no longer exists)."""
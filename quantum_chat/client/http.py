@@ -0,0 +1,199 @@
+"""
+Async HTTP client for the Quantum Chat REST API.
+"""
+import asyncio
+import json
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+import httpx
+
+from .errors import QuantumChatError
+
+# Responses worth retrying after the server's Retry-After (admission control)
+RETRY_STATUSES = (429, 503)
+
+
+class QuantumChatClient:
+    """
+    Pooled, pipelining client for the REST endpoints.
+
+    One ``httpx.AsyncClient`` keeps connections alive across calls. At most
+    ``concurrency`` requests are in flight at once; the batch helpers
+    (:meth:`send_many`, :meth:`decrypt_many`, :meth:`key_exchanges`) issue
+    their requests concurrently up to that limit and return results in input
+    order. Use as an async context manager, or call :meth:`aclose`.
+    """
+
+    def __init__(
+        self,
+        base_url: str = 'http://localhost:8000',
+        concurrency: int = 8,
+        max_connections: int = 20,
+        max_keepalive: int = 10,
+        timeout: float = 30.0,
+        retries: int = 3,
+        transport: Optional[httpx.AsyncBaseTransport] = None
+    ):
+        """
+        Initialize the client.
+
+        Args:
+            base_url: Server URL, e.g. ``https://chat.example.com``
+            concurrency: Requests in flight at once
+            max_connections: Connection pool size
+            max_keepalive: Idle connections kept open for reuse
+            timeout: Per-request timeout in seconds
+            retries: Retries of a request answered 429 or 503, after its ``Retry-After``
+            transport: Custom transport, e.g. ``httpx.ASGITransport(app)`` to talk
+                to an in-process app
+        """
+        self.base_url = base_url.rstrip('/')
+        self.retries = retries
+        # Resume point of the last export (its X-Next-Cursor header)
+        self.last_cursor: Optional[str] = None
+        self._slots = asyncio.Semaphore(concurrency)
+        self._http = httpx.AsyncClient(
+            base_url=self.base_url,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive),
+            timeout=timeout,
+            transport=transport
+        )
+
+    async def __aenter__(self) -> 'QuantumChatClient':
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        """Close pooled connections."""
+        await self._http.aclose()
+
+    async def _request(self, method: str, path: str, **kwargs) -> Any:
+        """
+        Send one request within the concurrency limit, retrying on 429/503.
+
+        Raises:
+            QuantumChatError: On any other non-2xx response, or once retries run out
+        """
+        attempt = 0
+        while True:
+            async with self._slots:
+                response = await self._http.request(method, path, **kwargs)
+            if response.status_code in RETRY_STATUSES and attempt < self.retries:
+                attempt += 1
+                # Wait outside the slot so other requests keep flowing
+                await asyncio.sleep(float(response.headers.get('Retry-After', attempt)))
+                continue
+            if response.is_error:
+                raise QuantumChatError.from_response(response)
+            return response.json()
+
+    async def key_exchange(self, user_id: str, **config) -> Dict[str, Any]:
+        """
+        Run a key exchange and create a session.
+
+        Args:
+            user_id: User identifier
+            **config: ``BB84Config`` fields, e.g. ``key_length=512, protocol='e91'``
+
+        Returns:
+            ``{"session_id", "quantum_key", "bb84_result"}``
+        """
+        return await self._request('POST', '/api/key-exchange', json={'user_id': user_id, 'config': config})
+
+    async def send_message(self, session_id: str, sender: str, message: str) -> Dict[str, Any]:
+        """
+        Encrypt and send a message.
+
+        Returns:
+            The encrypted message (``sender``, ``ciphertext``, ``timestamp``)
+
+        Raises:
+            QuantumChatError: If the server could not encrypt the message
+        """
+        result = await self._request('POST', '/api/send-message', json={
+            'session_id': session_id, 'sender': sender, 'message': message
+        })
+        if not result['success']:
+            raise QuantumChatError(200, result.get('error') or 'Encryption failed')
+        return result['encrypted_message']
+
+    async def decrypt_message(self, session_id: str, ciphertext: str) -> str:
+        """
+        Decrypt a message of a session.
+
+        Raises:
+            QuantumChatError: If the ciphertext does not decrypt
+        """
+        result = await self._request('POST', '/api/decrypt-message', json={
+            'session_id': session_id, 'ciphertext': ciphertext
+        })
+        if not result['success']:
+            raise QuantumChatError(200, result.get('error') or 'Decryption failed')
+        return result['plaintext']
+
+    async def session(self, session_id: str) -> Dict[str, Any]:
+        """Session information and its full message history."""
+        return await self._request('GET', f'/api/sessions/{session_id}')
+
+    async def send_many(self, session_id: str, sender: str, messages: Iterable[str]) -> List[Dict[str, Any]]:
+        """
+        Send messages concurrently.
+
+        Requests are pipelined, so the server may store them in a different
+        order than given; send over :class:`~.ws.ChatSocket` when order matters.
+
+        Returns:
+            Encrypted messages, in input order
+        """
+        return await asyncio.gather(*(self.send_message(session_id, sender, m) for m in messages))
+
+    async def decrypt_many(self, session_id: str, ciphertexts: Iterable[str]) -> List[str]:
+        """Decrypt ciphertexts concurrently, returning plaintexts in input order."""
+        return await asyncio.gather(*(self.decrypt_message(session_id, c) for c in ciphertexts))
+
+    async def key_exchanges(self, user_id: str, count: int, **config) -> List[Dict[str, Any]]:
+        """Run ``count`` key exchanges concurrently (subject to the server's rate limit)."""
+        return await asyncio.gather(*(self.key_exchange(user_id, **config) for _ in range(count)))
+
+    async def export(
+        self,
+        session_id: str,
+        decrypt: bool = False,
+        cursor: Optional[str] = None,
+        batch_size: Optional[int] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream a session's history from ``/api/sessions/{id}/export``.
+
+        Messages are yielded as they arrive, without holding the whole
+        history. After iteration, :attr:`last_cursor` resumes after the last
+        exported message.
+        """
+        params: Dict[str, Any] = {'decrypt': str(decrypt).lower()}
+        if cursor is not None:
+            params['cursor'] = cursor
+        if batch_size is not None:
+            params['batch_size'] = batch_size
+        async with self._slots:
+            async with self._http.stream('GET', f'/api/sessions/{session_id}/export', params=params) as response:
+                if response.is_error:
+                    await response.aread()
+                    raise QuantumChatError.from_response(response)
+                self.last_cursor = response.headers.get('X-Next-Cursor')
+                async for line in response.aiter_lines():
+                    if line:
+                        yield json.loads(line)
+
+    def connect(self, session_id: str, **options) -> 'ChatSocket':
+        """
+        Open a :class:`~.ws.ChatSocket` to the session on the same server.
+
+        Args:
+            session_id: Session to join
+            **options: Passed to :class:`~.ws.ChatSocket`
+        """
+        from .ws import ChatSocket
+        ws_url = 'ws' + self.base_url[len('http'):]
+        return ChatSocket(f'{ws_url}/ws/{session_id}', **options)
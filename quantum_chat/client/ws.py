@@ -0,0 +1,212 @@
+"""
+Reconnecting WebSocket client for ``/ws/{session_id}``.
+"""
+import asyncio
+import json
+from typing import Any, Dict, Optional
+
+import websockets
+from websockets.exceptions import ConnectionClosed
+
+from .errors import SessionClosed
+
+# Close codes after which reconnecting cannot help
+PERMANENT_CLOSE_CODES = {
+    4003: 'Invalid profiling token',
+    4004: 'Session not found'
+}
+# Handshake statuses after which reconnecting cannot help (the server closes
+# before accepting, e.g. for an unknown session)
+REJECTED_STATUSES = (403, 404)
+
+
+class ChatSocket:
+    """
+    Session WebSocket that reconnects and resumes transparently.
+
+    Events are read by iterating (``async for event in socket``). ``batch``
+    frames are unpacked and server ``ping`` events are answered with a pong,
+    so neither reaches the caller. When the connection drops, the socket
+    reconnects with exponential backoff. The server replays the full
+    ``message_history`` on every connect. Only the messages missed while
+    disconnected are passed on, as ``new_message`` events, so callers see
+    each message once. ``session_info`` is passed on after every connect.
+    Commands sent while disconnected wait for the reconnect.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        reconnect: bool = True,
+        initial_backoff: float = 0.5,
+        max_backoff: float = 30.0,
+        coalesce_ms: Optional[float] = None
+    ):
+        """
+        Initialize the socket; it connects on entering ``async with``.
+
+        Args:
+            url: ``ws://`` or ``wss://`` URL of the session endpoint
+            reconnect: Reconnect after the connection drops
+            initial_backoff: First delay between reconnect attempts (seconds)
+            max_backoff: Largest delay between reconnect attempts
+            coalesce_ms: Ask the server to batch events over this window
+        """
+        if coalesce_ms:
+            url = f"{url}{'&' if '?' in url else '?'}coalesce_ms={coalesce_ms}"
+        self.url = url
+        self.reconnect = reconnect
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.reconnects = 0
+        # Messages of the session seen so far; history replays skip this many
+        self.seen_messages = 0
+        self._synced = False
+        self._events: asyncio.Queue = asyncio.Queue()
+        self._ws = None
+        self._connected = asyncio.Event()
+        self._closed = False
+        # Set once the socket has closed for good
+        self._ended: Optional[SessionClosed] = None
+        self._reader: Optional[asyncio.Task] = None
+
+    async def __aenter__(self) -> 'ChatSocket':
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+    async def open(self) -> None:
+        """
+        Connect and start reading events in the background.
+
+        Raises:
+            SessionClosed: If the server rejects the connection
+        """
+        try:
+            await self._connect()
+        except websockets.InvalidStatusCode as e:
+            raise SessionClosed(e.status_code, 'Connection rejected')
+        self._reader = asyncio.create_task(self._run())
+
+    async def close(self) -> None:
+        """Close the connection and stop reconnecting."""
+        self._closed = True
+        if self._reader is not None:
+            self._reader.cancel()
+        if self._ws is not None:
+            await self._ws.close()
+
+    async def _connect(self) -> None:
+        self._ws = await websockets.connect(self.url, subprotocols=['quantum-chat.json'])
+        self._connected.set()
+
+    async def _run(self) -> None:
+        backoff = self.initial_backoff
+        while True:
+            try:
+                async for frame in self._ws:
+                    backoff = self.initial_backoff
+                    await self._dispatch(json.loads(frame))
+                code = self._ws.close_code
+            except ConnectionClosed as e:
+                code = e.rcvd.code if e.rcvd else None
+            self._connected.clear()
+            if code in PERMANENT_CLOSE_CODES:
+                self._end(SessionClosed(code, PERMANENT_CLOSE_CODES[code]))
+                return
+            if self._closed or not self.reconnect:
+                self._end(SessionClosed(code or 1000, 'Connection closed'))
+                return
+            # Reconnect until it succeeds, backing off exponentially
+            while True:
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                try:
+                    await self._connect()
+                    break
+                except websockets.InvalidStatusCode as e:
+                    if e.status_code in REJECTED_STATUSES:
+                        self._end(SessionClosed(e.status_code, 'Connection rejected'))
+                        return
+                except (OSError, websockets.InvalidHandshake):
+                    continue
+            self.reconnects += 1
+
+    def _end(self, error: SessionClosed) -> None:
+        self._ended = error
+        self._events.put_nowait(error)
+        # Wake senders waiting for a reconnect that will not come
+        self._connected.set()
+
+    async def _dispatch(self, event: Dict[str, Any]) -> None:
+        kind = event.get('type')
+        if kind == 'batch':
+            for inner in event['events']:
+                await self._dispatch(inner)
+        elif kind == 'ping':
+            await self._ws.send(json.dumps({'type': 'pong'}))
+        elif kind == 'message_history':
+            # A reconnect replays the whole history; pass on only what was missed
+            history = event['data']
+            if not self._synced:
+                self._synced = True
+                self.seen_messages = len(history)
+                self._events.put_nowait(event)
+            else:
+                for message in history[self.seen_messages:]:
+                    self._events.put_nowait({'type': 'new_message', 'data': message})
+                self.seen_messages = max(self.seen_messages, len(history))
+        else:
+            if kind == 'new_message':
+                self.seen_messages += 1
+            self._events.put_nowait(event)
+
+    def __aiter__(self) -> 'ChatSocket':
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        try:
+            return await self.receive()
+        except SessionClosed as e:
+            if e.status_code in (1000, 1001) or self._closed:
+                raise StopAsyncIteration
+            raise
+
+    async def receive(self) -> Dict[str, Any]:
+        """
+        Next event.
+
+        Raises:
+            SessionClosed: Once the socket has closed for good (iteration
+                just stops on a normal close)
+        """
+        event = await self._events.get()
+        if isinstance(event, SessionClosed):
+            # Keep raising for later calls too
+            self._events.put_nowait(event)
+            raise event
+        return event
+
+    async def _send(self, command: Dict[str, Any]) -> None:
+        while True:
+            await self._connected.wait()
+            if self._ended is not None:
+                raise self._ended
+            ws = self._ws
+            try:
+                await ws.send(json.dumps(command))
+                return
+            except ConnectionClosed:
+                # The reader notices too and reconnects; retry on the new connection
+                if self._ws is ws and self._ended is None:
+                    self._connected.clear()
+
+    async def send_message(self, sender: str, message: str) -> None:
+        """Encrypt and broadcast a message; it arrives back as a ``new_message`` event."""
+        await self._send({'type': 'send_message', 'sender': sender, 'message': message})
+
+    async def decrypt(self, ciphertext: str) -> None:
+        """Request a decryption; the answer is a ``decrypted_message`` event."""
+        await self._send({'type': 'decrypt_message', 'ciphertext': ciphertext})
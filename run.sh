@@ -115,4 +115,4 @@ echo ""
 # Start the backend server which serves both API and frontend
 source backend/venv/bin/activate
 export PYTHONPATH="${PWD}:${PYTHONPATH}"
-uvicorn backend.api.main:app --host 0.0.0.0 --port "${PORT}"
+uvicorn backend.api.main:app --host 0.0.0.0 --port "${PORT}" --ws backend.api.ws_protocol:WebSocketProtocol
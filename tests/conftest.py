@@ -0,0 +1,30 @@
+"""
+Shared fixtures: the anyio backend and a live server for WebSocket tests.
+"""
+import socket
+import threading
+
+import pytest
+import uvicorn
+
+from backend.api import main
+
+
+@pytest.fixture
+def anyio_backend():
+    return 'asyncio'
+
+
+@pytest.fixture
+def live_server():
+    """Serve the app on a local port; WebSockets need a real connection."""
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    server = uvicorn.Server(uvicorn.Config(main.app, lifespan='off', log_level='warning'))
+    thread = threading.Thread(target=server.run, kwargs={'sockets': [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        thread.join(0.01)
+    yield 'http://127.0.0.1:%d' % sock.getsockname()[1]
+    server.should_exit = True
+    thread.join(5)
@@ -0,0 +1,35 @@
+"""
+Admission control: slots taken on behalf of background threads.
+"""
+import asyncio
+
+import pytest
+
+from backend.api.admission import AdmissionController, AdmissionRejected
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_refill_holds_a_slot_without_a_token():
+    admission = AdmissionController(rate=0.001, burst=1, max_concurrent=1)
+    loop = asyncio.get_running_loop()
+    seen = []
+
+    def refill():
+        seen.append(admission.in_flight)
+        return b'pad'
+
+    assert await asyncio.to_thread(admission.run_threadsafe, loop, refill) == b'pad'
+    await asyncio.sleep(0)
+    assert seen == [1] and admission.in_flight == 0
+    # No client bucket was charged
+    assert not admission.buckets
+
+
+async def test_refill_waits_for_the_shared_limit():
+    admission = AdmissionController(max_concurrent=1, max_queue=0, queue_timeout=0.1)
+    loop = asyncio.get_running_loop()
+    async with admission.admit('client'):
+        with pytest.raises(AdmissionRejected):
+            await asyncio.to_thread(admission.run_threadsafe, loop, lambda: b'')
+    assert admission.in_flight == 0
@@ -0,0 +1,148 @@
+"""
+Client SDK against the in-process app: pipelining, export streaming, retries
+and the reconnecting WebSocket.
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from backend.api import main
+from backend.api.admission import AdmissionController
+from quantum_chat.client import QuantumChatClient, QuantumChatError
+from quantum_chat.client import http as client_http
+
+pytestmark = pytest.mark.anyio
+
+CONFIG = {'key_length': 64}
+
+
+@pytest.fixture(autouse=True)
+def admission(monkeypatch):
+    """A fresh, generous rate limit, so tests do not share one client's bucket."""
+    controller = AdmissionController(rate=1000, burst=1000)
+    monkeypatch.setattr(main, 'admission', controller)
+    return controller
+
+
+class CountingTransport(httpx.AsyncBaseTransport):
+    """ASGI transport that records how many requests were in flight at once."""
+
+    def __init__(self):
+        self.inner = httpx.ASGITransport(app=main.app)
+        self.in_flight = 0
+        self.peak = 0
+
+    async def handle_async_request(self, request):
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            # Let the other pipelined requests start before this one is served
+            await asyncio.sleep(0)
+            return await self.inner.handle_async_request(request)
+        finally:
+            self.in_flight -= 1
+
+
+def asgi_client(**options) -> QuantumChatClient:
+    return QuantumChatClient('http://testserver', transport=httpx.ASGITransport(app=main.app), **options)
+
+
+async def test_pipelined_sends_and_decrypts():
+    transport = CountingTransport()
+    async with QuantumChatClient('http://testserver', concurrency=4, transport=transport) as client:
+        session_id = (await client.key_exchange('alice', **CONFIG))['session_id']
+        messages = [f'message {i}' for i in range(20)]
+
+        sent = await client.send_many(session_id, 'alice', messages)
+        plaintexts = await client.decrypt_many(session_id, [m['ciphertext'] for m in sent])
+
+    assert plaintexts == messages
+    assert 1 < transport.peak <= 4
+
+
+async def test_export_streams_and_resumes():
+    async with asgi_client() as client:
+        session_id = (await client.key_exchange('alice', **CONFIG))['session_id']
+        await client.send_many(session_id, 'alice', [f'm{i}' for i in range(7)])
+
+        exported = [m async for m in client.export(session_id, decrypt=True, batch_size=3)]
+        assert [m['plaintext'] for m in exported] == [f'm{i}' for i in range(7)]
+
+        cursor = client.last_cursor
+        await client.send_message(session_id, 'alice', 'later')
+        resumed = [m async for m in client.export(session_id, decrypt=True, cursor=cursor)]
+        assert [m['plaintext'] for m in resumed] == ['later']
+
+        with pytest.raises(QuantumChatError) as excinfo:
+            [m async for m in client.export('no-such-session')]
+        assert excinfo.value.status_code == 404
+
+
+def fake_retry_after(monkeypatch, on_wait):
+    """Fake the client's Retry-After waits; zero-delay yields stay real."""
+    real_sleep = asyncio.sleep
+
+    async def sleep(delay, *args):
+        if delay:
+            on_wait(delay)
+        await real_sleep(0)
+
+    monkeypatch.setattr(client_http.asyncio, 'sleep', sleep)
+
+
+async def test_rate_limited_exchange_retries_then_fails(monkeypatch):
+    monkeypatch.setattr(main, 'admission', AdmissionController(rate=0.001, burst=1))
+    delays = []
+    fake_retry_after(monkeypatch, delays.append)
+    async with asgi_client(retries=2) as client:
+        await client.key_exchange('alice', **CONFIG)
+        with pytest.raises(QuantumChatError) as excinfo:
+            await client.key_exchange('alice', **CONFIG)
+
+    assert excinfo.value.status_code == 429
+    # Both retries waited for the server's Retry-After
+    assert len(delays) == 2 and all(delay >= 1 for delay in delays)
+
+
+async def test_rate_limited_exchange_succeeds_after_retry_after(monkeypatch):
+    limited = AdmissionController(rate=0.001, burst=1)
+    monkeypatch.setattr(main, 'admission', limited)
+
+    def refill(delay):
+        # Waiting out Retry-After refills the bucket
+        for bucket in limited.buckets.values():
+            bucket.tokens = limited.burst
+
+    fake_retry_after(monkeypatch, refill)
+    async with asgi_client(retries=1) as client:
+        await client.key_exchange('alice', **CONFIG)
+        exchange = await client.key_exchange('alice', **CONFIG)
+
+    assert exchange['session_id']
+
+
+async def test_socket_sends_and_decrypts(live_server):
+    async with QuantumChatClient(live_server) as client:
+        session_id = (await client.key_exchange('alice', **CONFIG))['session_id']
+        await client.send_message(session_id, 'alice', 'before')
+
+        async with client.connect(session_id) as chat:
+            events = {}
+
+            async def next_event(kind):
+                while kind not in events:
+                    event = await asyncio.wait_for(chat.receive(), 5)
+                    events[event['type']] = event
+                return events.pop(kind)
+
+            history = await next_event('message_history')
+            assert [m['sender'] for m in history['data']] == ['alice']
+
+            await chat.send_message('alice', 'live')
+            sent = await next_event('new_message')
+            await chat.decrypt(sent['data']['ciphertext'])
+            decrypted = await next_event('decrypted_message')
+
+    assert decrypted['data']['plaintext'] == 'live'
+    assert chat.seen_messages == 2
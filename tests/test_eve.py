@@ -0,0 +1,28 @@
+"""
+Eve strategy defaults as configured through the API.
+"""
+from backend.api.session_manager import build_protocol
+from backend.models.schemas import BB84Config
+
+
+def protocol(**config):
+    return build_protocol(BB84Config(key_length=1024, enable_eve=True, **config).model_dump(), seed=7)
+
+
+def test_pns_leaves_single_photons_alone_by_default():
+    pns = protocol(eve_strategy='pns', mean_photons=1.0)
+    assert pns.eve_intercept_prob == 0.0
+    result = pns.run()
+    assert result['success'] and result['qber'] < 0.05
+    assert result['eve_state']['sifted_bits_known'] > 0
+
+
+def test_pns_intercepts_single_photons_when_asked():
+    result = protocol(eve_strategy='pns', eve_intercept_prob=1.0).run()
+    assert not result['success'] and result['qber'] > 0.15
+
+
+def test_other_strategies_intercept_everything_by_default():
+    intercept_resend = protocol(eve_strategy='intercept_resend')
+    assert intercept_resend.eve_intercept_prob == 1.0
+    assert not intercept_resend.run()['success']
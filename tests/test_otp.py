@@ -0,0 +1,69 @@
+"""
+One-time-pad tokens: authentication and pad accounting.
+"""
+import base64
+
+import pytest
+
+from backend.encryption import OneTimePad
+from backend.encryption.otp import MAC_KEY_BYTES
+
+PAD = bytes(range(256)) * 4
+
+
+def test_round_trip_and_span():
+    pad = OneTimePad(PAD)
+    token = pad.encrypt('hello')
+    assert pad.decrypt(token) == 'hello'
+    assert pad.token_span(token.encode()) == (MAC_KEY_BYTES, MAC_KEY_BYTES + 5)
+    assert pad.decrypt(pad.encrypt('')) == ''
+
+
+def test_tampered_body_is_rejected():
+    pad = OneTimePad(PAD)
+    raw = bytearray(base64.urlsafe_b64decode(pad.encrypt('hello')))
+    raw[8] ^= 1
+    with pytest.raises(ValueError, match='authentication'):
+        pad.decrypt(base64.urlsafe_b64encode(bytes(raw)).decode())
+
+
+def test_forged_token_at_issued_offset_reveals_nothing():
+    pad = OneTimePad(PAD)
+    pad.encrypt('secret message')
+    # An all-zero body would decrypt to the pad bytes themselves
+    forged = base64.urlsafe_b64encode(bytes(8) + bytes(14) + bytes(16)).decode()
+    with pytest.raises(ValueError, match='authentication'):
+        pad.decrypt(forged)
+
+
+def test_mac_key_is_never_issued_as_keystream():
+    pad = OneTimePad(PAD)
+    token = pad.encrypt('known plaintext')
+    start, end = pad.token_span(token.encode())
+    assert start >= MAC_KEY_BYTES
+    # Same issued keystream, different kept-back bytes: the tag no longer verifies
+    twin = OneTimePad(bytes(MAC_KEY_BYTES) + PAD[MAC_KEY_BYTES:], offset=end)
+    with pytest.raises(ValueError, match='authentication'):
+        twin.decrypt(token)
+
+
+def test_pad_must_outgrow_the_mac_key():
+    with pytest.raises(ValueError, match='more than'):
+        OneTimePad(bytes(MAC_KEY_BYTES))
+
+
+def test_other_key_cannot_authenticate():
+    token = OneTimePad(PAD).encrypt('hello')
+    other = OneTimePad(bytes(reversed(PAD)), offset=5)
+    with pytest.raises(ValueError):
+        other.decrypt(token)
+
+
+def test_high_water_mark_runs_ahead_once_per_lease():
+    marks = []
+    pad = OneTimePad(PAD, on_advance=marks.append, lease=100)
+    for _ in range(10):
+        pad.encrypt('0123456789')
+    assert marks == [MAC_KEY_BYTES + 100]
+    pad.encrypt('x')
+    assert marks == [MAC_KEY_BYTES + 100, MAC_KEY_BYTES + 200]
@@ -0,0 +1,63 @@
+"""
+Sampled QBER estimation: sample sizing, defaults and false alarms.
+"""
+import pytest
+
+from backend.bb84 import QKDProtocol
+from backend.models.schemas import BB84Config
+
+PROTOCOLS = ('bb84', 'b92', 'six_state', 'e91')
+
+
+def sampled(key_length, protocol='bb84', seed=None, **overrides):
+    """A sampled exchange at the API's default confidence and margin."""
+    if key_length > 2048:
+        overrides.setdefault('encryption', 'otp')
+    config = BB84Config(key_length=key_length, protocol=protocol, qber_estimation='sampled', **overrides)
+    return QKDProtocol(
+        key_length=config.key_length,
+        protocol=config.protocol,
+        qber_estimation=config.qber_estimation,
+        qber_confidence=config.qber_confidence,
+        qber_margin=config.qber_margin,
+        qber_threshold=config.qber_threshold,
+        seed=seed
+    )
+
+
+def test_default_confidence_is_high():
+    assert BB84Config().qber_confidence >= 0.99
+
+
+@pytest.mark.parametrize('protocol', PROTOCOLS)
+@pytest.mark.parametrize('key_length', (1024, 2048, 8192))
+def test_honest_exchanges_pass(protocol, key_length):
+    for seed in range(10):
+        result = sampled(key_length, protocol, seed=seed).run()
+        assert result['success'], result['failure_reason']
+        assert not result['error_detected']
+        assert result['qber_upper_bound'] <= result['qber_threshold']
+        assert len(result['final_key']) * 4 == key_length
+
+
+@pytest.mark.parametrize('key_length', (64, 256, 512))
+def test_short_keys_are_refused_up_front(key_length):
+    with pytest.raises(ValueError, match='cannot bound QBER|needs a'):
+        sampled(key_length)
+
+
+def test_margin_must_leave_room_under_threshold():
+    with pytest.raises(ValueError, match='below qber_threshold'):
+        sampled(2048, qber_margin=0.11)
+
+
+def test_sampled_saves_qubits_for_long_keys():
+    full = QKDProtocol(key_length=2048)
+    assert sampled(2048).qubit_count < 0.8 * full.qubit_count
+
+
+def test_eavesdropper_is_still_detected():
+    result = QKDProtocol(
+        key_length=2048, qber_estimation='sampled', enable_eve=True, eve_intercept_prob=1.0, seed=3
+    ).run()
+    assert not result['success'] and result['error_detected']
@@ -0,0 +1,132 @@
+"""
+Group rooms: key wrapping, all-or-nothing rekeys and bounded state.
+"""
+import pytest
+
+from backend.api import rooms
+from backend.api.rooms import RoomManager
+from backend.api.session_manager import Session, SessionManager
+from backend.encryption import PadExhausted, QuantumCrypto
+from backend.storage.message_log import MessageLog
+
+FERNET_KEY = 'ab' * 32
+
+
+def add(manager: SessionManager, session_id: str, encryption: str = 'fernet', key: str = FERNET_KEY) -> Session:
+    session = Session(session_id, key, {}, encryption=encryption)
+    manager.add_session(session)
+    return session
+
+
+@pytest.fixture
+def sessions():
+    return SessionManager()
+
+
+def test_wrapped_key_is_raw_room_key(sessions):
+    creator = add(sessions, 'a')
+    pad_member = add(sessions, 'b', 'otp', bytes(range(128)).hex())
+    manager = RoomManager(sessions)
+    room, wrapped = manager.create_room('a')
+    wrapped = manager.join(room, 'b')
+
+    room_key = creator.crypto.decrypt_file(wrapped['a'].encode())
+    assert len(room_key) == rooms.ROOM_KEY_BYTES
+    assert pad_member.crypto.decrypt_file(wrapped['b'].encode()) == room_key
+    record = room.encrypt('a', 'hello')
+    assert QuantumCrypto(room_key.hex()).decrypt(record.ciphertext.decode()) == 'hello'
+
+
+def test_exhausted_pad_leaves_room_unchanged(sessions):
+    add(sessions, 'a')
+    # 32 MAC key bytes kept back, then room for one wrapped 32-byte key
+    add(sessions, 'b', 'otp', bytes(range(72)).hex())
+    add(sessions, 'c')
+    manager = RoomManager(sessions)
+    room, _ = manager.create_room('a')
+    manager.join(room, 'b')
+    before = (room.epoch, dict(room.members), dict(room.wrapped), dict(room.keys))
+
+    with pytest.raises(PadExhausted):
+        manager.join(room, 'c')
+    assert (room.epoch, room.members, room.wrapped, room.keys) == before
+
+
+def test_messages_and_epochs_are_bounded(sessions, monkeypatch):
+    monkeypatch.setattr(rooms, 'ROOM_MAX_MESSAGES', 5)
+    monkeypatch.setattr(rooms, 'ROOM_MAX_EPOCHS', 3)
+    add(sessions, 'a')
+    add(sessions, 'b')
+    manager = RoomManager(sessions)
+    room, _ = manager.create_room('a')
+    for i in range(10):
+        room.encrypt('a', f'm{i}')
+    assert len(room.messages) == 5
+    assert room.message_bytes > 0
+
+    for _ in range(5):
+        manager.join(room, 'b')
+        manager.leave(room, 'b')
+    assert len(room.keys) <= 3
+    assert all(record.epoch in room.keys for record in room.messages)
+    with pytest.raises(ValueError, match='discarded'):
+        room.decrypt('a', '', 0)
+
+
+def test_expired_members_are_dropped(sessions):
+    add(sessions, 'a')
+    add(sessions, 'b')
+    manager = RoomManager(sessions, sweep_interval=0)
+    shared, _ = manager.create_room('a')
+    manager.join(shared, 'b')
+    alone, _ = manager.create_room('b')
+    epoch = shared.epoch
+
+    sessions.delete_session('b')
+    rekeyed = manager.purge_expired()
+    assert [room for room, _ in rekeyed] == [shared]
+    assert list(shared.members) == ['a'] and shared.epoch == epoch + 1
+    assert alone.room_id not in manager.rooms
+    assert manager.evictions['expired'] == 1
+
+
+def test_rekey_does_not_extend_member_sessions(sessions):
+    member = add(sessions, 'a')
+    add(sessions, 'b')
+    manager = RoomManager(sessions)
+    room, _ = manager.create_room('a')
+    member.last_activity -= 100
+    idle_since = member.last_activity
+
+    manager.join(room, 'b')
+    assert member.last_activity == idle_since
+    assert next(iter(sessions.sessions)) == 'a'
+
+
+def test_evicted_members_that_can_be_recovered_stay(tmp_path):
+    sessions = SessionManager(max_sessions=1, message_log=MessageLog(str(tmp_path)))
+    result = {'final_key': FERNET_KEY}
+    first, _, _ = sessions.register_session(result)
+    second, _, _ = sessions.register_session(result)
+    manager = RoomManager(sessions, sweep_interval=0)
+    room, _ = manager.create_room(second)
+    manager.join(room, first)
+    # Wrapping the joiner's key reloaded it and evicted the creator for capacity
+    assert list(sessions.sessions) == [first]
+
+    assert manager.purge_expired() == []
+    assert list(room.members) == [second, first]
+    sessions.delete_session(second)
+    manager.purge_expired()
+    assert list(room.members) == [first]
+    sessions.close()
+
+
+def test_room_count_is_capped(sessions):
+    add(sessions, 'a')
+    manager = RoomManager(sessions, max_rooms=2)
+    first, _ = manager.create_room('a')
+    manager.create_room('a')
+    manager.create_room('a')
+    assert len(manager.rooms) == 2 and first.room_id not in manager.rooms
+    assert manager.memory_bytes() > 0
@@ -0,0 +1,24 @@
+"""
+Response models: opt-in BB84Result extras.
+"""
+from backend.models.schemas import BB84Result
+
+
+def result(**extras) -> BB84Result:
+    return BB84Result(
+        success=True, key_established=True, final_key='ab', key_length=8, qber=0.0,
+        qber_threshold=0.11, error_detected=False, eavesdropping_enabled=False,
+        alice_state={}, bob_state={}, **extras
+    )
+
+
+def test_omitted_extras_are_a_class_constant():
+    assert '_OMIT_WHEN_NONE' in BB84Result.__class_vars__
+    assert not BB84Result.__private_attributes__
+
+
+def test_unset_extras_are_left_out():
+    data = result().model_dump()
+    assert 'trace' not in data and 'qber_sample_size' not in data
+    assert data['eve_state'] is None
+    assert result(qber_sample_size=100).model_dump()['qber_sample_size'] == 100
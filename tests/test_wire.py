@@ -0,0 +1,79 @@
+"""
+WebSocket wire formats: subprotocol negotiation and command validation.
+"""
+import asyncio
+import json
+
+import msgpack
+import pytest
+import websockets
+
+from backend.api.session_manager import Session, session_manager
+from backend.api.wire import JSON_CODEC, MSGPACK_CODEC, SendMessage
+
+
+@pytest.mark.parametrize('frame', [
+    msgpack.packb(['send_message', 123, 'hi']),
+    msgpack.packb(['send_message', 'alice', b'hi']),
+    msgpack.packb(['decrypt_message', 5]),
+    msgpack.packb({'type': 'send_message'}),
+    b'\xc1',
+])
+def test_msgpack_rejects_malformed_commands(frame):
+    with pytest.raises(ValueError):
+        MSGPACK_CODEC.decode(frame)
+
+
+@pytest.mark.parametrize('frame', [
+    '{"type": "send_message", "sender": 123, "message": "hi"}',
+    '{"type": "decrypt_message", "ciphertext": null}',
+    '["send_message"]',
+    'not json',
+])
+def test_json_rejects_malformed_commands(frame):
+    with pytest.raises(ValueError):
+        JSON_CODEC.decode(frame)
+
+
+def test_well_formed_commands_decode():
+    assert MSGPACK_CODEC.decode(msgpack.packb(['send_message', 'alice', 'hi'])) == SendMessage('alice', 'hi')
+    assert JSON_CODEC.decode('{"type": "pong"}') is None
+
+
+@pytest.fixture
+def ws_url(live_server):
+    session_id = 'wire-test'
+    session_manager.add_session(Session(session_id, 'ab' * 32, {}))
+    yield 'ws' + live_server[len('http'):] + f'/ws/{session_id}'
+    session_manager.delete_session(session_id)
+
+
+async def _until(ws, kind):
+    while True:
+        event = json.loads(await asyncio.wait_for(ws.recv(), 5))
+        if event['type'] == kind:
+            return event
+
+
+@pytest.mark.anyio
+async def test_unsupported_subprotocol_is_not_echoed(ws_url):
+    async with websockets.connect(ws_url, subprotocols=['chat.v2']) as ws:
+        assert ws.subprotocol is None
+        await _until(ws, 'message_history')
+    async with websockets.connect(ws_url, subprotocols=['chat.v2', 'quantum-chat.msgpack']) as ws:
+        assert ws.subprotocol == 'quantum-chat.msgpack'
+
+
+@pytest.mark.anyio
+async def test_malformed_command_gets_an_error_and_the_loop_survives(ws_url):
+    async with websockets.connect(ws_url, subprotocols=['quantum-chat.msgpack']) as ws:
+        await ws.send(msgpack.packb(['send_message', 123, 'hi']))
+        while True:
+            event = msgpack.unpackb(await asyncio.wait_for(ws.recv(), 5))
+            if event['type'] == 'error':
+                break
+        assert 'sender must be a string' in event['data']['message']
+        await ws.send(msgpack.packb(['send_message', 'alice', 'still here']))
+        while event['type'] != 'new_message':
+            event = msgpack.unpackb(await asyncio.wait_for(ws.recv(), 5))
+        assert event['data']['sender'] == 'alice'